@@ -1,37 +1,14 @@
-from langchain.agents import AgentExecutor, Tool, create_react_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import MessagesPlaceholder
-from langchain import PromptTemplate
-from llm_client import get_llm_response
+import time
+
+import intent_router
+import resources
+import tracing
 from code_generator import generate_test_code
-from test_runner import run_java_test
-from rag_system import query_llm_with_rag
-
-import os
-from dotenv import load_dotenv
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Define tools for the agent
-tools = [
-    Tool(
-        name="GenerateTestCode",
-        func=generate_test_code,
-        description="Generates Java/TestNG/Selenium test code from a natural language description. Accepts 'query' and optional 'env_domain' for context. Example: 'GenerateTestCode(query=\"Write a login test for Chrome\", env_domain=\"my.stg.charitableimpact.com\")'.",
-    ),
-    Tool(
-        name="RunJavaTest",
-        func=run_java_test,
-        description="Executes a given block of Java test code and returns 'PASS' or 'FAIL'. Input is the Java code as a string.",
-    ),
-    Tool(
-        name="QueryKnowledgeBase",
-        func=query_llm_with_rag, # This already accepts env_domain
-        description="Retrieves contextual information from the automation knowledge base. Accepts 'user_query' and optional 'env_domain' for environment-specific context. Example: 'QueryKnowledgeBase(user_query=\"Known login bugs\", env_domain=\"my.qa.charitableimpact.com\")'.",
-    )
-]
-
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.5, google_api_key=GOOGLE_API_KEY)
+from conversation_memory import expand_artifacts
+from intent_router import INTENT_ROUTER_ENABLED
+from llm_client import ERROR_RESPONSE
+from test_runner import execute_java_test, run_java_test
+from rag_system import domain_for_environment, query_llm_with_rag
 
 # Agent prompt template (ReAct style)
 template = """You are an AI-Powered Test Automation Assistant.
@@ -39,6 +16,7 @@ Answer the following questions as best you can. You have access to the following
 {tools}
 
 By default, if no specific environment (QA, STAGE, PROD) is mentioned in the user's query, assume the environment is 'PROD' and use its corresponding domain 'my.charitableimpact.com' for any tools that require a domain. If an environment is mentioned, use its specific domain.
+Current environment: {environment} (domain: {env_domain}).
 
 Use the following format:
 Question: the input question you must answer
@@ -56,14 +34,68 @@ Begin!
 Question: {input}
 Thought:{agent_scratchpad}"""
 
-prompt = PromptTemplate.from_template(template)
 
-agent = create_react_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
+def run_java_test_tool(java_code):
+    """
+    RunJavaTest tool: accepts Java code or an artifact reference from the conversation history.
+    """
+    return run_java_test(expand_artifacts(java_code))
 
-# Modify run_agent_query to accept chat_history and environment
-def run_agent_query(query, environment="PROD", chat_history=None):
-    from langchain_core.messages import HumanMessage, AIMessage
+
+def build_tools():
+    """
+    Define the tools available to the agent.
+    """
+    from langchain.agents import Tool
+
+    return [
+        Tool(
+            name="GenerateTestCode",
+            func=generate_test_code,
+            description="Generates Java/TestNG/Selenium test code from a natural language description. Accepts 'query' and optional 'env_domain' for context. Example: 'GenerateTestCode(query=\"Write a login test for Chrome\", env_domain=\"my.stg.charitableimpact.com\")'.",
+        ),
+        Tool(
+            name="RunJavaTest",
+            func=run_java_test_tool,
+            description="Executes a given block of Java test code and returns 'PASS' or 'FAIL'. Input is the Java code as a string, or an artifact reference such as 'artifact:1a2b3c4d' from the conversation.",
+        ),
+        Tool(
+            name="QueryKnowledgeBase",
+            func=query_llm_with_rag, # This already accepts env_domain
+            description="Retrieves contextual information from the automation knowledge base. Accepts 'user_query' and optional 'env_domain' for environment-specific context. Example: 'QueryKnowledgeBase(user_query=\"Known login bugs\", env_domain=\"my.qa.charitableimpact.com\")'.",
+        )
+    ]
+
+
+def build_agent_executor():
+    """
+    Build the ReAct agent executor. Called once per process through resources.get_agent_executor().
+    """
+    from langchain.agents import AgentExecutor, create_react_agent
+    from langchain.prompts import PromptTemplate
+
+    tools = build_tools()
+    prompt = PromptTemplate.from_template(template)
+    agent = create_react_agent(resources.get_chat_llm(), tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
+
+
+def __getattr__(name):
+    # Keep `agent_orchestrator.agent_executor`, `.llm` and `.tools` working for existing callers
+    if name == "agent_executor":
+        return resources.get_agent_executor()
+    if name == "llm":
+        return resources.get_chat_llm()
+    if name == "tools":
+        return resources.get_agent_executor().tools
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def build_agent_inputs(query, environment="PROD", chat_history=None):
+    """
+    Build the agent invocation inputs from the query, environment and chat history.
+    """
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
     formatted_history = []
     if chat_history:
@@ -72,19 +104,277 @@ def run_agent_query(query, environment="PROD", chat_history=None):
                 formatted_history.append(HumanMessage(content=msg["content"]))
             elif msg["role"] == "assistant":
                 formatted_history.append(AIMessage(content=msg["content"]))
+            elif msg["role"] == "system": # running summary from ConversationMemory
+                formatted_history.append(SystemMessage(content=msg["content"]))
 
     # Map environment to domain for RAG system and tool calls
-    env_domain_map = {
-        "QA": "my.qa.charitableimpact.com",
-        "STAGE": "my.stg.charitableimpact.com",
-        "PROD": "my.charitableimpact.com"
-    }
-    actual_domain = env_domain_map.get(environment.upper(), "my.charitableimpact.com")
+    actual_domain = domain_for_environment(environment)
 
     # Pass environment and domain directly as part of the invocation arguments
     # The agent's prompt needs to be updated to make the LLM use these in Action Input.
-    response = agent_executor.invoke({"input": query, "chat_history": formatted_history, "environment": environment, "env_domain": actual_domain})
+    return {"input": query, "chat_history": formatted_history, "environment": environment, "env_domain": actual_domain}
+
+
+def route_query(query, chat_history=None):
+    """
+    Route a request with the intent router; None when routing is disabled or fails (use the agent).
+    """
+    if not INTENT_ROUTER_ENABLED:
+        return None
+    try:
+        return intent_router.route(query, chat_history)
+    except Exception as e:
+        print(f"Intent routing failed, using the agent: {e}")
+        return None
+
+
+@tracing.traced("router.dispatch", llm_calls_saved=intent_router.AGENT_CALLS_PER_TOOL_STEP)
+def run_direct(route, query, environment="PROD", stream=False):
+    """
+    Call the tool of a confident route directly, with the domain of the resolved environment.
+    Returns the answer (a generator of chunks when stream=True).
+    """
+    tracing.current_span().set(tool=route.tool)
+    env_domain = domain_for_environment(route.environment or environment)
+    if route.intent == "run_test":
+        answer = execute_java_test(intent_router.extract_code(query)).summary()
+        return iter([answer]) if stream else answer
+    if route.intent == "generate_test":
+        code = generate_test_code(query, env_domain=env_domain, stream=stream)
+        if stream or code == ERROR_RESPONSE:
+            return code
+        return f"```java\n{code}\n```"
+    return query_llm_with_rag(query, env_domain=env_domain, stream=stream)
+
+
+# Modify run_agent_query to accept chat_history and environment
+def run_agent_query(query, environment="PROD", chat_history=None):
+    """
+    Answer a request: confident single-tool requests go straight to the tool, the rest through the agent.
+    """
+    started = time.perf_counter()
+    query = expand_artifacts(query)
+    route = route_query(query, chat_history)
+    if route is not None and route.confident:
+        answer = run_direct(route, query, environment)
+    else:
+        answer = _invoke_agent(query, (route and route.environment) or environment, chat_history)
+    if route is not None:
+        intent_router.record(route, time.perf_counter() - started)
+    return answer
+
+
+@tracing.traced("agent.run")
+def _invoke_agent(query, environment="PROD", chat_history=None):
+    response = resources.get_agent_executor().invoke(build_agent_inputs(query, environment, chat_history),
+                                                     config={"callbacks": [_step_trace_handler()]})
 
     return response["output"]
 
-print("Agent orchestrator initialized successfully.")
\ No newline at end of file
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+CANCEL_POLL_SECONDS = 0.5 # how often a streaming request checks for cancellation while the agent is silent
+_STREAM_DONE = object()
+
+
+class AgentCancelled(Exception):
+    pass
+
+
+def _final_answer_handler(chunks):
+    # Callback handler that forwards the tokens following "Final Answer:" to a queue.
+    # Tokens of intermediate Thought/Action steps are buffered and dropped.
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class FinalAnswerStreamHandler(BaseCallbackHandler):
+        def __init__(self):
+            self.buffer = ""
+            self.streaming = False
+            self.streamed_any = False
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self.buffer = ""
+            self.streaming = False
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.on_llm_start(serialized, [], **kwargs)
+
+        def on_llm_new_token(self, token, **kwargs):
+            if self.streaming:
+                chunks.put(token)
+                self.streamed_any = True
+                return
+            self.buffer += token
+            index = self.buffer.find(FINAL_ANSWER_MARKER)
+            if index != -1:
+                self.streaming = True
+                rest = self.buffer[index + len(FINAL_ANSWER_MARKER):].lstrip()
+                if rest:
+                    chunks.put(rest)
+                    self.streamed_any = True
+
+    return FinalAnswerStreamHandler()
+
+
+def _step_trace_handler():
+    # Callback handler recording a span for every LLM call and tool call of the ReAct loop.
+    # Tool spans are made current so the spans of the tool's own work (retrieval, Maven) nest under them.
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class StepTraceHandler(BaseCallbackHandler):
+        def __init__(self):
+            self.spans = {}
+            self.steps = 0
+
+        def on_llm_start(self, serialized, prompts, run_id=None, **kwargs):
+            self.steps += 1
+            self.spans[run_id] = tracing.start_span("agent.llm", step=self.steps)
+
+        def on_chat_model_start(self, serialized, messages, run_id=None, **kwargs):
+            self.on_llm_start(serialized, [], run_id=run_id, **kwargs)
+
+        def on_llm_end(self, response, run_id=None, **kwargs):
+            span = self.spans.pop(run_id, None)
+            if span is None:
+                return
+            try:
+                usage = response.generations[0][0].message.usage_metadata or {}
+            except (AttributeError, IndexError):
+                usage = {}
+            span.set(prompt_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+            span.end()
+
+        def on_llm_error(self, error, run_id=None, **kwargs):
+            span = self.spans.pop(run_id, None)
+            if span is not None:
+                span.end(error)
+
+        def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+            span = tracing.start_span("agent.tool", tool=(serialized or {}).get("name"), step=self.steps)
+            self.spans[run_id] = span.__enter__()
+
+        def on_tool_end(self, output, run_id=None, **kwargs):
+            span = self.spans.pop(run_id, None)
+            if span is not None:
+                span.__exit__(None, None, None)
+
+        def on_tool_error(self, error, run_id=None, **kwargs):
+            span = self.spans.pop(run_id, None)
+            if span is not None:
+                span.__exit__(type(error), error, None)
+
+    return StepTraceHandler()
+
+
+def _cancel_handler(cancelled):
+    # Callback handler stopping the ReAct loop at its next LLM call, token, action or tool call once
+    # cancelled() is true. raise_error makes LangChain propagate the exception instead of logging it.
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class CancelHandler(BaseCallbackHandler):
+        raise_error = True
+
+        def _check(self):
+            if cancelled():
+                raise AgentCancelled()
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self._check()
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self._check()
+
+        def on_llm_new_token(self, token, **kwargs):
+            self._check()
+
+        def on_agent_action(self, action, **kwargs):
+            self._check()
+
+        def on_tool_start(self, serialized, input_str, **kwargs):
+            self._check()
+
+    return CancelHandler()
+
+
+def stream_agent_query(query, environment="PROD", chat_history=None, cancel=None):
+    """
+    Answer a request and yield the answer in chunks as it is produced. Confident single-tool requests
+    are streamed straight from the tool; the rest go through the agent (see _stream_agent).
+    Setting `cancel` (a threading.Event) stops the agent at its next step; the generator then returns.
+
+    Yields:
+        str: Chunks of the answer.
+    """
+    query = expand_artifacts(query)
+    route = route_query(query, chat_history)
+    if route is not None and route.confident:
+        chunks = run_direct(route, query, environment, stream=True)
+    else:
+        chunks = _stream_agent(query, (route and route.environment) or environment, chat_history, cancel)
+    if route is not None:
+        chunks = intent_router.timed(route, chunks)
+    yield from chunks
+
+
+def _stream_agent(query, environment="PROD", chat_history=None, cancel=None):
+    """
+    Run the agent and yield its final answer in chunks as the LLM produces it.
+
+    The agent runs in a worker thread; a callback handler forwards the tokens written after
+    "Final Answer:" in the last reasoning step. If the answer could not be streamed (for example
+    the model did not stream tokens), the complete answer is yielded once the agent finishes.
+    When `cancel` is set or the generator is closed, the agent is stopped at its next step and the
+    generator only returns once the worker thread has finished, so callers can count it as busy until then.
+
+    Yields:
+        str: Chunks of the final answer.
+    """
+    import contextvars
+    import queue
+    import threading
+
+    chunks = queue.Queue()
+    stop = threading.Event()
+    handler = _final_answer_handler(chunks)
+    cancel_handler = _cancel_handler(lambda: stop.is_set() or (cancel is not None and cancel.is_set()))
+    inputs = build_agent_inputs(query, environment, chat_history)
+    run_span = tracing.start_span("agent.run", environment=environment)
+
+    def _run():
+        try:
+            with run_span:
+                try:
+                    response = resources.get_agent_executor().invoke(
+                        inputs, config={"callbacks": [cancel_handler, handler, _step_trace_handler()]})
+                except AgentCancelled:
+                    run_span.set(cancelled=True)
+                    raise
+            chunks.put((_STREAM_DONE, response["output"], None))
+        except Exception as e:
+            chunks.put((_STREAM_DONE, None, e))
+
+    # Run in a copy of the caller's context so the agent's spans join the caller's trace
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(_run,), name="agent-stream", daemon=True)
+    worker.start()
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                item = None
+            if cancel is not None and cancel.is_set():
+                stop.set()              # from here on chunks are drained, not yielded, until the agent stops
+            if isinstance(item, tuple) and item[0] is _STREAM_DONE:
+                _, output, error = item
+                if isinstance(error, AgentCancelled):
+                    return
+                if error is not None:
+                    raise error
+                if not handler.streamed_any and not stop.is_set():
+                    yield output
+                return
+            if item is not None and not stop.is_set():
+                yield item
+    finally:
+        stop.set()
+        worker.join()
@@ -0,0 +1,82 @@
+# Thin client for the backend service (api_server.py), used by app.py when API_URL is set.
+# Nothing heavy is loaded in the client process: no embedding model, ChromaDB or LangChain.
+# Closing a stream early (e.g. the user stops a Streamlit run) closes the connection, and the
+# service cancels the request if no other client is waiting for the same answer.
+import json
+import os
+
+import requests
+
+from conversation_memory import expand_artifacts, referenced_artifacts
+from llm_client import ERROR_RESPONSE
+
+API_URL = os.getenv("API_URL")                                     # e.g. http://127.0.0.1:8000
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "300"))              # seconds to wait for the next chunk
+BUSY_RESPONSE = "The assistant is busy right now. Please try again in a few seconds."
+
+
+class BackendClient:
+    """
+    Client for the backend service. One instance can be shared by every Streamlit session in a process.
+
+    Args:
+        url (str): Base URL of the service.
+        timeout (float): Seconds to wait for a response (or for the next chunk of a stream).
+    """
+
+    def __init__(self, url=API_URL, timeout=API_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.last_done = {}   # final line of the last stream: coalesced, queue_seconds, timing
+
+    def stream_query(self, query, environment="PROD", chat_history=None):
+        """
+        Yield the answer in chunks as the service produces them (like agent_orchestrator.stream_agent_query).
+        A busy service or an error ends the stream with BUSY_RESPONSE or ERROR_RESPONSE.
+        """
+        self.last_done = {}
+        # Artifacts live in this process; send the code the history refers to along with it
+        payload = {"query": expand_artifacts(query), "environment": environment, "chat_history": chat_history,
+                   "artifacts": referenced_artifacts(chat_history or [])}
+        try:
+            with self.session.post(f"{self.url}/query/stream", json=payload, stream=True,
+                                   timeout=(10, self.timeout)) as response:
+                if response.status_code == 503:
+                    yield BUSY_RESPONSE
+                    return
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if "text" in message:
+                        yield message["text"]
+                    elif message.get("done"):
+                        self.last_done = message
+                    elif "error" in message:
+                        print(f"Backend error: {message['error']}")
+                        yield "\n\n" + ERROR_RESPONSE
+        except requests.RequestException as e:
+            print(f"Backend request failed: {e}")
+            yield ERROR_RESPONSE
+
+    def query(self, query, environment="PROD", chat_history=None):
+        """
+        Return the complete answer (like agent_orchestrator.run_agent_query).
+        """
+        return "".join(self.stream_query(query, environment, chat_history))
+
+    def summarize(self, summary, messages, max_tokens):
+        """
+        Conversation summarizer for ConversationMemory, computed by the service's LLM.
+        """
+        response = self.session.post(f"{self.url}/summarize", timeout=(10, self.timeout),
+                                     json={"summary": summary, "messages": messages, "max_tokens": max_tokens})
+        response.raise_for_status()
+        return response.json()["summary"]
+
+    def health(self):
+        response = self.session.get(f"{self.url}/health", timeout=10)
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,339 @@
+# Backend service owning the whole answering stack (embedding model, collection, LLM clients, agent)
+# in one process, so Streamlit sessions can be thin clients (API_URL, see api_client.py):
+#   python api_server.py                                   # http://127.0.0.1:8000
+#   API_URL=http://127.0.0.1:8000 streamlit run app.py
+# Requests go through a Dispatcher:
+#   - at most API_MAX_CONCURRENCY answers are computed at a time, on a thread pool; up to API_MAX_QUEUE
+#     more wait their turn, beyond that the service answers 503 with Retry-After (backpressure)
+#   - identical in-flight requests (same query, environment, history and artifacts) share one computation
+#   - a request whose clients all disconnected is cancelled: dropped if still queued; if running, the
+#     agent is stopped at its next LLM call, token or tool call and the slot freed once it has stopped
+# Endpoints: POST /query (JSON answer), POST /query/stream (NDJSON chunks), POST /summarize,
+# GET /health, GET /stats.
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import resources
+import tracing
+from conversation_memory import artifact_scope, llm_summarizer
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "4"))   # answers computed at the same time
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "32"))              # requests waiting for a slot
+API_RETRY_AFTER = int(os.getenv("API_RETRY_AFTER", "2"))           # seconds, sent with 503 responses
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    One answer being computed, shared by every client that asked the same question while it runs.
+    Chunks are produced on a worker thread and kept, so a client that joins late replays them.
+    """
+
+    def __init__(self, key, query, environment, chat_history, loop, artifacts=None):
+        self.key = key
+        self.query = query
+        self.environment = environment
+        self.chat_history = chat_history
+        self.artifacts = artifacts or {}
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.timing = None
+        self.subscribers = 0
+        self.cancelled = threading.Event()
+        self.created = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self._loop = loop
+        self._changed = loop.create_future()
+
+    def push(self, chunk):
+        # Called from the worker thread
+        self._loop.call_soon_threadsafe(self._append, chunk)
+
+    def _append(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self.finished = time.perf_counter()
+        self._notify()
+
+    def _notify(self):
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = self._loop.create_future()
+
+    @property
+    def queue_seconds(self):
+        return round((self.started or self.finished or time.perf_counter()) - self.created, 3)
+
+    async def follow(self):
+        """
+        Yield every chunk of the answer, from the first one, as they are produced.
+        """
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            # Shielded: a client leaving must not cancel the future the other clients wait on
+            await asyncio.shield(self._changed)
+
+
+def _agent_stream(query, environment, chat_history, cancel):
+    from agent_orchestrator import stream_agent_query
+    return stream_agent_query(query, environment=environment, chat_history=chat_history, cancel=cancel)
+
+
+class Dispatcher:
+    """
+    Bounded, coalescing request queue in front of a blocking answer function.
+
+    Args:
+        answer_stream (callable): (query, environment, chat_history, cancel) -> iterable of answer chunks.
+                                  `cancel` is a threading.Event set when every client has left; the iterable
+                                  should then stop and return. Defaults to agent_orchestrator.stream_agent_query.
+        max_concurrency (int): Answers computed at the same time (worker threads).
+        max_queue (int): Distinct requests allowed to wait for a worker; more are rejected with QueueFull.
+    """
+
+    def __init__(self, answer_stream=None, max_concurrency=API_MAX_CONCURRENCY, max_queue=API_MAX_QUEUE):
+        self.answer_stream = answer_stream or _agent_stream
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.inflight = {}
+        self.running = 0
+        self.stats = {"requests": 0, "computed": 0, "coalesced": 0, "rejected": 0, "cancelled": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="api-worker")
+        self._semaphore = None
+
+    @staticmethod
+    def request_key(query, environment, chat_history, artifacts=None):
+        payload = json.dumps([query, environment, chat_history or [], artifacts or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def submit(self, query, environment="PROD", chat_history=None, artifacts=None):
+        """
+        Join the in-flight job for an identical request, or queue a new one. Must run on the event loop.
+        `artifacts` ({artifact id: code} referenced by the request) are only visible to this request's job.
+
+        Returns:
+            tuple: (job, coalesced). Call release(job) when the client is done with it.
+
+        Raises:
+            QueueFull: If max_concurrency + max_queue distinct requests are already running or queued.
+        """
+        self.stats["requests"] += 1
+        key = self.request_key(query, environment, chat_history, artifacts)
+        job = self.inflight.get(key)
+        if job is not None and not job.cancelled.is_set():
+            job.subscribers += 1
+            self.stats["coalesced"] += 1
+            return job, True
+        if self.running + self.queued() >= self.max_concurrency + self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFull()
+
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        job = Job(key, query, environment, chat_history, loop, artifacts)
+        job.subscribers = 1
+        self.inflight[key] = job
+        loop.create_task(self._run(job))
+        return job, False
+
+    def release(self, job):
+        """
+        Drop one client of a job; the job is cancelled when it has no clients left and is not finished.
+        """
+        job.subscribers -= 1
+        if job.subscribers <= 0 and not job.done and not job.cancelled.is_set():
+            job.cancelled.set()
+            self.stats["cancelled"] += 1
+            self._forget(job)
+
+    def queued(self):
+        return sum(1 for job in self.inflight.values() if job.started is None)
+
+    def _forget(self, job):
+        if self.inflight.get(job.key) is job:
+            del self.inflight[job.key]
+
+    async def _run(self, job):
+        async with self._semaphore:
+            if job.cancelled.is_set():
+                job.finish()
+                return
+            job.started = time.perf_counter()
+            self.running += 1
+            error = None
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._produce, job)
+                self.stats["computed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                error = e
+            finally:
+                self.running -= 1
+                job.finish(error)
+                self._forget(job)
+
+    def _produce(self, job):
+        # Worker thread: run the answer function and hand its chunks to the event loop. The job keeps its
+        # semaphore slot until the answer function has returned, also when it is cancelled.
+        with artifact_scope(job.artifacts), tracing.trace("api.request", environment=job.environment) as span:
+            chunks = self.answer_stream(job.query, job.environment, job.chat_history, job.cancelled)
+            try:
+                for chunk in chunks:
+                    if job.cancelled.is_set():
+                        break
+                    job.push(chunk)
+            finally:
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+            if job.cancelled.is_set():
+                span.set(cancelled=True)
+        if tracing.TRACING_ENABLED:
+            job.timing = span.trace.breakdown()
+
+    def snapshot(self):
+        return {**self.stats, "running": self.running, "queued": self.queued(),
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+
+class QueryRequest(BaseModel):
+    query: str
+    environment: str = "PROD"
+    chat_history: Optional[List[dict]] = None
+    artifacts: Optional[Dict[str, str]] = None   # code referenced by artifact:<id> in the client's history
+
+
+class SummaryRequest(BaseModel):
+    summary: str = ""
+    messages: List[dict]
+    max_tokens: int = 300
+
+
+def _busy():
+    return HTTPException(status_code=503, detail="Too many requests in flight, retry later.",
+                         headers={"Retry-After": str(API_RETRY_AFTER)})
+
+
+def create_app(answer_stream=None, max_concurrency=API_MAX_CONCURRENCY, max_queue=API_MAX_QUEUE, warm_up=True):
+    """
+    Build the FastAPI application. `answer_stream` replaces the agent (benchmarks use a fake pipeline).
+    """
+    dispatcher = Dispatcher(answer_stream, max_concurrency, max_queue)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if warm_up:
+            # One copy of the model, collection, LLM clients and agent for every client of this service
+            resources.warm_up()
+        tracing.start_metrics_server()
+        yield
+
+    app = FastAPI(title="AI Test Automation backend", lifespan=lifespan)
+    app.state.dispatcher = dispatcher
+
+    def _submit(body):
+        try:
+            return dispatcher.submit(body.query, body.environment, body.chat_history, body.artifacts)
+        except QueueFull:
+            raise _busy()
+
+    @app.post("/query")
+    async def query(body: QueryRequest, request: Request):
+        job, coalesced = _submit(body)
+        collector = asyncio.ensure_future(_join(job))
+        try:
+            # Poll for a disconnect while waiting, so an abandoned request gives up its place
+            while not collector.done():
+                await asyncio.wait({collector}, timeout=DISCONNECT_POLL_SECONDS)
+                if not collector.done() and await request.is_disconnected():
+                    collector.cancel()
+                    return None
+            answer = collector.result()
+        finally:
+            dispatcher.release(job)
+        return {"answer": answer, "coalesced": coalesced, "queue_seconds": job.queue_seconds, "timing": job.timing}
+
+    @app.post("/query/stream")
+    async def query_stream(body: QueryRequest):
+        job, coalesced = _submit(body)
+
+        async def _lines():
+            # Starlette closes this generator when the client disconnects; release() then cancels the job
+            try:
+                async for chunk in job.follow():
+                    yield json.dumps({"text": chunk}) + "\n"
+                yield json.dumps({"done": True, "coalesced": coalesced, "queue_seconds": job.queue_seconds,
+                                  "timing": job.timing}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+            finally:
+                dispatcher.release(job)
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    @app.post("/summarize")
+    async def summarize(body: SummaryRequest):
+        # Conversation summaries for thin clients' ConversationMemory
+        try:
+            summary = await run_in_threadpool(llm_summarizer, body.summary, body.messages, body.max_tokens)
+        except RuntimeError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        return {"summary": summary}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "loaded": {name: resources.is_loaded(name) for name in resources.DEFAULT_WARM_UP},
+                **dispatcher.snapshot()}
+
+    @app.get("/stats")
+    async def stats():
+        return dispatcher.snapshot()
+
+    return app
+
+
+async def _join(job):
+    return "".join([chunk async for chunk in job.follow()])
+
+
+def main():
+    import uvicorn
+
+    # A single process: the point is one shared copy of the stack; concurrency comes from the dispatcher
+    uvicorn.run(create_app(), host=API_HOST, port=API_PORT, workers=1)
+
+
+if __name__ == "__main__":
+    main()
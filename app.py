@@ -1,5 +1,20 @@
 import streamlit as st
-from agent_orchestrator import run_agent_query # Our agent
+import resources
+import tracing
+from api_client import API_URL, BackendClient
+from conversation_memory import ConversationMemory
+from llm_client import StreamTimer
+
+# Thin client mode (API_URL set): the backend service (api_server.py) owns the model, knowledge base
+# and agent, and each session talks to it through its own BackendClient
+if not API_URL:
+    from agent_orchestrator import stream_agent_query # Our agent
+
+    # Load the embedding model, knowledge base and agent in the background while the page renders.
+    # Resources are shared by every session in this process, so only the first session pays for it.
+    resources.warm_up()
+    # Prometheus metrics on METRICS_PORT (once per process; off when the variable is unset)
+    tracing.start_metrics_server()
 
 st.set_page_config(page_title="AI-Powered Test Automation Assistant", layout="wide")
 
@@ -9,6 +24,15 @@ st.write("Ask natural language queries to generate tests, get insights, and mana
 # Initialize chat history in session_state if it doesn't exist
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if API_URL:
+    if "backend" not in st.session_state:
+        st.session_state.backend = BackendClient(API_URL)
+    stream_agent_query = st.session_state.backend.stream_query
+# The agent sees a bounded history (recent turns, a running summary, code as artifact references);
+# st.session_state.messages keeps the full transcript for display
+if "memory" not in st.session_state:
+    st.session_state.memory = (ConversationMemory(summarizer=st.session_state.backend.summarize) if API_URL
+                               else ConversationMemory())
 
 # Display chat messages from history on app rerun
 for message in st.session_state.messages:
@@ -20,18 +44,25 @@ for message in st.session_state.messages:
 if user_query := st.chat_input("Enter your query..."):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": user_query})
+    st.session_state.memory.add("user", user_query)
     # Display user message in chat message container
     with st.chat_message("user"):
         st.markdown(user_query)
 
-    # Get AI response and display it
+    # Get AI response and display it as it streams in
     with st.chat_message("assistant"):
-        with st.spinner("Processing your request..."):
-            # Pass the entire conversation history to the agent
-            # We'll need to adapt run_agent_query to accept history
-            response = run_agent_query(user_query, chat_history=st.session_state.messages)
-            st.markdown(response)
+        # Pass the bounded conversation history to the agent
+        with tracing.trace("chat.request") as request_span:
+            history = st.session_state.memory.messages_for_prompt()
+            timer = StreamTimer(stream_agent_query(user_query, chat_history=history))
+            response = st.write_stream(timer)
+        st.caption(timer.summary())
+        if API_URL:
+            st.session_state.last_timing = st.session_state.backend.last_done.get("timing")
+        elif tracing.TRACING_ENABLED:
+            st.session_state.last_timing = request_span.trace.breakdown()
         st.session_state.messages.append({"role": "assistant", "content": response})
+        st.session_state.memory.add("assistant", response)
 
 # --- Old text_area and button code (can be removed or commented out) ---
 # def clear_text():
@@ -58,6 +89,11 @@ st.sidebar.info(
         "This is a demo of an AI-powered test automation framework "
         "leveraging LLMs, RAG, and agentic workflows."
     )
+
+# Where the time of the last answer went (see tracing.py)
+if st.session_state.get("last_timing"):
+    st.sidebar.header("Last request timing")
+    st.sidebar.dataframe(st.session_state.last_timing, hide_index=True, use_container_width=True)
 # Streamlit app for AI-Powered Test Automation Assistant
 # This app allows users to interact with an AI agent that can generate test code,
 # execute tests, and provide insights on test automation concepts.
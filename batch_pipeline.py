@@ -0,0 +1,205 @@
+# Batch test-generation and execution pipeline.
+# Turns a list of natural-language test specs x environments into a suite of executed tests:
+#   1. retrieval  - context for every job in one batch (one encode call, one query per domain)
+#   2. generation - test code generated with bounded concurrency
+#   3. execution  - all classes compile-checked, then run together in a single parallel Maven invocation
+#   4. report     - one consolidated report (JSON and Markdown)
+# run_pipeline() is a generator that yields a progress event as each job and stage finishes.
+#
+#   python batch_pipeline.py --spec "Login test on Chrome" --spec "Login test on Firefox" --env QA STAGE
+#   python batch_pipeline.py --specs-file specs.txt --env PROD --report report.json --markdown report.md
+import argparse
+import json
+import time
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from code_generator import build_generation_prompt, extract_java_code
+from llm_client import ERROR_RESPONSE, LLM_MAX_CONCURRENCY, get_llm_response
+from rag_system import build_context, domain_for_environment, retrieve_documents_batch
+from test_runner import execute_java_tests
+
+DEFAULT_FRAMEWORK = "Selenium Java TestNG"
+
+
+def expand_jobs(specs, environments=("PROD",)):
+    """
+    Build one job per (spec, environment) pair.
+    """
+    jobs = []
+    for spec in specs:
+        for environment in environments:
+            jobs.append({
+                "job": len(jobs),
+                "spec": spec,
+                "environment": environment.upper(),
+                "domain": domain_for_environment(environment),
+            })
+    return jobs
+
+
+def run_pipeline(specs, environments=("PROD",), framework=DEFAULT_FRAMEWORK, concurrency=LLM_MAX_CONCURRENCY,
+                 thread_count=4, n_results=3):
+    """
+    Generate and run a test for every spec in every environment, yielding progress events.
+
+    Args:
+        specs (list): Natural-language test descriptions.
+        environments (iterable): Environment names (QA, STAGE, PROD).
+        framework (str): Test framework passed to the code generator prompt.
+        concurrency (int): Maximum concurrent LLM generations.
+        thread_count (int): Test classes executed in parallel inside the Maven run.
+        n_results (int): Documents retrieved per job.
+
+    Yields:
+        dict: Progress events with a 'stage' key ('retrieval', 'generation', 'execution', 'report').
+              The last event has stage 'report' and carries the consolidated report under 'report'.
+    """
+    started = time.perf_counter()
+    timings = {}
+    jobs = expand_jobs(specs, environments)
+
+    # 1. Retrieval for all jobs in one batch
+    stage_started = time.perf_counter()
+    # Retrieval uses the request alone, as in generate_test_code
+    documents = retrieve_documents_batch([job["spec"] for job in jobs], [job["domain"] for job in jobs], n_results)
+    timings["retrieval"] = time.perf_counter() - stage_started
+    yield {"stage": "retrieval", "status": "done", "jobs": len(jobs), "seconds": round(timings["retrieval"], 3)}
+
+    # 2. Generation with bounded concurrency, reporting each job as it completes
+    stage_started = time.perf_counter()
+    prompts = [build_generation_prompt(job["spec"], framework, build_context(docs)) for job, docs in zip(jobs, documents)]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_generate, prompt, job["domain"]): job for prompt, job in zip(prompts, jobs)}
+        for future in as_completed(futures):
+            job = futures[future]
+            job["code"], job["generation_seconds"] = future.result()
+            job["generated"] = job["code"] is not None
+            yield {"stage": "generation", "status": "done" if job["generated"] else "failed", "job": job["job"],
+                   "spec": job["spec"], "environment": job["environment"],
+                   "seconds": round(job["generation_seconds"], 3)}
+    timings["generation"] = time.perf_counter() - stage_started
+    generated = [job for job in jobs if job["generated"]]
+    yield {"stage": "generation", "status": "done", "generated": len(generated),
+           "failed": len(jobs) - len(generated), "seconds": round(timings["generation"], 3)}
+
+    # 3. Compile gate + one parallel Maven invocation for every generated class
+    stage_started = time.perf_counter()
+    results = execute_java_tests([job["code"] for job in generated], thread_count=thread_count) if generated else []
+    for job, result in zip(generated, results):
+        job["result"] = result
+    timings["execution"] = time.perf_counter() - stage_started
+    yield {"stage": "execution", "status": "done", "executed": len(results),
+           "passed": sum(result.passed for result in results), "seconds": round(timings["execution"], 3)}
+
+    timings["total"] = time.perf_counter() - started
+    yield {"stage": "report", "status": "done", "report": build_report(jobs, timings)}
+
+
+def _generate(prompt, domain):
+    started = time.perf_counter()
+    response = get_llm_response(prompt, domain=domain)
+    code = None if response == ERROR_RESPONSE else extract_java_code(response)
+    return code, time.perf_counter() - started
+
+
+def build_report(jobs, timings):
+    """
+    Build the consolidated report: totals, per-stage timings and one entry per job.
+    """
+    entries = []
+    for job in jobs:
+        result = job.get("result")
+        entries.append({
+            "spec": job["spec"],
+            "environment": job["environment"],
+            "domain": job["domain"],
+            "status": result.status if result else "GENERATION_FAILED",
+            "class_name": result.class_name if result else None,
+            "cached": result.cached if result else False,
+            "generation_seconds": round(job.get("generation_seconds", 0.0), 3),
+            "tests": [asdict(test) for test in result.tests] if result else [],
+            "diagnostics": result.diagnostics if result else [],
+            "code": job.get("code"),
+        })
+    statuses = [entry["status"] for entry in entries]
+    return {
+        "summary": {
+            "jobs": len(entries),
+            **{status.lower(): statuses.count(status)
+               for status in ("PASS", "FAIL", "COMPILE_ERROR", "ERROR", "GENERATION_FAILED")},
+            "seconds": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+        },
+        "results": entries,
+    }
+
+
+def format_report_markdown(report):
+    """
+    Render the consolidated report as a Markdown table.
+    """
+    summary = report["summary"]
+    lines = [
+        "# Batch test report",
+        "",
+        f"{summary['jobs']} jobs: {summary['pass']} passed, {summary['fail']} failed, "
+        f"{summary['compile_error']} did not compile, {summary['error']} errors, "
+        f"{summary['generation_failed']} not generated.",
+        "",
+        "Stage timings: " + ", ".join(f"{stage} {seconds}s" for stage, seconds in summary["seconds"].items()),
+        "",
+        "| Spec | Environment | Status | Tests | Notes |",
+        "| --- | --- | --- | --- | --- |",
+    ]
+    for entry in report["results"]:
+        passed = sum(test["status"] == "passed" for test in entry["tests"])
+        notes = "; ".join(test["message"] for test in entry["tests"] if test.get("message"))
+        notes = notes or "; ".join(diagnostic["message"] for diagnostic in entry["diagnostics"])
+        if entry["cached"]:
+            notes = ("cached. " + notes).strip()
+        lines.append(f"| {entry['spec']} | {entry['environment']} | {entry['status']} | "
+                     f"{passed}/{len(entry['tests'])} | {notes.replace('|', '/')[:200]} |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and run a suite of tests from natural-language specs.")
+    parser.add_argument("--spec", dest="specs", action="append", default=[], help="A test spec (repeatable).")
+    parser.add_argument("--specs-file", help="File with one spec per line.")
+    parser.add_argument("--env", dest="environments", nargs="+", default=["PROD"], help="QA, STAGE and/or PROD.")
+    parser.add_argument("--framework", default=DEFAULT_FRAMEWORK)
+    parser.add_argument("--concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="Concurrent LLM generations.")
+    parser.add_argument("--threads", type=int, default=4, help="Test classes run in parallel.")
+    parser.add_argument("--report", help="Write the JSON report to this file.")
+    parser.add_argument("--markdown", help="Write the Markdown report to this file.")
+    args = parser.parse_args(argv)
+
+    specs = list(args.specs)
+    if args.specs_file:
+        with open(args.specs_file) as f:
+            specs.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not specs:
+        parser.error("Provide at least one --spec or a --specs-file.")
+
+    report = None
+    for event in run_pipeline(specs, args.environments, args.framework, args.concurrency, args.threads):
+        if event["stage"] == "report":
+            report = event["report"]
+        elif "job" in event:
+            print(f"[{event['stage']}] {event['status']}: {event['spec']} ({event['environment']}) in {event['seconds']}s")
+        else:
+            details = ", ".join(f"{key}={value}" for key, value in event.items() if key not in ("stage", "status"))
+            print(f"[{event['stage']}] {event['status']} - {details}")
+
+    markdown = format_report_markdown(report)
+    print("\n" + markdown)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(markdown)
+
+
+if __name__ == "__main__":
+    main()
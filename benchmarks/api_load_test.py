@@ -0,0 +1,139 @@
+# Load test of the backend service (api_server.py) at rising client concurrency.
+# The service runs in-process with a fake answer pipeline: one streamed call to the fake LLM backend
+# per request (FAKE latency, no API key, model or knowledge base needed), so the numbers show the
+# queueing, streaming and coalescing overhead of the service itself. Reports p50/p95 latency,
+# throughput and how many requests were coalesced or rejected (503) per concurrency level:
+#   python benchmarks/api_load_test.py --requests 200 --concurrency 1 4 16 64 --latency 0.2
+#   python benchmarks/api_load_test.py --duplicates 0.5      # half the requests repeat an earlier query
+#   python benchmarks/api_load_test.py --url http://127.0.0.1:8000   # against a running service instead
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+from api_server import create_app  # noqa: E402
+from llm_backends import FakeBackend  # noqa: E402
+
+
+def fake_pipeline(query, environment, chat_history, cancel):
+    # Stand-in for the agent: a single streamed LLM call, uncached so every request reaches the fake LLM
+    return llm_client.stream_llm_response(f"Answer for {environment}: {query}", use_cache=False)
+
+
+def start_service(max_concurrency, max_queue):
+    """
+    Run the service with the fake pipeline on a free local port in a daemon thread; returns its URL.
+    """
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    app = create_app(fake_pipeline, max_concurrency=max_concurrency, max_queue=max_queue, warm_up=False)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def _one(client, url, query):
+    started = time.perf_counter()
+    first_chunk = None
+    async with client.stream("POST", f"{url}/query/stream", json={"query": query}) as response:
+        if response.status_code == 503:
+            return "rejected", time.perf_counter() - started, None
+        async for line in response.aiter_lines():
+            if line and first_chunk is None and "text" in json.loads(line):
+                first_chunk = time.perf_counter() - started
+    return "ok", time.perf_counter() - started, first_chunk
+
+
+async def run_level(url, concurrency, total, duplicates, seed=0):
+    """
+    Send `total` requests from `concurrency` concurrent clients; returns latency and throughput figures.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for index in range(total):
+        if queries and rng.random() < duplicates:
+            queries.append(rng.choice(queries[-concurrency:]))
+        else:
+            queries.append(f"Are there known login bugs? (request {concurrency}-{index})")
+
+    pending = iter(queries)
+    results = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        before = (await client.get(f"{url}/stats")).json()
+
+        async def _client():
+            for query in pending:
+                results.append(await _one(client, url, query))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = (await client.get(f"{url}/stats")).json()
+
+    latencies = sorted(seconds for status, seconds, _ in results if status == "ok")
+    first_chunks = sorted(seconds for status, _, seconds in results if status == "ok" and seconds is not None)
+
+    def _pct(values, fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))] * 1000, 1) if values else None
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "rejected": sum(1 for status, _, _ in results if status == "rejected"),
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "p50_ms": _pct(latencies, 0.5),
+        "p95_ms": _pct(latencies, 0.95),
+        "first_chunk_p50_ms": _pct(first_chunks, 0.5),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the backend service with a fake LLM.")
+    parser.add_argument("--url", help="Test a running service instead of starting one with the fake pipeline.")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM seconds before the first chunk.")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="Fraction of requests repeating a recent query (coalescing).")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Service worker slots.")
+    parser.add_argument("--max-queue", type=int, default=32, help="Service queue size.")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    url = args.url
+    if not url:
+        llm_client.set_backend(FakeBackend(latency=args.latency))
+        url = start_service(args.max_concurrency, args.max_queue)
+
+    results = [asyncio.run(run_level(url, level, args.requests, args.duplicates)) for level in args.concurrency]
+
+    columns = ["concurrency", "ok", "rejected", "coalesced", "p50_ms", "p95_ms", "first_chunk_p50_ms", "throughput_rps"]
+    print(f"{args.requests} requests per level against {url}")
+    print("".join(f"{column:>20}" for column in columns))
+    for result in results:
+        print("".join(f"{str(result[column]):>20}" for column in columns))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
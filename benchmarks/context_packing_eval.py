@@ -0,0 +1,92 @@
+# Prompt size, retrieval latency and context quality of test-case generation:
+# the legacy path (instructions + request embedded for retrieval, full documents wrapped in the
+# generic RAG prompt) vs the current one (request-only retrieval query, token-budgeted context).
+#   python benchmarks/context_packing_eval.py
+#   LLM_BACKEND=fake python benchmarks/context_packing_eval.py --generate   # also time generation
+# Context recall is the share of each spec's relevant documents that made it into the prompt.
+# With --generate, the share of responses whose code passes the syntax gate is reported too.
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import java_preflight  # noqa: E402
+from code_generator import build_generation_prompt, build_generation_query, extract_java_code  # noqa: E402
+from context_packer import estimate_tokens  # noqa: E402
+from llm_client import get_llm_response  # noqa: E402
+from rag_system import build_context, build_rag_prompt, domain_for_environment, format_context, retrieve_documents  # noqa: E402
+
+DEFAULT_SPECS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "generation_specs.jsonl")
+FRAMEWORK = "Selenium Java TestNG"
+
+
+def legacy_prompt(spec, domain):
+    query = build_generation_query(spec, FRAMEWORK)
+    started = time.perf_counter()
+    documents = retrieve_documents(query, domain)
+    retrieval_seconds = time.perf_counter() - started
+    return build_rag_prompt(query, format_context(documents)), retrieval_seconds
+
+
+def packed_prompt(spec, domain):
+    started = time.perf_counter()
+    documents = retrieve_documents(spec, domain)
+    retrieval_seconds = time.perf_counter() - started
+    return build_generation_prompt(spec, FRAMEWORK, build_context(documents)), retrieval_seconds
+
+
+def evaluate(specs, build_prompt, generate=False):
+    """
+    Return mean prompt tokens, retrieval latency, context recall and (optionally) generation results.
+    """
+    tokens, retrieval, recall, generation, valid = [], [], [], [], []
+    for item in specs:
+        prompt, retrieval_seconds = build_prompt(item["spec"], domain_for_environment(item["environment"]))
+        tokens.append(estimate_tokens(prompt))
+        retrieval.append(retrieval_seconds * 1000)
+        found = [doc_id for doc_id in item["relevant"]
+                 if f"Document ID: {doc_id}," in prompt or f"Document ID: {doc_id}#" in prompt]
+        recall.append(len(found) / len(item["relevant"]))
+        if generate:
+            started = time.perf_counter()
+            response = get_llm_response(prompt, use_cache=False)
+            generation.append(time.perf_counter() - started)
+            valid.append(not java_preflight.syntax_check(extract_java_code(response)))
+
+    result = {
+        "prompt_tokens": round(statistics.mean(tokens), 1),
+        "retrieval_ms": round(statistics.median(retrieval), 2),
+        "context_recall": round(statistics.mean(recall), 3),
+    }
+    if generate:
+        result["generation_s"] = round(statistics.mean(generation), 3)
+        result["valid_code"] = round(statistics.mean(valid), 3)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare legacy and token-budgeted generation prompts.")
+    parser.add_argument("--specs", default=DEFAULT_SPECS, help="JSONL file of {spec, environment, relevant}.")
+    parser.add_argument("--generate", action="store_true", help="Also call the LLM and check the generated code.")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    with open(args.specs) as f:
+        specs = [json.loads(line) for line in f if line.strip()]
+    results = {"legacy": evaluate(specs, legacy_prompt, args.generate),
+               "packed": evaluate(specs, packed_prompt, args.generate)}
+
+    print(f"{len(specs)} specs")
+    for name, result in results.items():
+        print(f"{name:<8}" + "  ".join(f"{key}={value}" for key, value in result.items()))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
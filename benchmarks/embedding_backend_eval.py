@@ -0,0 +1,175 @@
+# Embedding backend comparison: PyTorch SentenceTransformer vs ONNX Runtime vs int8-quantized ONNX.
+# Each backend runs in its own process so load time and peak memory are measured separately.
+# Reports model load time, bulk throughput (texts/sec, optionally on several processes), single-query
+# latency p50/p95, peak RSS, and drift from the baseline backend: mean cosine similarity between
+# the two backends' vectors for the same texts, and overlap of the top-k neighbours of the labeled
+# queries over the corpus (how much retrieval results would change):
+#   python benchmarks/embedding_backend_eval.py --docs 5000 --backends sentence-transformers onnx onnx-int8
+#   python benchmarks/embedding_backend_eval.py --processes 4      # also time the multi-process EncodePool
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "labeled_queries.jsonl")
+
+_SUBJECTS = ["login", "checkout", "payment gateway", "dashboard", "sign-up form", "password reset", "search",
+             "profile page", "Google sign-in button", "donation flow", "session timeout", "file upload"]
+_KINDS = ["Bug: {env} {subject} fails with 'Element not interactable' after page reload on {browser}. [WEB-{n}]",
+          "How to test the {subject} in Selenium Java: find elements by id, use WebDriverWait, assert the result.",
+          "Feature: {env} new {subject} layout for beta users. Test element ID '{element}'.",
+          "Alert: {env} {subject} response times exceeding {ms}ms under load. Monitor the '{element}' metric.",
+          "Guideline: locators for the {subject} must use By.id or By.cssSelector; avoid absolute XPaths."]
+
+
+def synthetic_corpus(count, seed=7):
+    """
+    Build a deterministic corpus of knowledge-base-like documents (bugs, guides, features, alerts).
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for n in range(count):
+        subject = rng.choice(_SUBJECTS)
+        corpus.append(rng.choice(_KINDS).format(
+            env=rng.choice(["QA", "STAGE", "PROD"]), subject=subject, browser=rng.choice(["Chrome", "Firefox", "Edge"]),
+            n=400 + n, element=subject.split()[0] + rng.choice(["Welcome", "Button", "Response", "Panel"]),
+            ms=rng.choice([300, 500, 800])))
+    return corpus
+
+
+def load_queries(path):
+    with open(path) as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(kind, corpus, queries, output, processes, repeats):
+    """
+    Measure one backend in this process and save its vectors to `output` (.npz).
+    """
+    from embedding_backends import EncodePool, create_embedding_backend
+
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    backend = create_embedding_backend(kind)
+    load_seconds = time.perf_counter() - started
+    backend.encode(corpus[:32]) # Warm up
+
+    started = time.perf_counter()
+    corpus_vectors = backend.encode(corpus, batch_size=64)
+    encode_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            backend.encode([query])
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    result = {
+        "backend": backend.name,
+        "load_seconds": round(load_seconds, 2),
+        "texts_per_sec": round(len(corpus) / encode_seconds, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 2),
+        "query_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "model_rss_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+    if processes > 1:
+        with EncodePool(processes, kind) as pool:
+            pool.encode(corpus[:processes * 32]) # Start the processes and load their models
+            started = time.perf_counter()
+            pool.encode(corpus, batch_size=64)
+            result[f"texts_per_sec_{processes}_processes"] = round(len(corpus) / (time.perf_counter() - started), 1)
+
+    np.savez(output, corpus=corpus_vectors, queries=backend.encode(queries))
+    return result
+
+
+def drift(baseline, candidate, k):
+    """
+    Mean/min cosine similarity between two backends' corpus vectors and top-k neighbour overlap for the queries.
+    """
+    cosines = np.sum(baseline["corpus"] * candidate["corpus"], axis=1)
+
+    def top_k(vectors):
+        return np.argsort(-(vectors["queries"] @ vectors["corpus"].T), axis=1)[:, :k]
+
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(top_k(baseline), top_k(candidate))]
+    return {"mean_cosine": round(float(cosines.mean()), 4), "min_cosine": round(float(cosines.min()), 4),
+            f"top{k}_overlap": round(float(np.mean(overlap)), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare embedding backends: speed, memory and drift.")
+    parser.add_argument("--backends", nargs="+", default=["sentence-transformers", "onnx", "onnx-int8"],
+                        help="Backends to compare; the first is the drift baseline.")
+    parser.add_argument("--docs", type=int, default=2000, help="Synthetic corpus size.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSONL file with a 'query' per line.")
+    parser.add_argument("--processes", type=int, default=1, help="Also time an EncodePool with this many processes.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repetitions per single query.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours compared for retrieval drift.")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    corpus, queries = synthetic_corpus(args.docs), load_queries(args.queries)
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, corpus, queries, args.output, args.processes, args.repeats)))
+        return
+
+    results, vectors = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.backends:
+            output = os.path.join(tmp, f"{kind}.npz")
+            command = [sys.executable, os.path.abspath(__file__), "--worker", kind, "--output", output,
+                       "--docs", str(args.docs), "--queries", args.queries,
+                       "--processes", str(args.processes), "--repeats", str(args.repeats)]
+            print(f"Measuring {kind}...")
+            completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT,
+                                       env={**os.environ, "EMBEDDING_CACHE_ENABLED": "0"})
+            if completed.returncode != 0:
+                print(f"  {kind} failed:\n{completed.stderr[-2000:]}")
+                continue
+            results[kind] = json.loads(completed.stdout.strip().splitlines()[-1])
+            vectors[kind] = dict(np.load(output))
+
+    if not results:
+        return
+    baseline = args.backends[0] if args.backends[0] in vectors else next(iter(vectors))
+    for kind in results:
+        results[kind].update(drift(vectors[baseline], vectors[kind], args.k))
+
+    columns = ["load_seconds", "texts_per_sec", "query_p50_ms", "query_p95_ms", "peak_rss_mb",
+               "mean_cosine", f"top{args.k}_overlap"]
+    if args.processes > 1:
+        columns.insert(2, f"texts_per_sec_{args.processes}_processes")
+    print(f"\n{args.docs} documents, {len(queries)} queries, drift baseline: {baseline}")
+    print(f"{'backend':<22}" + "".join(f"{column:>{max(len(column), 8) + 2}}" for column in columns))
+    for kind, result in results.items():
+        print(f"{kind:<22}" + "".join(f"{result.get(column, ''):>{max(len(column), 8) + 2}}" for column in columns))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Local fake LLM server for tests and benchmarks.
+# Speaks the protocol of llm_backends.HTTPBackend: POST /generate {"prompt", "temperature", "model"}
+# -> {"text", "prompt_tokens", "output_tokens"}, with a configurable latency and rate-limit error rate.
+# With "stream": true the answer is sent as newline-delimited {"text": "<chunk>"} objects.
+#   python benchmarks/fake_llm_server.py --port 8765 --latency 0.2 --failure-rate 0.05
+#   LLM_BACKEND=http LLM_BACKEND_URL=http://127.0.0.1:8765 streamlit run app.py
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_backends import fake_completion_text, split_into_chunks  # noqa: E402
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so clients can pool connections
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = body.get("prompt", "")
+
+        time.sleep(self.server.latency)
+        if self.server.failure_rate and self.server.random.random() < self.server.failure_rate:
+            self._send_json(429, {"error": "rate limited"})
+            return
+        text = fake_completion_text(prompt)
+        if body.get("stream"):
+            self._send_stream(text)
+            return
+        self._send_json(200, {"text": text, "prompt_tokens": len(prompt) // 4, "output_tokens": len(text) // 4})
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in split_into_chunks(text):
+            line = (json.dumps({"text": chunk}) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+
+def start_server(host="127.0.0.1", port=8765, latency=0.05, failure_rate=0.0, seed=None, chunk_delay=0.01):
+    """
+    Start the fake LLM server in a daemon thread and return it. Use port=0 to pick a free port
+    (read it back from server.server_address).
+    """
+    server = ThreadingHTTPServer((host, port), FakeLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.chunk_delay = chunk_delay
+    server.random = random.Random(seed)
+    threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local fake LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per response.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    args = parser.parse_args(argv)
+
+    server = start_server(args.host, args.port, args.latency, args.failure_rate)
+    print(f"Fake LLM server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Import-time (cold-start) benchmark.
+# Each module is imported in a fresh interpreter, several times, and the median wall time is reported.
+# With --baseline-ref the same measurement is taken on an older commit (exported with `git archive`)
+# so the before/after startup latency can be compared side by side:
+#   python benchmarks/import_time.py --baseline-ref HEAD~1
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["llm_client", "rag_system", "code_generator", "test_runner", "agent_orchestrator", "data_ingestion"]
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started)"
+)
+WARM_UP_SNIPPET = (
+    "import time; started = time.perf_counter(); import resources; "
+    "resources.warm_up(resources.DEFAULT_WARM_UP, background=False); "
+    "print(time.perf_counter() - started)"
+)
+
+
+def _time_snippet(tree, snippet, env):
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=tree, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_tree(tree, modules, repeats, env):
+    """
+    Return {module: median import seconds (or None if the import failed)} for a source tree.
+    """
+    timings = {}
+    for module in modules:
+        samples = [_time_snippet(tree, IMPORT_SNIPPET.format(module=module), env) for _ in range(repeats)]
+        samples = [sample for sample in samples if sample is not None]
+        timings[module] = statistics.median(samples) if samples else None
+    return timings
+
+
+def export_ref(ref, destination):
+    """
+    Export the tracked files of a git ref into a directory.
+    """
+    archive = subprocess.run(["git", "archive", "--format=tar", ref], cwd=REPO_ROOT,
+                             capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", destination], input=archive.stdout, check=True)
+
+
+def _format(seconds):
+    return "failed" if seconds is None else f"{seconds * 1000:9.1f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure module import (cold-start) latency.")
+    parser.add_argument("--baseline-ref", help="git ref to compare against, e.g. HEAD~1")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--warm-up", action="store_true", help="Also time building every shared resource.")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    # The baseline raises at import time without a key; a dummy one is enough to measure imports
+    env.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+
+    # Run both trees from scratch directories so a baseline that ingests at import time cannot touch ./chroma_db
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="import_bench_")
+    try:
+        current_tree = os.path.join(scratch, "current")
+        shutil.copytree(REPO_ROOT, current_tree, ignore=shutil.ignore_patterns(".git", "chroma_db", "__pycache__", "*.sqlite3*"))
+        results["current"] = measure_tree(current_tree, args.modules, args.repeats, env)
+        if args.warm_up:
+            results["current_warm_up"] = _time_snippet(current_tree, WARM_UP_SNIPPET, env)
+        if args.baseline_ref:
+            baseline_tree = os.path.join(scratch, "baseline")
+            os.makedirs(baseline_tree)
+            export_ref(args.baseline_ref, baseline_tree)
+            results["baseline"] = measure_tree(baseline_tree, args.modules, args.repeats, env)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    header = f"{'module':<22}{'current':>13}"
+    if "baseline" in results:
+        header += f"{'baseline':>13}{'speedup':>10}"
+    print(header)
+    for module in args.modules:
+        current = results["current"][module]
+        line = f"{module:<22}{_format(current):>13}"
+        if "baseline" in results:
+            baseline = results["baseline"][module]
+            speedup = f"{baseline / current:8.1f}x" if current and baseline else "       -"
+            line += f"{_format(baseline):>13}{speedup:>10}"
+        print(line)
+    if "current_warm_up" in results:
+        print(f"\nBuilding all shared resources (warm-up): {_format(results['current_warm_up'])}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Throughput of sequential get_llm_response calls vs generate_many at rising concurrency,
+# measured against the local fake LLM server (no API key or network needed):
+#   python benchmarks/llm_concurrency.py --prompts 64 --latency 0.2 --failure-rate 0.05
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+from benchmarks.fake_llm_server import start_server  # noqa: E402
+from llm_backends import HTTPBackend  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LLM client against a fake LLM server.")
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args(argv)
+
+    server = start_server(port=0, latency=args.latency, failure_rate=args.failure_rate, seed=0)
+    llm_client.set_backend(HTTPBackend(f"http://127.0.0.1:{server.server_address[1]}"))
+    prompts = [f"Explain known login bug number {i}" for i in range(args.prompts)]
+
+    started = time.perf_counter()
+    for prompt in prompts:
+        llm_client.get_llm_response(prompt, use_cache=False)
+    sequential = time.perf_counter() - started
+    print(f"{'mode':<24}{'seconds':>10}{'prompts/s':>12}")
+    print(f"{'sequential (blocking)':<24}{sequential:>10.2f}{args.prompts / sequential:>12.1f}")
+
+    for concurrency in args.concurrency:
+        started = time.perf_counter()
+        results = llm_client.generate_many(prompts, concurrency=concurrency, use_cache=False, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        failures = sum(isinstance(result, Exception) for result in results)
+        label = f"generate_many c={concurrency}"
+        print(f"{label:<24}{elapsed:>10.2f}{args.prompts / elapsed:>12.1f}" + (f"  ({failures} failed)" if failures else ""))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
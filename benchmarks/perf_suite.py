@@ -0,0 +1,359 @@
+# Retrieval and end-to-end performance suite, compared against a stored baseline.
+# For each knowledge-base size it builds a synthetic knowledge base, spread over the QA, STAGE, PROD
+# and general domains, in a fresh ChromaDB directory (one process per size). It then measures:
+#   - ingestion:        add_document (one call per document) and bulk_ingest throughput
+#   - retrieve_context: latency percentiles (and first-query latency, which builds the BM25 index)
+#   - retrieval recall: recall@k and MRR on generated labeled queries
+#   - query_llm_with_rag and run_agent_query end to end, with a deterministic fake LLM (no latency),
+#     a scripted ReAct chat model and the stub Maven runner (java_stub_project/fake_mvn.py)
+# Results are written as JSON and compared metric by metric with the baseline; regressions beyond
+# the tolerance are flagged (and fail the run with --fail-on-regression):
+#   python benchmarks/perf_suite.py --sizes 1000 10000 --save-baseline   # record a baseline
+#   python benchmarks/perf_suite.py --sizes 1000 10000 --fail-on-regression
+#   python benchmarks/perf_suite.py --sizes 1000 10000 100000 1000000 --embedding-backend hashing
+# The default "hashing" embedding backend (hashed bag of words, registered by this script) keeps the
+# model out of the measurement so large sizes are practical; pass sentence-transformers, onnx or
+# onnx-int8 to include the real model.
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+
+ENVIRONMENTS = ["QA", "STAGE", "PROD", None]   # None: a 'general' document
+DOMAINS = {"QA": "my.qa.charitableimpact.com", "STAGE": "my.stg.charitableimpact.com",
+           "PROD": "my.charitableimpact.com", None: "general"}
+COMPONENTS = ["login", "checkout", "payment gateway", "dashboard", "sign-up form", "password reset",
+              "search results", "profile page", "donation flow", "session timeout", "file upload", "notifications"]
+SYMPTOMS = ["element not interactable", "stale element reference", "timeout waiting for spinner",
+            "redirect to invalid_session", "wrong currency format", "button not clickable",
+            "blank page after reload", "duplicate submission", "missing validation message", "slow response"]
+BROWSERS = ["Chrome", "Firefox", "Edge"]
+TYPES = ["bug_report", "test_case", "guideline", "release_note"]
+FILLER = ["Reproduced on the nightly build.", "Use explicit waits rather than sleeps.",
+          "Locators should use By.id where possible.", "Screenshots are attached to the ticket.",
+          "The issue was first seen after the last deployment.", "Covered by the regression suite.",
+          "Page objects wrap every interaction with the page.", "Retry once before failing the test."]
+
+
+# --- Synthetic knowledge base ---
+
+def document_attributes(index):
+    """
+    Deterministic attributes of synthetic document `index`: (environment, component, symptom, browser, type).
+    """
+    rng = random.Random(index)
+    return (rng.choice(ENVIRONMENTS), rng.choice(COMPONENTS), rng.choice(SYMPTOMS), rng.choice(BROWSERS),
+            rng.choice(TYPES))
+
+
+def make_document(index):
+    environment, component, symptom, browser, doc_type = document_attributes(index)
+    rng = random.Random(-index - 1)
+    prefix = f"{environment} environment: " if environment else ""
+    content = (f"{doc_type.replace('_', ' ').capitalize()}: {prefix}{component} shows '{symptom}' on {browser}. "
+               f"[WEB-{10000 + index}] " + " ".join(rng.sample(FILLER, rng.randint(1, 5))))
+    metadata = {"type": doc_type, "domain": DOMAINS[environment], "browser": browser}
+    if environment:
+        metadata["environment"] = environment
+    return {"id": f"doc-{index}", "content": content, "metadata": metadata}
+
+
+def make_queries(size, count):
+    """
+    Build labeled queries: each asks about the (component, symptom, browser) of an existing document, in its
+    environment. Relevant documents are all documents with that combination in the environment or 'general'.
+    """
+    queries = []
+    for position in range(count):
+        environment, component, symptom, browser, _ = document_attributes(position * size // count)
+        environment = environment or "PROD"
+        queries.append({"query": f"Known {component} issues with {symptom} on {browser} in {environment}",
+                        "environment": environment, "key": (component, symptom, browser), "relevant": set()})
+    by_key = {}
+    for query in queries:
+        by_key.setdefault(query["key"], []).append(query)
+    for index in range(size):
+        environment, component, symptom, browser, _ = document_attributes(index)
+        for query in by_key.get((component, symptom, browser), []):
+            if environment is None or environment == query["environment"]:
+                query["relevant"].add(f"doc-{index}")
+    return queries
+
+
+# --- Hashing embedding backend (benchmark only) ---
+
+def _register_hashing_backend(dimension=384):
+    from embedding_backends import BACKENDS, EmbeddingBackend
+
+    class HashingBackend(EmbeddingBackend):
+        # Hashed bag of words and word bigrams: deterministic, fast, and similar texts get similar vectors
+        kind = "hashing"
+
+        def encode(self, texts, batch_size=64, **kwargs):
+            matrix = np.zeros((len(texts), dimension), dtype=np.float32)
+            for row, text in enumerate(texts):
+                words = re.findall(r"\w+", text.lower())
+                for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                    digest = zlib.crc32(token.encode("utf-8"))
+                    matrix[row, digest % dimension] += 1.0 if digest & 0x80000000 else -1.0
+            return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    BACKENDS["hashing"] = HashingBackend
+
+
+def _scripted_chat_llm():
+    # ReAct chat model for the agent: one knowledge-base lookup, then a final answer
+    from langchain_core.language_models.fake import FakeListLLM
+    return FakeListLLM(responses=[
+        "Thought: I should check the knowledge base.\nAction: QueryKnowledgeBase\nAction Input: known login bugs",
+        "Thought: I now know the final answer\nFinal Answer: The known login bugs are listed above.",
+    ])
+
+
+# --- Worker: one knowledge-base size ---
+
+def _percentiles(seconds):
+    ordered = sorted(seconds)
+    if not ordered:
+        return {}
+    return {"p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2)}
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    if hasattr(result, "__next__"):
+        result = "".join(result)
+    return time.perf_counter() - started, result
+
+
+def run_size(size, query_count, add_docs, repeats, ks):
+    """
+    Build a knowledge base of `size` documents in this process (CHROMA_PATH is a fresh directory) and measure it.
+    """
+    import resources
+
+    if os.environ.get("EMBEDDING_BACKEND") == "hashing":
+        _register_hashing_backend()
+    resources.register("chat_llm", _scripted_chat_llm)
+
+    import data_ingestion
+    import rag_system
+
+    result = {"size": size}
+    add_docs = min(add_docs, size)
+
+    # Ingestion: individual add_document calls, then the rest in bulk
+    started = time.perf_counter()
+    for index in range(add_docs):
+        document = make_document(index)
+        data_ingestion.add_document(document["id"], document["content"], document["metadata"])
+    add_seconds = time.perf_counter() - started
+    stats = data_ingestion.bulk_ingest((make_document(index) for index in range(add_docs, size)), verbose=False)
+    result["ingest"] = {"add_document_docs_per_sec": round(add_docs / add_seconds, 1) if add_docs else None,
+                        "bulk_docs_per_sec": stats["docs_per_sec"], "bulk_seconds": stats["seconds"]}
+
+    queries = make_queries(size, query_count)
+    domains = [rag_system.domain_for_environment(query["environment"]) for query in queries]
+
+    # retrieve_context latency; the first query also builds the BM25 index
+    first_seconds, _ = _timed(rag_system.retrieve_context, queries[0]["query"], domains[0])
+    latencies = [_timed(rag_system.retrieve_context, query["query"], domain)[0]
+                 for _ in range(repeats) for query, domain in zip(queries, domains)]
+    result["retrieve_context"] = {**_percentiles(latencies), "first_query_ms": round(first_seconds * 1000, 2)}
+
+    # Recall@k and MRR
+    max_k = max(ks)
+    recall = {k: [] for k in ks}
+    reciprocal_ranks = []
+    for query, domain in zip(queries, domains):
+        documents = rag_system.retrieve_documents(query["query"], domain, n_results=max_k)
+        ranked = [str(document["meta"].get("parent_id", document["id"])) for document in documents]
+        for k in ks:
+            recall[k].append(len(query["relevant"] & set(ranked[:k])) / min(k, len(query["relevant"])))
+        rank = next((position for position, doc_id in enumerate(ranked, 1) if doc_id in query["relevant"]), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    result["retrieval"] = {**{f"recall@{k}": round(float(np.mean(values)), 3) for k, values in recall.items()},
+                           "mrr": round(float(np.mean(reciprocal_ranks)), 3)}
+
+    # query_llm_with_rag end to end (fake LLM, response caches off)
+    latencies = [_timed(rag_system.query_llm_with_rag, query["query"], domain)[0]
+                 for query, domain in zip(queries, domains)]
+    result["query_llm_with_rag"] = _percentiles(latencies)
+
+    # run_agent_query end to end, per request kind (direct tool dispatch or the scripted ReAct agent)
+    try:
+        from agent_orchestrator import run_agent_query
+        java = ("```java\nimport org.testng.Assert;\nimport org.testng.annotations.Test;\n\n"
+                "public class PerfSuiteTest {\n    @Test\n    public void passes() {\n"
+                "        Assert.assertTrue(true);\n    }\n}\n```")
+        kinds = {
+            "knowledge": [query["query"] for query in queries[:5]],
+            "generate": ["Write a login test for Chrome", "Generate a Selenium test for the password reset page"],
+            "run": [f"Run this test\n{java}"],
+            "multi_step": ["Look up known login bugs and then write a test that reproduces them"],
+        }
+        result["run_agent_query"] = {kind: _percentiles([_timed(run_agent_query, text)[0]
+                                                         for _ in range(repeats) for text in texts])
+                                     for kind, texts in kinds.items()}
+    except ImportError as e:
+        result["run_agent_query"] = {"skipped": str(e)}
+    return result
+
+
+# --- Baseline comparison ---
+
+def flatten(results):
+    """
+    Flatten {size: {group: {metric: value}}} into {'<size>.<group>.<metric>': value} for numeric values.
+    """
+    flat = {}
+    for entry in results:
+        for group, metrics in entry.items():
+            if not isinstance(metrics, dict):
+                continue
+            for metric, value in metrics.items():
+                if isinstance(value, dict):
+                    for name, number in value.items():
+                        if isinstance(number, (int, float)):
+                            flat[f"{entry['size']}.{group}.{metric}.{name}"] = number
+                elif isinstance(value, (int, float)):
+                    flat[f"{entry['size']}.{group}.{metric}"] = value
+    return flat
+
+
+def higher_is_better(metric):
+    return any(part in metric for part in ("per_sec", "recall@", "mrr"))
+
+
+def compare(current, baseline, tolerance, recall_tolerance, min_delta_ms=1.0):
+    """
+    Compare flattened metrics with the baseline.
+
+    Returns:
+        list: (metric, baseline, current, relative change, regressed) for metrics present in both.
+    """
+    rows = []
+    for metric in sorted(set(current) & set(baseline)):
+        old, new = baseline[metric], current[metric]
+        change = (new - old) / old if old else 0.0
+        if "recall@" in metric or metric.endswith(".mrr"):
+            regressed = old - new > recall_tolerance
+        elif higher_is_better(metric):
+            regressed = change < -tolerance
+        else:
+            # Times: relative slowdown, ignoring sub-millisecond noise
+            scale = 1000 if metric.endswith("_seconds") else 1
+            regressed = change > tolerance and (new - old) * scale > min_delta_ms
+        rows.append((metric, old, new, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrieval and end-to-end benchmark suite with baseline comparison.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=50, help="Labeled queries per size.")
+    parser.add_argument("--add-docs", type=int, default=100, help="Documents ingested one add_document call at a time.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per query.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--embedding-backend", default="hashing",
+                        help="hashing (no model), sentence-transformers, onnx or onnx-int8.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Results JSON file.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown/throughput loss.")
+    parser.add_argument("--recall-tolerance", type=float, default=0.02, help="Allowed absolute recall/MRR drop.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression.")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated knowledge bases.")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_size(args.worker, args.queries, args.add_docs, args.repeats, args.k)))
+        return 0
+
+    work_dir = tempfile.mkdtemp(prefix="aitestauto_perf_")
+    results = []
+    try:
+        for size in args.sizes:
+            directory = os.path.join(work_dir, str(size))
+            env = {
+                **os.environ,
+                "CHROMA_PATH": directory,
+                "EMBEDDING_BACKEND": args.embedding_backend,
+                "EMBEDDING_CACHE_ENABLED": "0",       # measure encoding, not the cache
+                "LLM_BACKEND": "fake",
+                "FAKE_LLM_LATENCY": "0",
+                "FAKE_LLM_FAILURE_RATE": "0",
+                "RESPONSE_CACHE_ENABLED": "0",
+                "SEMANTIC_CACHE_ENABLED": "0",
+                "TEST_RESULT_CACHE_TTL": "0",
+                "MAVEN_COMMAND": f"{sys.executable} java_stub_project/fake_mvn.py",
+                "JAVAC": "javac-disabled-for-benchmark",   # compile gate falls back to the syntax check
+                "TEST_WORKSPACE_ROOT": os.path.join(directory, "runs"),
+                "TRACING_ENABLED": "0",
+                "METRICS_PORT": "0",
+            }
+            command = [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--queries", str(args.queries),
+                       "--add-docs", str(args.add_docs), "--repeats", str(args.repeats),
+                       "--k", *[str(k) for k in args.k]]
+            print(f"Knowledge base of {size} documents...")
+            started = time.perf_counter()
+            completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT, env=env)
+            if completed.returncode != 0:
+                print(f"  failed:\n{completed.stderr[-3000:]}")
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"created_at": time.time(), "embedding_backend": args.embedding_backend,
+              "queries": args.queries, "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("embedding_backend") != args.embedding_backend:
+            print(f"Baseline uses the {baseline.get('embedding_backend')} embedding backend; comparison skipped.")
+        else:
+            rows = compare(flatten(results), flatten(baseline["results"]), args.tolerance, args.recall_tolerance)
+            print(f"\n{'metric':<52}{'baseline':>12}{'current':>12}{'change':>9}")
+            for metric, old, new, change, regressed in rows:
+                print(f"{metric:<52}{old:>12}{new:>12}{change:>+9.1%}" + ("  REGRESSION" if regressed else ""))
+            regressions = [row[0] for row in rows if row[4]]
+            print(f"\n{len(regressions)} regression(s) out of {len(rows)} metrics compared.")
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}; record one with --save-baseline.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Retrieval quality and latency: hybrid (vector + BM25 + RRF) vs the original vector-only method.
+# Uses a labeled query set (query, environment, relevant document ids) and reports recall@k,
+# MRR and latency percentiles for each mode:
+#   python data_ingestion.py                       # load the example documents first
+#   python benchmarks/retrieval_eval.py --k 1 3 5
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rag_system  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "labeled_queries.jsonl")
+
+
+def load_queries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _parent_id(doc):
+    # Chunks of one document count as that document
+    return str(doc["meta"].get("parent_id", doc["id"]))
+
+
+def evaluate(queries, mode, ks, repeats=3):
+    """
+    Return recall@k for each k, MRR and latency percentiles (ms) of one retrieval mode.
+    """
+    max_k = max(ks)
+    recall = {k: [] for k in ks}
+    reciprocal_ranks, latencies = [], []
+    for item in queries:
+        domain = rag_system.domain_for_environment(item.get("environment"))
+        rag_system.embed_query(item["query"]) # Warm the embedding cache so only retrieval is timed
+        for _ in range(repeats):
+            started = time.perf_counter()
+            documents = rag_system.retrieve_documents(item["query"], domain, n_results=max_k, mode=mode)
+            latencies.append((time.perf_counter() - started) * 1000)
+        ranked_ids = [_parent_id(doc) for doc in documents]
+        relevant = set(item["relevant"])
+        for k in ks:
+            recall[k].append(len(relevant & set(ranked_ids[:k])) / len(relevant))
+        rank = next((position for position, doc_id in enumerate(ranked_ids, start=1) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    latencies.sort()
+    return {
+        "recall": {k: round(statistics.mean(values), 3) for k, values in recall.items()},
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare hybrid and vector-only retrieval.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="Labeled JSONL query set.")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per query.")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    queries = load_queries(args.queries)
+    results = {mode: evaluate(queries, mode, args.k, args.repeats) for mode in ("vector", "hybrid")}
+
+    header = f"{'mode':<8}" + "".join(f"{'R@' + str(k):>8}" for k in args.k) + f"{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}"
+    print(f"{len(queries)} labeled queries\n{header}")
+    for mode, result in results.items():
+        print(f"{mode:<8}" + "".join(f"{result['recall'][k]:>8.3f}" for k in args.k)
+              + f"{result['mrr']:>8.3f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
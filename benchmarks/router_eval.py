@@ -0,0 +1,57 @@
+# Intent router accuracy and cost on a labeled query set.
+# For every query it reports whether the router dispatched it directly (and to the right tool)
+# or fell back to the ReAct agent, the agent LLM calls that direct dispatch saves, and the
+# routing latency (the only cost the router adds to requests that still go through the agent).
+#   python benchmarks/router_eval.py
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intent_router  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_queries.jsonl")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the intent router.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSONL file of {query, intent}.")
+    parser.add_argument("--verbose", action="store_true", help="Print every routing decision.")
+    args = parser.parse_args(argv)
+
+    with open(args.queries) as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    intent_router.route(items[0]["query"]) # Load the model and exemplar embeddings outside the timings
+
+    direct = correct = wrong = missed = 0
+    latencies = []
+    for item in items:
+        started = time.perf_counter()
+        route = intent_router.route(item["query"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        if route.confident:
+            direct += 1
+            if route.intent == item["intent"]:
+                correct += 1
+            else:
+                wrong += 1
+        elif item["intent"] != "multi_step":
+            missed += 1
+        if args.verbose:
+            print(f"{item['intent']:<14} -> {route.intent:<14} direct={route.confident!s:<5} "
+                  f"{route.reason} | {item['query'][:60]!r}")
+
+    latencies.sort()
+    print(f"{len(items)} queries: {direct} dispatched directly ({correct} correct, {wrong} wrong), "
+          f"{len(items) - direct} to the agent ({missed} simple requests missed)")
+    print(f"Agent LLM calls saved: {direct * intent_router.AGENT_CALLS_PER_TOOL_STEP}")
+    print(f"Routing latency: p50 {statistics.median(latencies):.2f} ms, "
+          f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Time-to-first-token vs total latency of streamed LLM answers, compared with the blocking call.
+# Runs against the local fake LLM server by default (no API key needed):
+#   python benchmarks/streaming_latency.py --latency 0.3 --chunk-delay 0.02
+# Use --gemini to measure the real model instead (needs GOOGLE_API_KEY).
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+from benchmarks.fake_llm_server import start_server  # noqa: E402
+from llm_backends import GeminiBackend, HTTPBackend  # noqa: E402
+
+PROMPT = "Write a Java TestNG Selenium test for logging in on Chrome with explicit waits."
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure first-token and total latency of streamed LLM answers.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency before the first chunk.")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Fake server delay between chunks.")
+    parser.add_argument("--gemini", action="store_true", help="Use the real Gemini backend.")
+    args = parser.parse_args(argv)
+
+    if args.gemini:
+        llm_client.set_backend(GeminiBackend())
+    else:
+        server = start_server(port=0, latency=args.latency, chunk_delay=args.chunk_delay)
+        llm_client.set_backend(HTTPBackend(f"http://127.0.0.1:{server.server_address[1]}"))
+
+    blocking, first_chunk, streamed_total = [], [], []
+    for run in range(args.runs):
+        prompt = f"{PROMPT} (run {run})"
+        started = time.perf_counter()
+        llm_client.get_llm_response(prompt, use_cache=False)
+        blocking.append(time.perf_counter() - started)
+
+        timer = llm_client.StreamTimer(llm_client.stream_llm_response(prompt, use_cache=False))
+        for _chunk in timer:
+            pass
+        first_chunk.append(timer.first_chunk_seconds)
+        streamed_total.append(timer.total_seconds)
+
+    print(f"blocking answer          median {statistics.median(blocking) * 1000:8.1f} ms")
+    print(f"streamed first token     median {statistics.median(first_chunk) * 1000:8.1f} ms")
+    print(f"streamed total           median {statistics.median(streamed_total) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
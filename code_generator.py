@@ -1,25 +1,69 @@
-from rag_system import query_llm_with_rag
+from llm_client import get_llm_response, stream_llm_response
+from rag_system import build_context, resolve_domain, retrieve_documents
 
-# Add env_domain as an argument to generate_test_code
-def generate_test_code(natural_language_query, framework="Selenium Java TestNG", env_domain=None):
-        system_prompt = f"""You are an expert {framework} Test Automation Engineer.
-        Generate a complete and runnable test case based on the user's request.
-        Include necessary imports, class structure, and a single @Test method.
-        Use explicit waits (WebDriverWait) for element interactions in Selenium/Playwright.
-        Use standard assertion libraries (e.g., TestNG Assert).
-        If the query mentions a browser, configure the WebDriver for that browser.
-        If a locator type (id, xpath, css) is not specified, make a reasonable guess.
-        Assume common test methods like 'driver.get()', 'driver.findElement()', 'sendKeys()', 'click()'.
-
-        Provide the code strictly within a Java code block (```java ... ```).
+
+def extract_java_code(response):
+    """
+    Extract the code from a ```java ... ``` block in an LLM response.
+    Returns the response unchanged if it has no Java code block.
+    """
+    if "```java" in response:
+        code = response.split("```java")[1].split("```")[0].strip()
+        return code
+    return response
+
+
+GENERATION_INSTRUCTIONS = """You are an expert {framework} Test Automation Engineer.
+Generate a complete and runnable test case based on the user's request.
+Include necessary imports, class structure, and a single @Test method.
+Use explicit waits (WebDriverWait) for element interactions in Selenium/Playwright.
+Use standard assertion libraries (e.g., TestNG Assert).
+If the query mentions a browser, configure the WebDriver for that browser.
+If a locator type (id, xpath, css) is not specified, make a reasonable guess.
+Assume common test methods like 'driver.get()', 'driver.findElement()', 'sendKeys()', 'click()'.
+Use the context below (known bugs, element ids, guidelines) where it applies to the request.
+
+Provide the code strictly within a Java code block (```java ... ```)."""
+
+
+def build_generation_query(natural_language_query, framework="Selenium Java TestNG"):
+        """
+        Build the instructions plus user request for generating a test case (without retrieved context).
+        Kept for callers that build their own prompt; see build_generation_prompt().
         """
         full_query = f"{natural_language_query} using {framework}"
-        
-        # Pass env_domain to query_llm_with_rag
-        response = query_llm_with_rag(system_prompt + "\nUser Query: " + full_query, env_domain=env_domain)
+        return GENERATION_INSTRUCTIONS.format(framework=framework) + "\nUser Query: " + full_query
+
+
+def build_generation_prompt(natural_language_query, framework="Selenium Java TestNG", context=""):
+        """
+        Build the prompt that generates a test case: instructions, packed context and the user request.
+        """
+        prompt = GENERATION_INSTRUCTIONS.format(framework=framework)
+        if context:
+            prompt += f"\n\nContext:\n{context}"
+        return prompt + f"\n\nUser Query: {natural_language_query} using {framework}"
+
+
+# Add env_domain as an argument to generate_test_code
+def generate_test_code(natural_language_query, framework="Selenium Java TestNG", env_domain=None, stream=False):
+        """
+        Generate a test case for a natural language request.
+
+        Context is retrieved with the request alone (the generation instructions are the same for every
+        request, so embedding them would only pull every query towards the same neighbours), packed into
+        the context token budget and placed in a single generation prompt.
+
+        With stream=True a generator is returned that yields the raw LLM output (markdown, including the
+        ```java fence) as it is produced, so the caller can render it incrementally; apply
+        extract_java_code() to the joined text to get the code.
+        """
+        # Retrieve context for the environment's domain (production by default)
+        domain = resolve_domain(env_domain)
+        documents = retrieve_documents(natural_language_query, domain_filter=domain)
+        prompt = build_generation_prompt(natural_language_query, framework, build_context(documents))
+        if stream:
+            return stream_llm_response(prompt, domain=domain)
 
         # Extract code block
-        if "```java" in response:
-            code = response.split("```java")[1].split("```")[0].strip()
-            return code
-        return response
\ No newline at end of file
+        return extract_java_code(get_llm_response(prompt, domain=domain))
@@ -0,0 +1,85 @@
+# Token-budgeted context packing for RAG prompts.
+# Retrieved documents used to be pasted into prompts whole, so a single long guideline could
+# dominate the prompt. pack_documents() keeps documents in relevance order and:
+#   - drops duplicates (same id, same normalized text, or text mostly contained in what is already packed)
+#   - truncates each document to CONTEXT_MAX_DOC_TOKENS, at a sentence or word boundary
+#   - stops adding documents once CONTEXT_TOKEN_BUDGET is spent (the last one may be truncated to fit)
+# Token counts are estimated (about 4 characters per token for English text), which is
+# accurate enough for budgeting and needs no tokenizer.
+import os
+import re
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))     # tokens for all documents
+CONTEXT_MAX_DOC_TOKENS = int(os.getenv("CONTEXT_MAX_DOC_TOKENS", "400"))  # tokens per document
+CONTEXT_MIN_DOC_TOKENS = 40          # a document truncated below this is not worth including
+NEAR_DUPLICATE_CONTAINMENT = 0.8     # share of a document's shingles already packed that makes it a duplicate
+CHARS_PER_TOKEN = 4
+_SHINGLE_WORDS = 5
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut text to about max_tokens, preferring the end of a sentence, then a word boundary.
+    Returns the text unchanged if it already fits.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+    if sentence_end >= len(cut) // 2:
+        return cut[:sentence_end + 1].rstrip() + " …"
+    word_end = cut.rfind(" ")
+    return (cut[:word_end] if word_end > 0 else cut).rstrip() + " …"
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < _SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)}
+
+
+def pack_documents(documents, token_budget=CONTEXT_TOKEN_BUDGET, max_doc_tokens=CONTEXT_MAX_DOC_TOKENS):
+    """
+    Select and trim retrieved documents so their content fits a token budget.
+
+    Args:
+        documents (list): Document dicts ('id', 'content', 'meta', ...), most relevant first.
+        token_budget (int): Maximum estimated tokens of document content in total.
+        max_doc_tokens (int): Maximum estimated tokens per document.
+
+    Returns:
+        list: Copies of the kept documents, in the same order, with 'content' possibly shortened
+              and 'truncated' set to True when it was.
+    """
+    packed = []
+    seen_ids, seen_texts, seen_shingles = set(), set(), set()
+    remaining = token_budget
+    for document in documents:
+        content = document.get("content") or ""
+        normalized = " ".join(content.lower().split())
+        if document["id"] in seen_ids or not normalized or normalized in seen_texts:
+            continue
+        shingles = _shingles(content)
+        if seen_shingles and len(shingles & seen_shingles) >= NEAR_DUPLICATE_CONTAINMENT * len(shingles):
+            continue
+
+        limit = min(max_doc_tokens, remaining)
+        if limit < min(CONTEXT_MIN_DOC_TOKENS, estimate_tokens(content)):
+            break
+        trimmed = truncate_to_tokens(content, limit)
+        packed.append({**document, "content": trimmed, "truncated": trimmed != content})
+        remaining -= estimate_tokens(trimmed)
+        seen_ids.add(document["id"])
+        seen_texts.add(normalized)
+        seen_shingles |= shingles
+        if remaining <= 0:
+            break
+    return packed
@@ -0,0 +1,269 @@
+# Bounded conversational memory for the chat agent.
+# Passing the whole chat history into every prompt makes each turn slower and more expensive as a
+# session grows, especially once full Java tests are in the history. ConversationMemory keeps the
+# prompt history under a token budget:
+#   - a rolling window of the most recent messages
+#   - a running summary of older messages, updated incrementally by the LLM in a background thread
+#     (until it is ready, a short extract of the evicted messages stands in for it)
+#   - large code blocks in earlier messages replaced by references to stored artifacts
+#     ("[artifact:1a2b3c4d java, 40 lines: public class LoginTest]"); expand_artifacts() restores them,
+#     so tools such as RunJavaTest can still be given the code
+# Artifacts a thin client sends with a request are only visible to that request (artifact_scope),
+# never written to the process-wide store, so one client cannot replace another session's artifact.
+import contextvars
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from context_packer import estimate_tokens, truncate_to_tokens
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))       # whole history, summary included
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))    # running summary
+MEMORY_WINDOW_MESSAGES = int(os.getenv("MEMORY_WINDOW_MESSAGES", "6"))    # recent messages kept verbatim
+ARTIFACT_MIN_TOKENS = int(os.getenv("MEMORY_ARTIFACT_MIN_TOKENS", "80"))  # smaller code blocks stay inline
+MAX_ARTIFACTS = int(os.getenv("MEMORY_MAX_ARTIFACTS", "1000"))
+
+_CODE_BLOCK = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+_ARTIFACT_REFERENCE = re.compile(r"\[artifact:([0-9a-f]{8})[^\]]*\]|\bartifact:([0-9a-f]{8})\b")
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a test automation assistant.
+Keep requested tests, environments, decisions, results and artifact references (e.g. artifact:1a2b3c4d).
+Reply with the updated summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+class ArtifactStore:
+    """
+    Process-wide store of large code blocks taken out of the chat history, most recent kept.
+    """
+
+    def __init__(self, max_items=MAX_ARTIFACTS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, content, artifact_id=None):
+        artifact_id = artifact_id or uuid.uuid4().hex[:8]
+        with self._lock:
+            self._items[artifact_id] = content
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return artifact_id
+
+    def get(self, artifact_id):
+        with self._lock:
+            content = self._items.get(artifact_id)
+            if content is not None:
+                self._items.move_to_end(artifact_id)
+            return content
+
+
+artifact_store = ArtifactStore()
+_scoped_artifacts = contextvars.ContextVar("scoped_artifacts", default=None)
+
+
+@contextmanager
+def artifact_scope(artifacts):
+    """
+    Make {artifact id: code} visible to expand_artifacts() in the current context only (threads started
+    with a copy of it included). Scoped artifacts take precedence over the process-wide store.
+    """
+    token = _scoped_artifacts.set(dict(artifacts or {}))
+    try:
+        yield
+    finally:
+        _scoped_artifacts.reset(token)
+
+
+def get_artifact(artifact_id):
+    scoped = _scoped_artifacts.get()
+    if scoped and artifact_id in scoped:
+        return scoped[artifact_id]
+    return artifact_store.get(artifact_id)
+
+
+def expand_artifacts(text):
+    """
+    Replace artifact references in text with the stored code (references to unknown artifacts are kept).
+    """
+    def _expand(match):
+        content = get_artifact(match.group(1) or match.group(2))
+        return content if content is not None else match.group(0)
+    return _ARTIFACT_REFERENCE.sub(_expand, text)
+
+
+def referenced_artifacts(messages):
+    """
+    Return {artifact id: code} for the stored artifacts referenced in messages ({'role', 'content'} dicts).
+    """
+    artifacts = {}
+    for message in messages:
+        for match in _ARTIFACT_REFERENCE.finditer(message["content"]):
+            artifact_id = match.group(1) or match.group(2)
+            content = get_artifact(artifact_id)
+            if content is not None:
+                artifacts[artifact_id] = content
+    return artifacts
+
+
+def compact_code_blocks(text, min_tokens=ARTIFACT_MIN_TOKENS):
+    """
+    Replace code blocks of at least min_tokens in text by artifact references.
+    """
+    def _compact(match):
+        language, code = match.group(1), match.group(2)
+        if estimate_tokens(code) < min_tokens:
+            return match.group(0)
+        artifact_id = artifact_store.put(code.strip())
+        first_line = next((line.strip() for line in code.splitlines()
+                           if re.match(r"\s*(?:public\s+)?(?:class|interface)\b", line)), code.strip().splitlines()[0])
+        return f"[artifact:{artifact_id} {language or 'code'}, {code.count(chr(10))} lines: {first_line[:80]}]"
+    return _CODE_BLOCK.sub(_compact, text)
+
+
+def _extract(messages, max_tokens):
+    # Cheap stand-in for the summary: the start of each evicted message
+    share = max(20, max_tokens // max(1, len(messages)))
+    text = "\n".join(f"{message['role']}: {truncate_to_tokens(' '.join(message['content'].split()), share)}"
+                     for message in messages)
+    return truncate_to_tokens(text, max_tokens)
+
+
+def llm_summarizer(summary, messages, max_tokens=MEMORY_SUMMARY_TOKENS):
+    """
+    Fold messages into the running summary with one LLM call.
+    """
+    from llm_client import ERROR_RESPONSE, get_llm_response
+
+    prompt = SUMMARY_PROMPT.format(
+        max_words=max_tokens * 3 // 4,
+        summary=summary or "(empty)",
+        messages="\n".join(f"{message['role']}: {message['content']}" for message in messages),
+    )
+    response = get_llm_response(prompt, temperature=0.2, use_cache=False)
+    if response == ERROR_RESPONSE:
+        raise RuntimeError("summary generation failed")
+    return truncate_to_tokens(response.strip(), max_tokens)
+
+
+_summary_pool = ThreadPoolExecutor(max_workers=int(os.getenv("MEMORY_SUMMARY_WORKERS", "2")),
+                                   thread_name_prefix="memory-summary")
+
+
+class ConversationMemory:
+    """
+    Chat history bounded by a token budget: recent messages, a running summary and artifact references.
+
+    Usage (one instance per chat session):
+        memory.add("user", query)
+        history = memory.messages_for_prompt()   # bounded; the last message is the current one, in full
+        ...
+        memory.add("assistant", answer)
+    """
+
+    def __init__(self, token_budget=MEMORY_TOKEN_BUDGET, window_messages=MEMORY_WINDOW_MESSAGES,
+                 summary_tokens=MEMORY_SUMMARY_TOKENS, summarizer=llm_summarizer, background=True):
+        self.token_budget = token_budget
+        self.window_messages = window_messages
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.background = background
+        self.summary = ""
+        self.turns = 0
+        self._recent = []        # {'role', 'content'}; every message but the newest is compacted
+        self._unsummarized = []  # evicted messages not yet folded into the summary
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+    def add(self, role, content):
+        """
+        Append a message. The previous newest message is compacted and old messages are evicted to the summary.
+        """
+        with self._lock:
+            if self._recent:
+                self._recent[-1]["content"] = compact_code_blocks(self._recent[-1]["content"])
+            self._recent.append({"role": role, "content": content})
+            self.turns += 1
+            self._evict()
+        self._schedule_summary()
+
+    def _evict(self):
+        # Keep the window within its message count and the budget left after the summary;
+        # the newest message always stays
+        budget = self.token_budget - self.summary_tokens
+        while len(self._recent) > 1 and (len(self._recent) > self.window_messages
+                                         or sum(self._tokens(message) for message in self._recent) > budget):
+            self._unsummarized.append(self._recent.pop(0))
+
+    @staticmethod
+    def _tokens(message):
+        return estimate_tokens(message["content"]) + 4
+
+    def _schedule_summary(self):
+        with self._lock:
+            if self._summarizing or not self._unsummarized:
+                return
+            self._summarizing = True
+        if self.background:
+            _summary_pool.submit(self._summarize)
+        else:
+            self._summarize()
+
+    def _summarize(self):
+        # Fold evicted messages into the summary until none are left; runs off the request path
+        while True:
+            with self._lock:
+                batch = list(self._unsummarized)
+                summary = self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                updated = self.summarizer(summary, batch, self.summary_tokens)
+            except Exception as e:
+                print(f"Conversation summary update failed, using an extract: {e}")
+                updated = _extract(([{"role": "summary", "content": summary}] if summary else []) + batch,
+                                   self.summary_tokens)
+            with self._lock:
+                self.summary = updated
+                del self._unsummarized[:len(batch)]
+
+    def summary_text(self):
+        """
+        Return the running summary plus an extract of messages it does not cover yet, within summary_tokens.
+        """
+        with self._lock:
+            summary, pending = self.summary, list(self._unsummarized)
+        if not pending:
+            return summary
+        if not summary:
+            return _extract(pending, self.summary_tokens)
+        summary = truncate_to_tokens(summary, self.summary_tokens // 2)
+        return summary + "\n" + _extract(pending, self.summary_tokens - estimate_tokens(summary))
+
+    def messages_for_prompt(self):
+        """
+        Return the bounded history as {'role', 'content'} dicts: the summary (role 'system') if any,
+        then the recent messages. The last entry is the newest message, uncompacted.
+        """
+        summary = self.summary_text()
+        with self._lock:
+            recent = [dict(message) for message in self._recent]
+        prefix = [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] if summary else []
+        return prefix + recent
+
+    def prompt_tokens(self):
+        """
+        Estimated tokens of the history returned by messages_for_prompt().
+        """
+        return sum(self._tokens(message) for message in self.messages_for_prompt())
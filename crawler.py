@@ -0,0 +1,366 @@
+# Documentation crawler feeding the knowledge base (QA wiki, release notes, bug exports).
+#   python crawler.py https://wiki.example.com/qa/ --max-pages 500 --depth 3
+#   python crawler.py https://bugs.example.com/export.json --rules crawler_rules.json
+# Pages are fetched concurrently over one pooled requests.Session, at most CRAWLER_RATE_LIMIT
+# requests per second per host. Every URL's ETag/Last-Modified is kept in CRAWLER_STATE_PATH, so
+# re-crawls send conditional GETs and unchanged pages (304) cost neither a download nor an encode.
+# HTML is parsed incrementally with lxml while it downloads, keeping only the text of each block.
+# 'type', 'domain' and 'environment' metadata come from URL rules (first match per key wins).
+# Documents stream into data_ingestion.bulk_ingest, which chunks, embeds and upserts them in batches.
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from data_ingestion import INGEST_BATCH_SIZE, bulk_ingest
+
+CRAWLER_WORKERS = int(os.getenv("CRAWLER_WORKERS", "8"))
+CRAWLER_RATE_LIMIT = float(os.getenv("CRAWLER_RATE_LIMIT", "2"))     # requests per second per host
+CRAWLER_TIMEOUT = float(os.getenv("CRAWLER_TIMEOUT", "20"))          # seconds per request
+CRAWLER_STATE_PATH = os.getenv("CRAWLER_STATE_PATH", "./crawler_state.json")
+CRAWLER_USER_AGENT = os.getenv("CRAWLER_USER_AGENT", "aitestauto-crawler/1.0")
+MAX_PAGE_BYTES = 10 * 1024 * 1024
+_READ_CHUNK = 64 * 1024
+
+# (URL regex, metadata) checked in order; for each key the first matching rule wins.
+# Override with --rules, a JSON list of {"pattern": ..., "metadata": {...}}.
+DEFAULT_URL_RULES = [
+    (r"\.stg\.|[/.-]stag(?:e|ing)\b", {"environment": "STAGE", "domain": "my.stg.charitableimpact.com"}),
+    (r"\.qa\.|/qa/", {"environment": "QA", "domain": "my.qa.charitableimpact.com"}),
+    (r"[/.-]prod(?:uction)?\b", {"environment": "PROD", "domain": "my.charitableimpact.com"}),
+    (r"/(?:bugs?|issues?|jira)/|bug[-_]?export", {"type": "bug_report"}),
+    (r"release[-_]?notes?|/releases?/|changelog", {"type": "release_note"}),
+    (r"/(?:test[-_]?cases?|tests)/", {"type": "test_case"}),
+    (r"guidelines?|standards?|/wiki/", {"type": "guideline"}),
+    (r".", {"type": "document", "domain": "general"}),
+]
+
+# Blocks whose text becomes one paragraph of the document; everything inside SKIP_TAGS is dropped
+BLOCK_TAGS = {"p", "li", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "dt", "dd", "blockquote",
+              "tr", "div", "section", "article", "table", "ul", "ol", "dl", "body"}
+SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "svg", "form", "template"}
+
+
+def load_rules(path):
+    """
+    Load URL rules from a JSON file: [{"pattern": regex, "metadata": {...}}, ...].
+    """
+    with open(path) as f:
+        return [(rule["pattern"], rule["metadata"]) for rule in json.load(f)]
+
+
+def metadata_for_url(url, rules=DEFAULT_URL_RULES):
+    """
+    Derive metadata ('type', 'domain', 'environment', ...) for a URL; the first matching rule sets each key.
+    """
+    metadata = {}
+    for pattern, values in rules:
+        if re.search(pattern, url, re.IGNORECASE):
+            for key, value in values.items():
+                metadata.setdefault(key, value)
+    return metadata
+
+
+class HostRateLimiter:
+    """
+    Space out requests to each host to at most `rate` per second, across all worker threads.
+    """
+
+    def __init__(self, rate=CRAWLER_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(workers=CRAWLER_WORKERS):
+    """
+    Build a requests.Session with a connection pool per host sized for the workers and retries on transient errors.
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=workers, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = CRAWLER_USER_AGENT
+    return session
+
+
+def parse_html(chunks, base_url):
+    """
+    Parse HTML incrementally from an iterable of byte chunks.
+    Each finished block element is turned into a paragraph and cleared, so memory stays flat on large pages.
+
+    Returns:
+        tuple: (title, text, links) with links made absolute and stripped of fragments.
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    title, paragraphs, links = "", [], []
+    skipping = 0
+
+    def _drain():
+        nonlocal title, skipping
+        for event, element in parser.read_events():
+            tag = element.tag if isinstance(element.tag, str) else ""
+            if event == "start":
+                if tag in SKIP_TAGS:
+                    skipping += 1
+                elif tag == "a" and element.get("href"):
+                    links.append(urldefrag(urljoin(base_url, element.get("href").strip()))[0])
+                continue
+            if tag in SKIP_TAGS:
+                skipping -= 1
+                element.clear(keep_tail=True)
+            elif tag == "title":
+                title = " ".join("".join(element.itertext()).split())
+                element.clear(keep_tail=True)
+            elif tag in BLOCK_TAGS and not skipping:
+                # Children blocks were already emitted and cleared, so this is only the block's own text
+                text = "".join(element.itertext())
+                text = text.strip("\n") if tag == "pre" else " ".join(text.split())
+                if text:
+                    paragraphs.append(text)
+                element.clear(keep_tail=True)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        _drain()
+    parser.close()
+    _drain()
+    return title, "\n".join(paragraphs), links
+
+
+def parse_records(data, url):
+    """
+    Turn a JSON bug/test export (a list of records, or {"issues"|"items"|"records": [...]}) into documents.
+    """
+    if isinstance(data, dict):
+        data = next((data[key] for key in ("issues", "items", "records", "results") if isinstance(data.get(key), list)), [data])
+    documents = []
+    for index, record in enumerate(data):
+        if not isinstance(record, dict):
+            continue
+        fields = record.get("fields") if isinstance(record.get("fields"), dict) else record
+        key = record.get("key", record.get("id", index))
+        parts = [str(fields[name]) for name in ("title", "summary", "status", "description", "content", "body")
+                 if fields.get(name)]
+        if parts:
+            documents.append({"id": f"{url}#{key}", "content": f"[{key}] " + "\n".join(parts), "title": str(key)})
+    return documents
+
+
+class Crawler:
+    """
+    Concurrent, polite crawler producing knowledge-base documents.
+
+    Args:
+        seeds (list): Start URLs. Links are followed only to the seeds' hosts and under their paths.
+        max_pages (int): Maximum number of URLs fetched.
+        max_depth (int): Maximum link distance from a seed (0 fetches the seeds only).
+        workers (int): Concurrent requests (across all hosts).
+        rate (float): Requests per second per host.
+        rules (list): (URL regex, metadata) rules, see DEFAULT_URL_RULES.
+        state_path (str, optional): JSON file keeping validators and links per URL between runs.
+    """
+
+    def __init__(self, seeds, max_pages=500, max_depth=3, workers=CRAWLER_WORKERS, rate=CRAWLER_RATE_LIMIT,
+                 rules=DEFAULT_URL_RULES, state_path=CRAWLER_STATE_PATH, session=None, timeout=CRAWLER_TIMEOUT):
+        self.seeds = [urldefrag(url)[0] for url in seeds]
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.workers = workers
+        self.rules = rules
+        self.state_path = state_path
+        self.timeout = timeout
+        self.session = session or create_session(workers)
+        self.limiter = HostRateLimiter(rate)
+        self.state = self._load_state()
+        self.stats = {"fetched": 0, "not_modified": 0, "failed": 0, "documents": 0, "bytes": 0}
+        self._state_lock = threading.Lock()
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        with self._state_lock:
+            payload = json.dumps(self.state)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.state_path)
+
+    def _in_scope(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return False
+        for seed in self.seeds:
+            seed_parsed = urlparse(seed)
+            prefix = seed_parsed.path.rsplit("/", 1)[0] + "/"
+            if parsed.netloc == seed_parsed.netloc and parsed.path.startswith(prefix):
+                return True
+        return False
+
+    def fetch(self, url):
+        """
+        Fetch one URL with a conditional GET.
+
+        Returns:
+            tuple: (documents, links). Unchanged pages return no documents and the links stored last time.
+        """
+        with self._state_lock:
+            previous = dict(self.state.get(url, {}))
+        headers = {}
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+        self.limiter.wait(urlparse(url).netloc)
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304:
+                self._count("not_modified")
+                return [], previous.get("links", [])
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            chunks = self._limited(response.iter_content(_READ_CHUNK))
+            links = []
+            if content_type in ("text/html", "application/xhtml+xml") or not content_type:
+                title, text, links = parse_html(chunks, response.url)
+                documents = [{"id": url, "content": text, "title": title}] if text.strip() else []
+            elif content_type in ("application/json", "application/x-ndjson"):
+                raw = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = [json.loads(line) for line in raw.splitlines() if line.strip()]
+                documents = parse_records(data, url)
+            elif content_type.startswith("text/"):
+                text = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+                documents = [{"id": url, "content": text, "title": ""}] if text.strip() else []
+            else:
+                documents = []
+            validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+        links = [link for link in dict.fromkeys(links) if self._in_scope(link)]
+        with self._state_lock:
+            self.state[url] = {**validators, "links": links, "fetched_at": time.time()}
+        self._count("fetched")
+        return documents, links
+
+    def _count(self, key, amount=1):
+        with self._state_lock:
+            self.stats[key] += amount
+
+    def _limited(self, chunks):
+        total = 0
+        for chunk in chunks:
+            total += len(chunk)
+            self._count("bytes", len(chunk))
+            if total > MAX_PAGE_BYTES:
+                raise ValueError(f"page larger than {MAX_PAGE_BYTES} bytes")
+            yield chunk
+
+    def crawl(self):
+        """
+        Crawl breadth-first from the seeds, yielding documents ({'id', 'content', 'metadata'}) as pages arrive.
+        Call save_state() once the documents are stored: saved validators make the next crawl skip these pages.
+        """
+        seen = set(self.seeds)
+        queue = [(url, 0) for url in self.seeds]
+        submitted = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawler") as executor:
+            running = {}
+            while queue or running:
+                while queue and len(running) < self.workers * 2 and submitted < self.max_pages:
+                    url, depth = queue.pop(0)
+                    running[executor.submit(self.fetch, url)] = (url, depth)
+                    submitted += 1
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = running.pop(future)
+                    try:
+                        documents, links = future.result()
+                    except Exception as e:
+                        self._count("failed")
+                        print(f"Failed to fetch {url}: {e}")
+                        continue
+                    if depth < self.max_depth:
+                        for link in links:
+                            if link not in seen:
+                                seen.add(link)
+                                queue.append((link, depth + 1))
+                    for document in documents:
+                        self._count("documents")
+                        yield self._document(url, document)
+
+    def _document(self, url, document):
+        metadata = metadata_for_url(url, self.rules)
+        metadata["source"] = url
+        if document.get("title"):
+            metadata["title"] = document["title"]
+        return {"id": document["id"], "content": document["content"], "metadata": metadata}
+
+
+def crawl_and_ingest(seeds, batch_size=INGEST_BATCH_SIZE, verbose=True, **crawler_options):
+    """
+    Crawl the seeds and stream the documents into the knowledge base.
+
+    Returns:
+        dict: bulk_ingest statistics plus the crawl statistics under 'crawl'.
+    """
+    crawler = Crawler(seeds, **crawler_options)
+    started = time.perf_counter()
+    stats = bulk_ingest(crawler.crawl(), batch_size=batch_size, verbose=verbose)
+    # Only now is every page in the knowledge base; a failed ingestion keeps the old validators
+    crawler.save_state()
+    stats["crawl"] = dict(crawler.stats, seconds=round(time.perf_counter() - started, 3))
+    if verbose:
+        crawl = stats["crawl"]
+        print(f"Crawled {crawl['fetched']} pages ({crawl['not_modified']} not modified, {crawl['failed']} failed, "
+              f"{crawl['bytes'] / 1e6:.1f} MB) in {crawl['seconds']}s.")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl documentation into the automation knowledge base.")
+    parser.add_argument("seeds", nargs="+", help="Start URLs; links are followed on the same host and path.")
+    parser.add_argument("--max-pages", type=int, default=500)
+    parser.add_argument("--depth", type=int, default=3, help="Maximum link distance from a seed.")
+    parser.add_argument("--workers", type=int, default=CRAWLER_WORKERS)
+    parser.add_argument("--rate", type=float, default=CRAWLER_RATE_LIMIT, help="Requests per second per host.")
+    parser.add_argument("--rules", help="JSON file of [{pattern, metadata}] URL rules.")
+    parser.add_argument("--state", default=CRAWLER_STATE_PATH, help="Validator state file ('' to disable).")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    crawl_and_ingest(args.seeds, batch_size=args.batch_size, max_pages=args.max_pages, max_depth=args.depth,
+                     workers=args.workers, rate=args.rate, state_path=args.state or None,
+                     rules=load_rules(args.rules) if args.rules else DEFAULT_URL_RULES)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,348 @@
 # This script initializes a ChromaDB client, creates a collection, and adds example documents to the knowledge base.
-# It uses the SentenceTransformer model to generate embeddings for the documents.
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer   
+# It uses the configured embedding backend (embedding_backends.py) to generate embeddings for the documents.
+#
+# Besides the example documents it can bulk-ingest large document sets (test cases, bug reports,
+# guidelines) from JSONL files or directories of text files:
+#   python data_ingestion.py                                  # load the example documents
+#   python data_ingestion.py --jsonl bugs.jsonl tests.jsonl   # one {"id", "content", "metadata"} per line
+#   python data_ingestion.py --dir ./guidelines --type guideline --domain general
+#   python data_ingestion.py --jsonl bugs.jsonl --processes 8   # encode on 8 processes
+# Re-running an ingestion is safe: documents are upserted and unchanged ones are skipped by content hash.
+import argparse
+import hashlib
+import json
+import os
+import time
 
-# Initialize ChromaDB client
-# It's good practice to pass a path for persistent storage
-client = chromadb.PersistentClient(path="./chroma_db")
+import resources
+from embedding_backends import EMBEDDING_PROCESSES, EncodePool, embed_texts
+from kb_version import bump_version, write_lock
 
-# Get/ create a collection
-collection  = client.get_or_create_collection(name="automation_knowledge_base")
+# The ChromaDB client, collection and embedding model are shared, lazily created resources
+# (see resources.py), so importing this module is cheap and never touches the knowledge base.
+def __getattr__(name):
+    # Keep `data_ingestion.client`, `.collection` and `.embedding_model` working for existing callers
+    if name == "client":
+        return resources.get_chroma_client()
+    if name == "collection":
+        return resources.get_collection()
+    if name == "embedding_model":
+        return resources.get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2') 
+# Bulk ingestion defaults
+INGEST_BATCH_SIZE = 256      # Number of chunks encoded and upserted together
+ENCODE_BATCH_SIZE = 64       # Mini-batch size used inside the embedding backend's encode
+CHUNK_SIZE = 1000            # Maximum characters per chunk
+CHUNK_OVERLAP = 100          # Characters shared between neighbouring chunks
+TEXT_FILE_EXTENSIONS = (".txt", ".md", ".java", ".feature", ".csv", ".log")
 
 # Function to convert large chunk of text as embeddings to the knowledge base
-def get_embedding(texts):
+def get_embedding(texts, encoder=None):
     """
-    Generate embeddings for a list of texts using the SentenceTransformer model.
+    Generate embeddings for a list of texts using the embedding backend (or `encoder`, e.g. an EncodePool).
+    Texts that were embedded before are served from the shared embedding cache.
     """
-    return embedding_model.encode(texts).tolist()
+    return embed_texts(texts, batch_size=ENCODE_BATCH_SIZE, encoder=encoder).tolist()
 
 def add_document(doc_id, content, metadata=None): # Make metadata optional if not always provided
     """
     Add a document to the knowledge base with its content and metadata.
     Adds a 'domain' field to metadata if specified.
+    The document is upserted, so adding the same id twice updates it instead of failing.
     """
     if metadata is None:
         metadata = {}
-    
-    # Generate embeddings for the content
-    embedding = get_embedding([content])[0] 
-    
-    # Add the document to the collection
-    collection.add(
-        ids=[str(doc_id)],
-        documents=[content],
-        embeddings=[embedding],
-        metadatas=[metadata]
-    )
-    print(f"Document {doc_id} added to the knowledge base with metadata: {metadata}.")  
-
-# Example documents to add to the knowledge base
-# Now, include a 'domain' field in the metadata for domain-specific documents
-# For general documents, you might omit 'domain' or set it to 'general'
-# You would ingest more of your specific project documentation here with correct domains
-
-# General documents (applicable to all environments, or no specific domain)
-add_document(1, "How to write a login test in Selenium Java: Find username field by ID, send keys, find password field by ID, send keys, click login button by ID. Use WebDriverWait for elements.", {"type": "test_case", "framework": "Selenium Java", "domain": "general"})
-add_document(3, "Coding Standard: All locators in Page Objects must use By.id or By.cssSelector. Avoid absolute XPaths.", {"type": "guideline", "category": "coding_style", "domain": "general"})
-add_document(4, "What is Page Object Model: Design pattern to encapsulate UI elements and interactions.", {"type": "concept", "domain": "general"})
-
-# Stage environment specific document
-add_document(5, "Bug: STAGE environment login issue. Users redirected to 'invalid_session' page after 3 failed attempts. [WEB-457]", {"type": "bug_report", "environment": "STAGE", "domain": "my.stg.charitableimpact.com"})
-add_document(6, "Feature: STAGE environment new dashboard layout for beta users. Test element ID 'betaDashboardWelcome'.", {"type": "feature_doc", "environment": "STAGE", "domain": "my.stg.charitableimpact.com"})
-
-# QA environment specific document
-add_document(7, "Bug: QA environment 'Sign in with Google' button sometimes not clickable. Investigate JavaScript errors. [WEB-458]", {"type": "bug_report", "environment": "QA", "domain": "my.qa.charitableimpact.com"})
-
-# Production environment specific document
-add_document(8, "Alert: PROD environment critical user flow: payment processing response times exceeding 500ms under load. Monitor 'paymentGatewayResponse' metric. [PROD-CRITICAL-1]", {"type": "alert", "environment": "PROD", "domain": "my.charitableimpact.com"})
-
-# Example of a bug report that might be general
-add_document(2, "Bug: Login fails on Firefox due to 'Element not interactable' on username field after page reload on version 100. [WEB-456]", {"type": "bug_report", "browser": "Firefox", "domain": "general"})
-
-
-# Clean up existing collection before adding documents (optional, for fresh start)
-# collection.delete(ids=['1', '2', '3', '4', '5', '6', '7', '8'])
-
-print(f"Total documents in knowledge base: {collection.count()}")
-print("Knowledge base preparation completed. You can now query the knowledge base for relevant information.")
\ No newline at end of file
+
+    bulk_ingest([{"id": doc_id, "content": content, "metadata": metadata}], verbose=False)
+    print(f"Document {doc_id} added to the knowledge base with metadata: {metadata}.")
+
+
+def content_hash(content, metadata=None):
+    """
+    Compute a stable hash of a document's content and metadata, used to skip unchanged documents.
+    """
+    payload = json.dumps({"content": content, "metadata": metadata or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split a long text into chunks of at most `chunk_size` characters.
+    Chunks end on a paragraph, line or sentence boundary where possible and
+    neighbouring chunks share `overlap` characters so context is not lost at the cut.
+
+    Args:
+        text (str): The text to split.
+        chunk_size (int): Maximum number of characters per chunk.
+        overlap (int): Number of characters repeated at the start of the next chunk.
+
+    Returns:
+        list: A list of chunk strings (a single chunk if the text is short enough).
+    """
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Prefer to cut on a natural boundary in the second half of the window
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _chunk_id(doc_id, index):
+    # The first chunk keeps the document id so single-chunk documents look exactly like before
+    return str(doc_id) if index == 0 else f"{doc_id}#{index}"
+
+
+def _clean_metadata(metadata):
+    # ChromaDB only accepts str, int, float and bool metadata values
+    cleaned = {}
+    for key, value in (metadata or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, (str, int, float, bool)):
+            cleaned[key] = value
+        else:
+            cleaned[key] = json.dumps(value, default=str)
+    return cleaned
+
+
+def iter_jsonl(path):
+    """
+    Yield documents from a JSONL file, one {"id", "content", "metadata"} object per line.
+    "text" is accepted as an alias for "content"; lines without an id get one from the file name and line number.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            content = record.get("content", record.get("text"))
+            if not content:
+                print(f"Skipping {path}:{line_number}: no content.")
+                continue
+            yield {
+                "id": str(record.get("id", f"{os.path.basename(path)}:{line_number}")),
+                "content": content,
+                "metadata": record.get("metadata", {}),
+            }
+
+
+def iter_directory(path, default_metadata=None, extensions=TEXT_FILE_EXTENSIONS):
+    """
+    Yield one document per text file found (recursively) under a directory.
+    The document id is the file path relative to the directory; it is also stored as 'source' metadata.
+    """
+    for root, _dirs, files in os.walk(path):
+        for name in sorted(files):
+            if not name.lower().endswith(extensions):
+                continue
+            file_path = os.path.join(root, name)
+            relative_path = os.path.relpath(file_path, path)
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                content = f.read()
+            if not content.strip():
+                continue
+            metadata = dict(default_metadata or {})
+            metadata["source"] = relative_path
+            yield {"id": relative_path, "content": content, "metadata": metadata}
+
+
+def bulk_ingest(documents, batch_size=INGEST_BATCH_SIZE, chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP, verbose=True, processes=EMBEDDING_PROCESSES, collection=None,
+                record_version=True):
+    """
+    Stream documents into the knowledge base in batches.
+
+    Long documents are chunked, each batch of chunks is encoded with a single
+    encode call and written with a single upsert. Documents whose
+    content hash matches what is already stored are skipped, so re-running is cheap.
+
+    Args:
+        documents (iterable): Dicts with 'id', 'content' and optional 'metadata'.
+        batch_size (int): Approximate number of chunks per encode/upsert batch.
+        chunk_size (int): Maximum characters per chunk.
+        chunk_overlap (int): Characters shared between neighbouring chunks.
+        verbose (bool): Print per-batch progress.
+        processes (int): Encode on this many processes (an EncodePool) when greater than 1.
+                         Worth it for large ingestions; each process loads its own model.
+        collection (optional): Write to this collection instead of the live one (e.g. a shadow rebuild).
+        record_version (bool): Bump the knowledge-base version when documents were written. kb_sync turns
+                               this off and records a single version for the whole sync instead.
+
+    Returns:
+        dict: Ingestion statistics (documents seen/written/skipped, chunks written, seconds, docs_per_sec).
+    """
+    stats = {"documents": 0, "written": 0, "skipped": 0, "chunks": 0}
+    started = time.perf_counter()
+    pending = []
+    pending_chunks = 0
+    # Writers take the knowledge-base write lock, so a rebuild in progress cannot swap away their writes
+    with write_lock():
+        # Check the collection's embedding backend before paying for a process pool
+        collection = collection if collection is not None else resources.get_collection()
+        encoder = EncodePool(processes) if processes > 1 else None
+
+        try:
+            for doc in documents:
+                stats["documents"] += 1
+                metadata = _clean_metadata(doc.get("metadata"))
+                chunks = chunk_text(doc["content"], chunk_size, chunk_overlap)
+                pending.append((str(doc["id"]), doc["content"], metadata, chunks))
+                pending_chunks += len(chunks)
+                if pending_chunks >= batch_size:
+                    _flush_batch(pending, stats, encoder, collection)
+                    if verbose:
+                        _print_progress(stats, started)
+                    pending, pending_chunks = [], 0
+
+            if pending:
+                _flush_batch(pending, stats, encoder, collection)
+        finally:
+            if encoder is not None:
+                encoder.close()
+
+        if stats["written"] and record_version:
+            # Let response caches and other knowledge-base derived data know the collection changed
+            bump_version(f"bulk_ingest: {stats['written']} documents")
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["docs_per_sec"] = round(stats["documents"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    if verbose:
+        print(f"Ingested {stats['documents']} documents ({stats['written']} written, {stats['skipped']} unchanged, "
+              f"{stats['chunks']} chunks) in {stats['seconds']}s - {stats['docs_per_sec']} docs/sec.")
+    return stats
+
+
+def _flush_batch(pending, stats, encoder=None, collection=None):
+    # A document id repeated inside one batch keeps its last version (upsert rejects duplicate ids)
+    latest = {}
+    for item in pending:
+        if item[0] in latest:
+            stats["skipped"] += 1
+        latest[item[0]] = item
+    pending = list(latest.values())
+
+    collection = collection if collection is not None else resources.get_collection()
+    # Look up the stored hash of every document in the batch with a single get
+    existing = collection.get(ids=[doc_id for doc_id, _, _, _ in pending], include=["metadatas"])
+    stored = {doc_id: (meta or {}) for doc_id, meta in zip(existing["ids"], existing["metadatas"])}
+
+    ids, texts, metadatas, stale_ids = [], [], [], []
+    for doc_id, content, metadata, chunks in pending:
+        doc_hash = content_hash(content, metadata)
+        previous = stored.get(doc_id)
+        if previous is not None and previous.get("content_hash") == doc_hash:
+            stats["skipped"] += 1
+            continue
+
+        for index, chunk in enumerate(chunks):
+            chunk_metadata = dict(metadata)
+            chunk_metadata.update({
+                "parent_id": doc_id,
+                "chunk_index": index,
+                "chunk_count": len(chunks),
+                "content_hash": doc_hash,
+            })
+            ids.append(_chunk_id(doc_id, index))
+            texts.append(chunk)
+            metadatas.append(chunk_metadata)
+
+        # Remove chunks left over from a previous, longer version of the document
+        previous_count = int(previous.get("chunk_count", 1)) if previous is not None else 0
+        stale_ids.extend(_chunk_id(doc_id, index) for index in range(len(chunks), previous_count))
+        stats["written"] += 1
+
+    if ids:
+        collection.upsert(ids=ids, documents=texts, embeddings=get_embedding(texts, encoder), metadatas=metadatas)
+        stats["chunks"] += len(ids)
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+
+def _print_progress(stats, started):
+    elapsed = time.perf_counter() - started
+    rate = stats["documents"] / elapsed if elapsed else 0.0
+    print(f"  ... {stats['documents']} documents processed ({stats['written']} written, "
+          f"{stats['skipped']} unchanged) - {rate:.1f} docs/sec")
+
+
+def load_example_documents():
+    """
+    Add the example documents to the knowledge base.
+    Includes a 'domain' field in the metadata for domain-specific documents;
+    general documents use the 'general' domain.
+    """
+    # You would ingest more of your specific project documentation here with correct domains
+
+    # General documents (applicable to all environments, or no specific domain)
+    add_document(1, "How to write a login test in Selenium Java: Find username field by ID, send keys, find password field by ID, send keys, click login button by ID. Use WebDriverWait for elements.", {"type": "test_case", "framework": "Selenium Java", "domain": "general"})
+    add_document(3, "Coding Standard: All locators in Page Objects must use By.id or By.cssSelector. Avoid absolute XPaths.", {"type": "guideline", "category": "coding_style", "domain": "general"})
+    add_document(4, "What is Page Object Model: Design pattern to encapsulate UI elements and interactions.", {"type": "concept", "domain": "general"})
+
+    # Stage environment specific document
+    add_document(5, "Bug: STAGE environment login issue. Users redirected to 'invalid_session' page after 3 failed attempts. [WEB-457]", {"type": "bug_report", "environment": "STAGE", "domain": "my.stg.charitableimpact.com"})
+    add_document(6, "Feature: STAGE environment new dashboard layout for beta users. Test element ID 'betaDashboardWelcome'.", {"type": "feature_doc", "environment": "STAGE", "domain": "my.stg.charitableimpact.com"})
+
+    # QA environment specific document
+    add_document(7, "Bug: QA environment 'Sign in with Google' button sometimes not clickable. Investigate JavaScript errors. [WEB-458]", {"type": "bug_report", "environment": "QA", "domain": "my.qa.charitableimpact.com"})
+
+    # Production environment specific document
+    add_document(8, "Alert: PROD environment critical user flow: payment processing response times exceeding 500ms under load. Monitor 'paymentGatewayResponse' metric. [PROD-CRITICAL-1]", {"type": "alert", "environment": "PROD", "domain": "my.charitableimpact.com"})
+
+    # Example of a bug report that might be general
+    add_document(2, "Bug: Login fails on Firefox due to 'Element not interactable' on username field after page reload on version 100. [WEB-456]", {"type": "bug_report", "browser": "Firefox", "domain": "general"})
+
+
+# To remove documents that are gone from the source, or rebuild from scratch without downtime,
+# use kb_sync.py (python kb_sync.py sync ... / rebuild ...) instead of deleting from the collection here.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest documents into the automation knowledge base.")
+    parser.add_argument("--jsonl", nargs="+", default=[], help="JSONL files with one {id, content, metadata} object per line.")
+    parser.add_argument("--dir", dest="directories", nargs="+", default=[], help="Directories of text files to ingest.")
+    parser.add_argument("--type", dest="doc_type", default="document", help="'type' metadata for files ingested with --dir.")
+    parser.add_argument("--domain", default="general", help="'domain' metadata for files ingested with --dir.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--processes", type=int, default=EMBEDDING_PROCESSES,
+                        help="Encode on this many processes (one embedding model each).")
+    parser.add_argument("--examples", action="store_true", help="Also load the built-in example documents.")
+    args = parser.parse_args(argv)
+
+    if args.examples or not (args.jsonl or args.directories):
+        load_example_documents()
+
+    def documents():
+        for path in args.jsonl:
+            yield from iter_jsonl(path)
+        for path in args.directories:
+            yield from iter_directory(path, {"type": args.doc_type, "domain": args.domain})
+
+    if args.jsonl or args.directories:
+        bulk_ingest(documents(), batch_size=args.batch_size, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+                    processes=args.processes)
+
+    print(f"Total documents in knowledge base: {resources.get_collection().count()}")
+    print("Knowledge base preparation completed. You can now query the knowledge base for relevant information.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# Pluggable embedding backends used for ingestion, retrieval and intent routing.
+#   - SentenceTransformerBackend: the model in full-precision PyTorch (the default, as before)
+#   - ONNXBackend:                the same model exported to ONNX Runtime
+#   - ONNXBackend(quantize=True): the ONNX model with dynamic int8 quantization of its weights
+# Select one with EMBEDDING_BACKEND ("sentence-transformers", "onnx" or "onnx-int8").
+# Vectors from different backends are close but not identical, so every backend has a distinct
+# name ("onnx-int8:all-MiniLM-L6-v2"). It keys the embedding cache (the default backend keeps the
+# bare model name, so existing cache entries stay valid), and it is recorded in the collection's
+# metadata on first use so one collection never mixes vectors from two backends.
+#
+# EncodePool spreads bulk encoding over several processes (one model per process), for ingestion.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import resources
+from embedding_cache import cached_encode
+from resources import EMBEDDING_MODEL_NAME
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./onnx_models")       # exported/quantized models
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx2")        # arm64, avx2, avx512 or avx512_vnni
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))            # encode processes used by ingestion
+POOL_MIN_CHUNK = 32     # fewer texts per worker process costs more in transfer than it saves
+
+
+class EmbeddingBackendMismatch(ValueError):
+    """
+    Raised when a collection holds vectors from a different embedding backend than the configured one.
+    """
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding backends. encode() returns unit-length float32 vectors.
+    """
+    kind = "base"
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+
+    @property
+    def name(self):
+        return backend_name(self.kind, self.model_name)
+
+    @property
+    def cache_name(self):
+        return cache_name(self.kind, self.model_name)
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    The SentenceTransformer model in PyTorch.
+    """
+    kind = "sentence-transformers"
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True,
+                                            convert_to_numpy=True, **kwargs), dtype=np.float32)
+
+
+class ONNXBackend(SentenceTransformerBackend):
+    """
+    The model exported to ONNX Runtime, optionally with dynamically int8-quantized weights.
+    The export (and quantization) runs once and is saved under EMBEDDING_ONNX_DIR.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, quantize=False, quantization=EMBEDDING_QUANTIZATION):
+        EmbeddingBackend.__init__(self, model_name)
+        from sentence_transformers import SentenceTransformer
+
+        self.quantize = quantize
+        self.kind = "onnx-int8" if quantize else "onnx"
+        export_dir = os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+        if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+            print(f"Exporting {model_name} to ONNX in {export_dir}...")
+            SentenceTransformer(model_name, device="cpu", backend="onnx").save(export_dir)
+
+        file_name = "onnx/model.onnx"
+        if quantize:
+            file_name = f"onnx/model_qint8_{quantization}.onnx"
+            if not os.path.exists(os.path.join(export_dir, file_name)):
+                from sentence_transformers import export_dynamic_quantized_onnx_model
+                print(f"Quantizing {model_name} to int8 ({quantization})...")
+                export_dynamic_quantized_onnx_model(
+                    SentenceTransformer(export_dir, device="cpu", backend="onnx"), quantization, export_dir)
+        self.model = SentenceTransformer(export_dir, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+
+
+BACKENDS = {
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx": ONNXBackend,
+    "onnx-int8": lambda model_name=EMBEDDING_MODEL_NAME: ONNXBackend(model_name, quantize=True),
+}
+
+
+def backend_name(kind=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Name identifying the vectors a backend produces, e.g. 'onnx-int8:all-MiniLM-L6-v2'.
+    Known without loading the model.
+    """
+    return f"{kind}:{model_name}"
+
+
+def cache_name(kind=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME):
+    # Embedding cache key prefix; PyTorch vectors were cached under the bare model name before backends existed
+    return model_name if kind == "sentence-transformers" else backend_name(kind, model_name)
+
+
+def create_embedding_backend(kind=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Create the embedding backend selected by `kind` (EMBEDDING_BACKEND by default).
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{kind}'. Choose one of {sorted(BACKENDS)}.")
+    return BACKENDS[kind](model_name)
+
+
+def embed_texts(texts, batch_size=64, encoder=None):
+    """
+    Embed texts with the shared backend (or `encoder`, e.g. an EncodePool), through the embedding cache.
+    Returns a float32 numpy array.
+    """
+    encoder = encoder or resources.get_embedding_model()
+    return cached_encode(encoder, list(texts), encoder.cache_name, batch_size=batch_size)
+
+
+def ensure_collection_backend(collection, name=None):
+    """
+    Check that the collection's vectors come from the configured backend, recording it on first use.
+    Collections created before backends were recorded hold PyTorch SentenceTransformer vectors.
+
+    Raises:
+        EmbeddingBackendMismatch: If the collection was built with another backend.
+    """
+    name = name or backend_name()
+    metadata = dict(collection.metadata or {})
+    stored = metadata.get("embedding_backend")
+    if stored is None:
+        stored = backend_name("sentence-transformers") if collection.count() else name
+        metadata = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+        metadata["embedding_backend"] = stored
+        collection.modify(metadata=metadata)
+    if stored != name:
+        raise EmbeddingBackendMismatch(
+            f"Collection '{collection.name}' holds vectors from '{stored}' but EMBEDDING_BACKEND gives '{name}'. "
+            f"Use the matching backend, or ingest into a new collection (COLLECTION_NAME) with this one.")
+    return stored
+
+
+_worker_backend = None
+
+
+def _init_worker(kind, model_name):
+    # One model per process, each using a single intra-op thread so processes do not oversubscribe cores
+    global _worker_backend
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    _worker_backend = create_embedding_backend(kind, model_name)
+
+
+def _encode_in_worker(texts, batch_size):
+    return _worker_backend.encode(texts, batch_size=batch_size)
+
+
+class EncodePool:
+    """
+    Encode large batches on several processes, each holding its own copy of the backend.
+    Has the same encode()/name interface as a backend, so it can be passed to embed_texts().
+
+    Usage:
+        with EncodePool(processes=8) as pool:
+            vectors = embed_texts(texts, encoder=pool)
+    """
+
+    def __init__(self, processes=None, kind=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL_NAME):
+        self.processes = processes or os.cpu_count() or 1
+        self.name = backend_name(kind, model_name)
+        self.cache_name = cache_name(kind, model_name)
+        # spawn: forked copies of a process that already loaded PyTorch can deadlock
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(kind, model_name))
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # One slice per process, so a single ingestion batch keeps every process busy
+        size = max(POOL_MIN_CHUNK, -(-len(texts) // self.processes))
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        return np.vstack(list(self._executor.map(_encode_in_worker, chunks, [batch_size] * len(chunks))))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,224 @@
+# Embedding cache shared by data_ingestion.py and rag_system.py.
+# Embeddings are keyed by model name plus a hash of the text, so the same agent queries,
+# system prompts and re-ingested documents are only encoded once.
+# There are two tiers:
+#   - an in-memory LRU (per process) for hot entries
+#   - an on-disk sqlite store (shared between processes and restarts) bounded by entry count
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+EMBEDDING_CACHE_DISK_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "500000"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") != "0"
+
+
+def cache_key(model_name, text):
+    """
+    Build the cache key for a text embedded with a given model.
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU + sqlite) cache of float32 embedding vectors.
+
+    Args:
+        path (str, optional): sqlite file for the disk tier. None keeps the cache in memory only.
+        memory_items (int): Maximum number of vectors kept in the in-memory LRU.
+        disk_items (int): Maximum number of vectors kept on disk; the least recently used are evicted.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+                 disk_items=EMBEDDING_CACHE_DISK_ITEMS):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        """
+        Look up a list of keys. Returns a dict of key -> float32 vector for the keys that were found.
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.counters["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                now = time.time()
+                # sqlite limits the number of bound parameters, so query in slices
+                for start in range(0, len(missing), 500):
+                    part = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.counters["disk_hits"] += 1
+                    if rows:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                        )
+                self._conn.commit()
+
+            self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Store (key, vector) pairs in both tiers, evicting the least recently used entries if needed.
+        """
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._conn is not None and items:
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_access) VALUES (?, ?, ?, ?)",
+                    [(key, vector.shape[-1], vector.tobytes(), now) for key, vector in items],
+                )
+                self._disk_count += len(items)
+                if self._disk_count > self.disk_items:
+                    self._evict_disk()
+                self._conn.commit()
+
+    def encode(self, model, texts, model_name, **encode_kwargs):
+        """
+        Encode texts with `model`, only running the model for texts that are not cached.
+
+        Args:
+            model: A SentenceTransformer-like object with an `encode(texts, **kwargs)` method.
+            texts (list): The texts to embed.
+            model_name (str): Name of the model; part of the cache key so models never share vectors.
+            **encode_kwargs: Extra arguments passed to `model.encode`.
+
+        Returns:
+            numpy.ndarray: A float32 array of shape (len(texts), dim).
+        """
+        keys = [cache_key(model_name, text) for text in texts]
+        found = self.get_many(keys)
+
+        # Encode every distinct missing text once
+        missing = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = np.asarray(model.encode(list(missing.values()), **encode_kwargs), dtype=np.float32)
+            new_items = list(zip(missing.keys(), vectors))
+            self.put_many(new_items)
+            found.update(new_items)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self):
+        """
+        Return hit/miss counters, the hit rate and the current size of both tiers.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_items"] = len(self._memory)
+            stats["disk_items"] = self._disk_count
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """
+        Remove every entry from both tiers and reset the counters.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+            self._disk_count = 0
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def _remember(self, key, vector):
+        # Caller holds the lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Caller holds the lock. Evict down to 90% of the bound so eviction does not run on every insert.
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._disk_count - int(self.disk_items * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (excess,),
+        )
+        self._disk_count -= excess
+        self.counters["evictions"] += excess
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Return the process-wide embedding cache, creating it on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = EmbeddingCache(EMBEDDING_CACHE_PATH if EMBEDDING_CACHE_ENABLED else None,
+                                                memory_items=EMBEDDING_CACHE_MEMORY_ITEMS if EMBEDDING_CACHE_ENABLED else 0)
+    return _default_cache
+
+
+def cached_encode(model, texts, model_name, **encode_kwargs):
+    """
+    Encode texts through the process-wide embedding cache. Returns a float32 numpy array.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return np.asarray(model.encode(list(texts), **encode_kwargs), dtype=np.float32)
+    return get_embedding_cache().encode(model, list(texts), model_name, **encode_kwargs)
@@ -0,0 +1,125 @@
+# Content-addressed cache of generated-test execution results.
+# The key is a hash of the normalized Java code plus the dependency fingerprint (pom.xml, JDK, main sources
+# and test resources), so submitting the same test again returns the stored result instantly instead of
+# repeating the build, until the project it runs against changes.
+# Results are kept in memory and as one JSON file per key on disk (shared between processes).
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+RESULT_CACHE_DIR = os.getenv("TEST_RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "aitestauto_results"))
+RESULT_CACHE_TTL = float(os.getenv("TEST_RESULT_CACHE_TTL", "3600"))     # seconds; 0 disables the cache
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("TEST_RESULT_CACHE_MAX_ENTRIES", "5000"))
+
+
+def normalize_code(java_code):
+    """
+    Normalize Java code so cosmetic differences do not change the cache key:
+    package declaration, comments, blank lines and indentation/whitespace runs are ignored.
+    """
+    code = re.sub(r"^\s*package\s+[\w.]+\s*;", "", java_code, flags=re.MULTILINE)
+    code = re.sub(r"/\*.*?\*/", "", code, flags=re.DOTALL)
+    code = re.sub(r"(?m)^\s*//.*$", "", code)
+    return "\n".join(" ".join(line.split()) for line in code.splitlines() if line.strip())
+
+
+def result_key(java_code, fingerprint):
+    """
+    Cache key of a test: hash of the normalized code and the dependency fingerprint.
+    """
+    return hashlib.sha256(f"{fingerprint}\0{normalize_code(java_code)}".encode("utf-8")).hexdigest()
+
+
+class ExecutionResultCache:
+    """
+    Memory + disk cache of execution results (stored as plain dicts).
+
+    Args:
+        directory (str): Where result files are written.
+        ttl (float): Seconds a result stays valid; tests against live sites should not be cached forever.
+        max_entries (int): Maximum number of results kept on disk; the oldest are removed first.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "seconds_saved": 0.0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Return the stored result dict for a key, or None if missing or expired.
+        """
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, ValueError):
+                entry = None
+        if entry is None or time.time() - entry["stored_at"] > self.ttl:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            self._memory[key] = entry
+            self.counters["hits"] += 1
+            self.counters["seconds_saved"] += entry["result"].get("duration", 0.0)
+        return entry["result"]
+
+    def put(self, key, result):
+        """
+        Store a result dict under a key.
+        """
+        if self.ttl <= 0:
+            return
+        entry = {"stored_at": time.time(), "result": result}
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._memory[key] = entry
+            self.counters["stores"] += 1
+            if len(self._memory) > self.max_entries:
+                self._memory.pop(next(iter(self._memory)))
+        if self.counters["stores"] % 100 == 0:
+            self._prune_disk()
+
+    def stats(self):
+        """
+        Return hits, misses, hit rate and the total run time saved by cache hits.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["seconds_saved"] = round(stats["seconds_saved"], 3)
+        return stats
+
+    def _prune_disk(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+result_cache = ExecutionResultCache()
@@ -0,0 +1,236 @@
+# Hybrid lexical + vector retrieval for the knowledge base.
+# Embeddings alone match identifiers such as bug ids ("WEB-457") or element ids ("betaDashboardWelcome")
+# poorly, and asking Chroma for only the top 3 hides exact-domain documents ranked just below.
+# The hybrid retriever therefore:
+#   1. over-fetches a candidate pool by vector similarity (Chroma or the snapshot, domain + general filter)
+#   2. scores the same documents with an in-process BM25 inverted index
+#   3. fuses both rankings with reciprocal-rank fusion (RRF) and boosts exact-domain documents
+# The BM25 index is built on first use from the same documents the vector search reads: the current
+# snapshot (vector_snapshot.py) when one is served, else the collection. It is rebuilt when the snapshot
+# or the knowledge-base version (kb_version.py) changes; the rebuild runs in a background thread while
+# queries keep using the previous index.
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+import resources
+import tracing
+from kb_version import current_version
+from vector_snapshot import current_snapshot, query_vectors
+
+CANDIDATE_POOL = int(os.getenv("RETRIEVAL_CANDIDATE_POOL", "30"))   # candidates fetched from each retriever
+RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))                     # RRF damping constant
+DOMAIN_BOOST = float(os.getenv("RETRIEVAL_DOMAIN_BOOST", "0.01"))  # added to the fused score of exact-domain docs
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search tokens.
+    Identifiers are kept whole ("web-457", "betadashboardwelcome") and also split into their parts
+    ("web", "457", "beta", "dashboard", "welcome") so both exact and partial mentions match.
+    """
+    tokens = []
+    for raw in re.findall(r"[A-Za-z0-9]+(?:[-_.][A-Za-z0-9]+)*", text):
+        whole = raw.lower()
+        tokens.append(whole)
+        parts = [part.lower() for piece in re.split(r"[-_.]", raw) for part in _CAMEL_BOUNDARY.split(piece)]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the knowledge-base documents.
+    """
+
+    def __init__(self, ids, documents, metadatas):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [meta or {} for meta in metadatas]
+        self.domains = [meta.get("domain") for meta in self.metadatas]
+        self.postings = defaultdict(list)        # token -> [(doc index, term frequency)]
+        self.lengths = []
+        for index, document in enumerate(self.documents):
+            counts = Counter(tokenize(document or ""))
+            self.lengths.append(sum(counts.values()))
+            for token, frequency in counts.items():
+                self.postings[token].append((index, frequency))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        count = len(self.documents)
+        self.idf = {token: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for token, postings in self.postings.items()}
+
+    def search(self, query_text, allowed_domains=None, limit=CANDIDATE_POOL):
+        """
+        Return [(doc index, score)] for the best matching documents, best first.
+
+        Args:
+            query_text (str): The query.
+            allowed_domains (set, optional): Only documents whose 'domain' is in this set are returned.
+            limit (int): Maximum number of results.
+        """
+        scores = defaultdict(float)
+        for token in set(tokenize(query_text)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[token]:
+                if allowed_domains is not None and self.domains[index] not in allowed_domains:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / (self.average_length or 1))
+                scores[index] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+_index_lock = threading.Lock()
+_first_build_lock = threading.Lock()
+_index_state = {"key": None, "index": None, "building": None}
+
+
+def _snapshot_rows(snapshot):
+    rows = range(snapshot.count)
+    return ([snapshot.row_id(row) for row in rows], [snapshot.row_document(row) for row in rows],
+            [snapshot.row_metadata(row) for row in rows])
+
+
+def _collection_rows(collection, page_size):
+    ids, documents, metadatas = [], [], []
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=len(ids))
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        if len(page["ids"]) < page_size:
+            return ids, documents, metadatas
+
+
+def _index_source(page_size):
+    # (key, loader) of the documents vector queries are served from: the current snapshot, keyed by its
+    # directory, or else the collection, keyed by its name and the knowledge-base version
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return ("snapshot", snapshot.path), lambda: _snapshot_rows(snapshot)
+    collection = resources.get_collection()
+    return ("chroma", collection.name, current_version()), lambda: _collection_rows(collection, page_size)
+
+
+def _install(key, index):
+    with _index_lock:
+        # A build overtaken by a newer change is dropped; the newer build is already running
+        if _index_state["index"] is None or _index_state["building"] == key:
+            _index_state["key"], _index_state["index"], _index_state["building"] = key, index, None
+
+
+def _rebuild(key, load):
+    started = time.perf_counter()
+    try:
+        _install(key, BM25Index(*load()))
+    except Exception as e:
+        print(f"BM25 index rebuild failed, keeping the previous index: {e}")
+        with _index_lock:
+            if _index_state["building"] == key:
+                _index_state["building"] = None
+        return
+    print(f"Rebuilt the BM25 index in {time.perf_counter() - started:.2f}s")
+
+
+def get_bm25_index(page_size=1000):
+    """
+    Return the BM25 index of the documents retrieval is served from.
+    With a current vector snapshot the index is built from the snapshot, otherwise from the collection.
+    When the knowledge base changes the previous index keeps serving while a background thread builds
+    the new one; only the very first call builds the index inline.
+    """
+    key, load = _index_source(page_size)
+    with _index_lock:
+        index = _index_state["index"]
+        if _index_state["key"] == key:
+            _index_state["building"] = None     # a build for another source is no longer wanted
+            return index
+        start = index is not None and _index_state["building"] != key
+        if start:
+            _index_state["building"] = key
+    if start:
+        threading.Thread(target=_rebuild, args=(key, load), name="bm25-rebuild", daemon=True).start()
+    if index is not None:
+        return index
+    with _first_build_lock:
+        if _index_state["index"] is None:
+            _install(key, BM25Index(*load()))
+        return _index_state["index"]
+
+
+def hybrid_search(query_text, query_embedding, domain_filter=None, n_results=3,
+                  candidate_pool=CANDIDATE_POOL, rrf_k=RRF_K, domain_boost=DOMAIN_BOOST):
+    """
+    Retrieve documents by fusing vector and BM25 rankings.
+
+    Args:
+        query_text (str): The query text (used for BM25).
+        query_embedding (list): The query embedding (used for the vector search).
+        domain_filter (str, optional): Only documents of this domain or 'general' are considered;
+                                       exact-domain documents get `domain_boost` added to their score.
+        n_results (int): Number of documents to return.
+        candidate_pool (int): Candidates fetched from each retriever before fusion.
+        rrf_k (int): Reciprocal-rank-fusion constant.
+        domain_boost (float): Score bonus for exact-domain documents.
+
+    Returns:
+        list: Dicts with 'id', 'content', 'meta', 'distance' (None if only found lexically) and 'score'.
+    """
+    return hybrid_search_batch([query_text], [query_embedding], domain_filter, n_results,
+                               candidate_pool, rrf_k, domain_boost)[0]
+
+
+def hybrid_search_batch(query_texts, query_embeddings, domain_filter=None, n_results=3,
+                        candidate_pool=CANDIDATE_POOL, rrf_k=RRF_K, domain_boost=DOMAIN_BOOST):
+    """
+    hybrid_search for several queries sharing one domain filter: the vector candidates of all queries
+    come from a single query_vectors call, then each query is fused with its own BM25 ranking.
+
+    Returns:
+        list: One hybrid_search result list per query, in order.
+    """
+    pool = max(candidate_pool, n_results)
+    vector = query_vectors(query_embeddings, pool, domain_filter)
+    with tracing.span("retrieval.bm25", queries=len(query_texts)) as current:
+        index = get_bm25_index()
+        allowed = {domain_filter, "general"} if domain_filter else None
+        lexical = [index.search(query_text, allowed, pool) for query_text in query_texts]
+        current.set(documents=sum(len(hits) for hits in lexical))
+    return [_fuse(vector, query_index, index, hits, domain_filter, n_results, rrf_k, domain_boost)
+            for query_index, hits in enumerate(lexical)]
+
+
+def _fuse(vector, query_index, index, lexical, domain_filter, n_results, rrf_k, domain_boost):
+    # RRF over the query's vector candidates (query_vectors layout) and its BM25 hits, plus the domain boost
+    candidates = {}
+    scores = defaultdict(float)
+    if vector["ids"] and vector["ids"][query_index]:
+        for rank, doc_id in enumerate(vector["ids"][query_index]):
+            candidates[doc_id] = {"id": doc_id, "content": vector["documents"][query_index][rank],
+                                  "meta": vector["metadatas"][query_index][rank] or {},
+                                  "distance": vector["distances"][query_index][rank]}
+            scores[doc_id] += 1.0 / (rrf_k + rank + 1)
+
+    for rank, (doc_index, _score) in enumerate(lexical):
+        doc_id = index.ids[doc_index]
+        if doc_id not in candidates:
+            candidates[doc_id] = {"id": doc_id, "content": index.documents[doc_index],
+                                  "meta": index.metadatas[doc_index], "distance": None}
+        scores[doc_id] += 1.0 / (rrf_k + rank + 1)
+
+    for doc_id, candidate in candidates.items():
+        if domain_filter and candidate["meta"].get("domain") == domain_filter:
+            scores[doc_id] += domain_boost
+        candidate["score"] = scores[doc_id]
+    ranked = sorted(candidates.values(), key=lambda item: item["score"], reverse=True)
+    return ranked[:n_results]
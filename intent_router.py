@@ -0,0 +1,239 @@
+# Fast-path intent router in front of the ReAct agent.
+# The agent spends several sequential LLM calls deciding which tool to call (and re-deriving the
+# environment domain) before the tool makes its own LLM call. Most requests are simple:
+# "write a test for X", "run this code", "any known bugs in QA?". The router classifies the
+# request with cheap rules plus embedding similarity to exemplar queries (same embedding backend
+# and cache as retrieval), and dispatches confident single-tool requests straight to the tool
+# with the resolved domain. Ambiguous, follow-up or multi-step requests fall back to the agent.
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+import tracing
+from embedding_backends import embed_texts
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.5"))  # cosine similarity to the best exemplar
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))         # lead over the runner-up intent
+# Agent LLM calls avoided by a direct dispatch: choosing the tool, then writing the final answer
+AGENT_CALLS_PER_TOOL_STEP = 2
+
+# Intent -> agent tool name
+TOOLS = {
+    "generate_test": "GenerateTestCode",
+    "run_test": "RunJavaTest",
+    "knowledge": "QueryKnowledgeBase",
+}
+
+EXEMPLARS = {
+    "generate_test": [
+        "Write a login test for Chrome",
+        "Generate a Selenium test that checks the dashboard loads",
+        "Create a TestNG test for the sign-up form",
+        "Write a test case for the Google sign-in button",
+        "Generate Java test code to verify the payment page",
+        "Automate a test that logs in and checks the welcome message",
+        "Give me a test for the password reset flow on Firefox",
+    ],
+    "run_test": [
+        "Run this test",
+        "Execute this Java test code",
+        "Run the following TestNG class and tell me if it passes",
+        "Can you execute this test for me",
+    ],
+    "knowledge": [
+        "Are there any known login bugs in STAGE?",
+        "Explain the Page Object Model",
+        "What locator strategies should we use?",
+        "What is the status of payment processing performance?",
+        "Which element id does the beta dashboard use?",
+        "What are our guidelines for explicit waits?",
+        "Tell me about bug WEB-457",
+    ],
+    "multi_step": [
+        "Generate a login test and run it",
+        "Write a test, execute it and fix it if it fails",
+        "Create tests for login and checkout and compare the results",
+        "Look up known bugs and then write a test that reproduces them",
+    ],
+}
+
+_JAVA_CODE = re.compile(r"```java|\bclass\s+\w+\s*\{|@Test\b|\bimport\s+(?:org|java)\.[\w.]+;")
+_ENVIRONMENT = re.compile(r"\b(QA|STAGE|STAGING|STG|PROD|PRODUCTION)\b", re.IGNORECASE)
+_ENVIRONMENT_ALIASES = {"STAGING": "STAGE", "STG": "STAGE", "PRODUCTION": "PROD"}
+# Requests chaining several actions need the agent's reasoning loop
+_MULTI_STEP = re.compile(r"\b(?:and|then)\s+(?:then\s+)?(?:run|execute|fix|compare|explain)\b"
+                         r"|\bthen\s+(?:write|generate|create)\b|\bif it fails\b|\bstep by step\b", re.IGNORECASE)
+# Follow-ups ("run it again", "fix that") depend on earlier turns the tools do not see
+_FOLLOW_UP = re.compile(r"\b(?:it|that|this one|the above|previous|again|same)\b", re.IGNORECASE)
+
+
+@dataclass
+class Route:
+    """
+    Routing decision for one request.
+    """
+    intent: str                       # generate_test, run_test, knowledge or multi_step
+    confident: bool                   # True when the request can skip the agent
+    reason: str
+    environment: Optional[str] = None # environment named in the request, if any
+    similarity: float = 0.0
+    margin: float = 0.0
+
+    @property
+    def tool(self):
+        return TOOLS.get(self.intent)
+
+
+def detect_environment(query):
+    """
+    Return the environment (QA, STAGE, PROD) named in the request, or None.
+    """
+    match = _ENVIRONMENT.search(query)
+    if not match:
+        return None
+    name = match.group(1).upper()
+    return _ENVIRONMENT_ALIASES.get(name, name)
+
+
+def extract_code(query):
+    """
+    Return the Java code contained in a request: a ```java block, or everything from the first
+    import/package/annotation/class declaration on.
+    """
+    if "```java" in query:
+        return query.split("```java", 1)[1].split("```", 1)[0].strip()
+    match = re.search(r"^\s*(?:package|import|@|public\s+class|class)\b", query, re.MULTILINE)
+    return query[match.start():].strip() if match else query.strip()
+
+
+_exemplar_lock = threading.Lock()
+_exemplar_state = {"intents": None, "matrix": None}
+
+
+def _exemplar_matrix():
+    # Unit-normalized exemplar embeddings, encoded once per process (and kept in the embedding cache)
+    with _exemplar_lock:
+        if _exemplar_state["matrix"] is None:
+            intents = [intent for intent, examples in EXEMPLARS.items() for _ in examples]
+            texts = [example for examples in EXEMPLARS.values() for example in examples]
+            matrix = embed_texts(texts)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            _exemplar_state["intents"], _exemplar_state["matrix"] = np.array(intents), matrix
+        return _exemplar_state["intents"], _exemplar_state["matrix"]
+
+
+def classify(query):
+    """
+    Return {intent: best cosine similarity to that intent's exemplars}.
+    """
+    intents, matrix = _exemplar_matrix()
+    vector = embed_texts([query])[0]
+    similarities = matrix @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+    return {intent: float(similarities[intents == intent].max()) for intent in EXEMPLARS}
+
+
+@tracing.traced("router.route")
+def route(query, chat_history=None):
+    """
+    Decide whether a request can be dispatched straight to a tool.
+
+    Args:
+        query (str): The user's request.
+        chat_history (list, optional): Earlier {'role', 'content'} messages, including the current one.
+
+    Returns:
+        Route: The intent and whether it is confident enough to bypass the agent.
+    """
+    environment = detect_environment(query)
+    has_history = bool(chat_history and len(chat_history) > 1)
+
+    code = _JAVA_CODE.search(query)
+    # Only the text before the code is the instruction; the code itself may contain any words
+    instruction = query[:code.start()] if code else query
+
+    if _MULTI_STEP.search(instruction):
+        decision = Route("multi_step", False, "several actions requested", environment)
+    elif code:
+        # Code plus a request to write/fix/explain it needs reasoning; bare code (or "run this") is executed
+        if re.search(r"\b(?:fix|explain|review|improve|refactor|why|write|generate)\b", instruction, re.IGNORECASE):
+            decision = Route("multi_step", False, "code with a non-run instruction", environment)
+        else:
+            decision = Route("run_test", True, "Java code present", environment, 1.0, 1.0)
+    elif has_history and _FOLLOW_UP.search(query):
+        decision = Route("multi_step", False, "follow-up to an earlier turn", environment)
+    else:
+        scores = classify(query)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (intent, best), (_, second) = ranked[0], ranked[1]
+        margin = best - second
+        confident = (intent in TOOLS and intent != "run_test"  # running needs code, handled by the rule above
+                     and best >= ROUTER_MIN_SIMILARITY and margin >= ROUTER_MIN_MARGIN)
+        reason = "similar to exemplars" if confident else f"low confidence ({best:.2f}, margin {margin:.2f})"
+        decision = Route(intent, confident, reason, environment, round(best, 3), round(margin, 3))
+
+    tracing.current_span().set(intent=decision.intent, confident=decision.confident)
+    return decision
+
+
+_stats_lock = threading.Lock()
+_stats = {"direct": {}, "agent": 0, "llm_calls_saved": 0, "latency": {"direct": [], "agent": []}}
+_MAX_LATENCY_SAMPLES = 1000
+
+
+def record(route_decision, seconds):
+    """
+    Record how a request was handled and how long it took end to end.
+    """
+    path = "direct" if route_decision.confident else "agent"
+    with _stats_lock:
+        if route_decision.confident:
+            _stats["direct"][route_decision.intent] = _stats["direct"].get(route_decision.intent, 0) + 1
+            _stats["llm_calls_saved"] += AGENT_CALLS_PER_TOOL_STEP
+        else:
+            _stats["agent"] += 1
+        samples = _stats["latency"][path]
+        samples.append(seconds)
+        del samples[:-_MAX_LATENCY_SAMPLES]
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3) if ordered else None
+
+
+def router_stats():
+    """
+    Return requests dispatched directly (per intent) and through the agent, the agent LLM calls
+    saved, and p50/p95 end-to-end latency per path.
+    """
+    with _stats_lock:
+        direct = dict(_stats["direct"])
+        latency = {path: list(samples) for path, samples in _stats["latency"].items()}
+        return {
+            "direct": direct,
+            "direct_total": sum(direct.values()),
+            "agent": _stats["agent"],
+            "llm_calls_saved": _stats["llm_calls_saved"],
+            "latency_seconds": {path: {"p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95),
+                                       "count": len(samples)} for path, samples in latency.items()},
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update({"direct": {}, "agent": 0, "llm_calls_saved": 0, "latency": {"direct": [], "agent": []}})
+
+
+def timed(route_decision, chunks):
+    """
+    Pass a stream of answer chunks through and record its end-to-end latency when it finishes.
+    """
+    started = time.perf_counter()
+    yield from chunks
+    record(route_decision, time.perf_counter() - started)
@@ -0,0 +1,238 @@
+# Fast compile-only gate for generated Java tests.
+# Before a generated class is handed to Maven, it is checked in two cheap stages:
+#   1. a syntactic sanity check in Python (no JVM at all) that catches truncated/markdown output
+#   2. javac on the single class, against the project's test classpath
+# The classpath is resolved once per classpath fingerprint (hash of pom.xml and the JDK version)
+# with `mvn dependency:build-classpath` and cached on disk, so a compile check only pays for javac.
+# The project's main classes (target/classes) are added to it; if the main sources were never compiled
+# the gate is skipped rather than rejecting tests that use page objects or utilities.
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+PREFLIGHT_CACHE_DIR = os.getenv("PREFLIGHT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "aitestauto_preflight"))
+JAVAC = os.getenv("JAVAC", "javac")
+# Start-up friendly JVM flags for javac: C1 only and class-data sharing
+JAVAC_JVM_FLAGS = ["-J-XX:TieredStopAtLevel=1", "-J-Xshare:auto"]
+COMPILE_TIMEOUT = float(os.getenv("COMPILE_TIMEOUT", "60"))
+
+# Project sources that generated tests are compiled and run against (see test_runner.create_workspace)
+FINGERPRINT_DIRS = (os.path.join("src", "main"), os.path.join("src", "test", "resources"))
+
+_DIAGNOSTIC = re.compile(r"^(?P<file>[^:\n]+\.java):(?P<line>\d+): (?P<kind>error|warning): (?P<message>.*)$", re.MULTILINE)
+
+_lock = threading.Lock()
+_classpaths = {}
+_fingerprints = {}
+stats = {"checks": 0, "rejected": 0, "syntax_rejected": 0, "skipped": 0, "seconds": 0.0}
+
+
+@dataclass
+class CompileResult:
+    """
+    Outcome of the compile-only gate.
+    """
+    ok: bool
+    duration: float
+    diagnostics: List[dict] = field(default_factory=list)
+    output: str = ""
+    skipped: bool = False          # True when no javac/classpath was available and only the syntax check ran
+
+    def summary(self):
+        if self.ok:
+            return "Compilation OK" + (" (syntax check only)" if self.skipped else "")
+        lines = [f"Compilation failed with {len(self.diagnostics)} error(s):"]
+        for diagnostic in self.diagnostics:
+            lines.append(f"  line {diagnostic['line']}: {diagnostic['message']}")
+        return "\n".join(lines)
+
+
+def _javac_version():
+    if not shutil.which(JAVAC):
+        return None
+    result = subprocess.run([JAVAC, "-version"], capture_output=True, text=True)
+    return (result.stdout or result.stderr).strip()
+
+
+def _count(**amounts):
+    # Called from the batch pipeline's and the API server's worker threads
+    with _lock:
+        for key, amount in amounts.items():
+            stats[key] += amount
+
+
+def _project_files(project_dir):
+    # (relative path, mtime, size) of every file under FINGERPRINT_DIRS, in a stable order
+    files = []
+    for part in FINGERPRINT_DIRS:
+        for root, dirs, names in os.walk(os.path.join(project_dir, part)):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((os.path.relpath(path, project_dir), stat.st_mtime_ns, stat.st_size))
+    return files
+
+
+def classpath_fingerprint(project_dir):
+    """
+    Fingerprint of what the dependency classpath depends on: the project's pom.xml and the JDK version.
+    Memoized per pom modification time.
+    """
+    pom = os.path.join(project_dir, "pom.xml")
+    key = ("classpath", pom, os.stat(pom).st_mtime_ns)
+    with _lock:
+        if key not in _fingerprints:
+            digest = hashlib.sha256()
+            with open(pom, "rb") as f:
+                digest.update(f.read())
+            digest.update((_javac_version() or "no-javac").encode("utf-8"))
+            _fingerprints[key] = digest.hexdigest()[:16]
+        return _fingerprints[key]
+
+
+def dependency_fingerprint(project_dir):
+    """
+    Fingerprint of everything (besides the test code) that affects compilation and results:
+    the classpath fingerprint plus the contents of the main sources and test resources, so changing
+    a page object invalidates cached results. File contents are only re-hashed when a file's
+    modification time or size changes.
+    """
+    files = _project_files(project_dir)
+    key = ("dependencies", project_dir, classpath_fingerprint(project_dir), tuple(files))
+    with _lock:
+        fingerprint = _fingerprints.get(key)
+    if fingerprint is None:
+        digest = hashlib.sha256(classpath_fingerprint(project_dir).encode("utf-8"))
+        for relative_path, _mtime, _size in files:
+            digest.update(relative_path.encode("utf-8") + b"\0")
+            with open(os.path.join(project_dir, relative_path), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        fingerprint = digest.hexdigest()[:16]
+        with _lock:
+            # Keep only the latest source state per project
+            for old in [old for old in _fingerprints if old[0] == "dependencies" and old[1] == project_dir]:
+                del _fingerprints[old]
+            _fingerprints[key] = fingerprint
+    return fingerprint
+
+
+def get_classpath(project_dir, maven_command):
+    """
+    Return the dependency test classpath of the project, resolving it with Maven only the first time
+    for a given classpath fingerprint. Returns None if it cannot be resolved.
+    """
+    fingerprint = classpath_fingerprint(project_dir)
+    with _lock:
+        if fingerprint in _classpaths:
+            return _classpaths[fingerprint]
+
+    os.makedirs(PREFLIGHT_CACHE_DIR, exist_ok=True)
+    classpath_file = os.path.join(PREFLIGHT_CACHE_DIR, f"classpath-{fingerprint}.txt")
+    if not os.path.exists(classpath_file):
+        command = maven_command + ["-q", "dependency:build-classpath", "-Dmdep.includeScope=test",
+                                   f"-Dmdep.outputFile={classpath_file}"]
+        try:
+            subprocess.run(command, cwd=project_dir, capture_output=True, text=True, timeout=300)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Could not resolve the test classpath: {e}")
+    classpath = None
+    if os.path.exists(classpath_file):
+        with open(classpath_file) as f:
+            classpath = f.read().strip()
+    with _lock:
+        _classpaths[fingerprint] = classpath
+    return classpath
+
+
+def syntax_check(source):
+    """
+    Cheap structural checks that reject obviously broken LLM output without starting a JVM.
+    Returns a list of diagnostics (empty when the source looks compilable).
+    """
+    diagnostics = []
+    if "```" in source:
+        diagnostics.append({"line": source[:source.index("```")].count("\n") + 1, "kind": "error",
+                            "message": "Markdown code fence inside Java source"})
+    # Ignore braces in string/char literals and comments when counting
+    stripped = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//[^\n]*|/\*.*?\*/', "", source, flags=re.DOTALL)
+    if stripped.count("{") != stripped.count("}"):
+        diagnostics.append({"line": source.count("\n") + 1, "kind": "error",
+                            "message": f"Unbalanced braces ({stripped.count('{')} '{{' vs {stripped.count('}')} '}}')"})
+    if stripped.count("(") != stripped.count(")"):
+        diagnostics.append({"line": source.count("\n") + 1, "kind": "error", "message": "Unbalanced parentheses"})
+    if not re.search(r"\bclass\s+\w+", stripped):
+        diagnostics.append({"line": 1, "kind": "error", "message": "No class declaration found"})
+    return diagnostics
+
+
+def parse_diagnostics(output):
+    """
+    Parse javac output into a list of {'line', 'kind', 'message'} dicts.
+    """
+    return [{"line": int(match.group("line")), "kind": match.group("kind"), "message": match.group("message").strip()}
+            for match in _DIAGNOSTIC.finditer(output)]
+
+
+def compile_check(source, class_name, project_dir, maven_command, timeout=COMPILE_TIMEOUT):
+    """
+    Compile a single prepared test class on its own.
+
+    Args:
+        source (str): Complete Java source, including its package declaration.
+        class_name (str): Simple name of the public class (the file name).
+        project_dir (str): Maven project whose test classpath is used.
+        maven_command (list): Maven command used to resolve the classpath the first time.
+        timeout (float): Seconds allowed for javac.
+
+    Returns:
+        CompileResult: ok=False with diagnostics when the class does not compile.
+    """
+    started = time.perf_counter()
+    _count(checks=1)
+
+    diagnostics = syntax_check(source)
+    if diagnostics:
+        _count(rejected=1, syntax_rejected=1)
+        return _finish(CompileResult(False, time.perf_counter() - started, diagnostics), started)
+
+    classpath = get_classpath(project_dir, maven_command) if shutil.which(JAVAC) else None
+    main_classes = os.path.join(project_dir, "target", "classes")
+    if os.path.isdir(os.path.join(project_dir, "src", "main", "java")):
+        # Tests may use main-source classes (page objects, utils); without them javac would reject them
+        classpath = os.pathsep.join([main_classes, classpath]) if classpath and os.path.isdir(main_classes) else None
+    if classpath is None:
+        _count(skipped=1)
+        return _finish(CompileResult(True, time.perf_counter() - started, skipped=True), started)
+
+    with tempfile.TemporaryDirectory(prefix="preflight_") as workdir:
+        source_file = os.path.join(workdir, f"{class_name}.java")
+        with open(source_file, "w") as f:
+            f.write(source)
+        command = [JAVAC, *JAVAC_JVM_FLAGS, "-proc:none", "-nowarn", "-Xmaxerrs", "20",
+                   "-d", os.path.join(workdir, "classes"), "-cp", classpath, source_file]
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _count(skipped=1)
+            return _finish(CompileResult(True, time.perf_counter() - started, skipped=True,
+                                         output=f"javac timed out after {timeout}s"), started)
+        output = (process.stdout + process.stderr).replace(workdir + os.sep, "")
+
+    result = CompileResult(process.returncode == 0, time.perf_counter() - started,
+                           [d for d in parse_diagnostics(output) if d["kind"] == "error"], output)
+    if not result.ok:
+        _count(rejected=1)
+    return _finish(result, started)
+
+
+def _finish(result, started):
+    _count(seconds=time.perf_counter() - started)
+    return result
@@ -0,0 +1,71 @@
+# Stand-in for `mvn test` used to exercise test_runner.py without a JDK or Maven:
+#   MAVEN_COMMAND="python java_stub_project/fake_mvn.py" python -c "import test_runner; ..."
+# It reads the classes selected with -Dtest=a.B,c.D from src/test/java, finds their @Test methods
+# and writes Surefire-style TEST-*.xml reports. A method fails when its body calls Assert.fail or
+# asserts false; a class with unbalanced braces is reported as a compilation error.
+import os
+import re
+import sys
+import time
+from xml.sax.saxutils import quoteattr
+
+TEST_METHOD = re.compile(r"@Test\b[^{;]*?\bvoid\s+(\w+)\s*\([^)]*\)[^{]*\{", re.DOTALL)
+FAILING_BODY = re.compile(r"Assert\.fail\s*\(|assertTrue\s*\(\s*false\s*\)|assertFalse\s*\(\s*true\s*\)")
+
+
+def _method_body(source, start):
+    # Return the text of the block opening just before `start`
+    depth, index = 1, start
+    while index < len(source) and depth:
+        depth += {"{": 1, "}": -1}.get(source[index], 0)
+        index += 1
+    return source[start:index]
+
+
+def run_class(qualified_name, reports_dir):
+    path = os.path.join("src", "test", "java", *qualified_name.split(".")) + ".java"
+    if not os.path.exists(path):
+        print(f"[WARNING] No test source for {qualified_name}")
+        return True
+    with open(path) as f:
+        source = f.read()
+    if source.count("{") != source.count("}"):
+        print(f"[ERROR] COMPILATION ERROR : {path}: reached end of file while parsing")
+        return False
+
+    cases = []
+    for match in TEST_METHOD.finditer(source):
+        failed = bool(FAILING_BODY.search(_method_body(source, match.end())))
+        cases.append((match.group(1), failed))
+
+    lines = [f'<testsuite name={quoteattr(qualified_name)} tests="{len(cases)}" '
+             f'failures="{sum(failed for _, failed in cases)}" errors="0" skipped="0" time="0.01">']
+    for name, failed in cases:
+        lines.append(f'  <testcase name={quoteattr(name)} classname={quoteattr(qualified_name)} time="0.005">')
+        if failed:
+            lines.append('    <failure message="expected [true] but found [false]" type="java.lang.AssertionError"/>')
+        lines.append("  </testcase>")
+    lines.append("</testsuite>")
+    with open(os.path.join(reports_dir, f"TEST-{qualified_name}.xml"), "w") as f:
+        f.write("\n".join(lines))
+    print(f"Tests run: {len(cases)}, Failures: {sum(failed for _, failed in cases)}, Errors: 0, Skipped: 0 - in {qualified_name}")
+    return True
+
+
+def main(argv):
+    selected = []
+    for arg in argv:
+        if arg.startswith("-Dtest="):
+            selected.extend(name for name in arg[len("-Dtest="):].split(",") if name)
+    reports_dir = os.path.join("target", "surefire-reports")
+    os.makedirs(reports_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    compiled = all([run_class(name, reports_dir) for name in selected])
+    print("[INFO] " + ("BUILD SUCCESS" if compiled else "BUILD FAILURE"))
+    print(f"[INFO] Total time: {time.perf_counter() - started:.3f} s")
+    return 0 if compiled else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,289 @@
+# Incremental sync of the knowledge base with a source manifest, and zero-downtime rebuilds.
+#   python kb_sync.py sync --jsonl bugs.jsonl --source bugs            # only what changed since the last sync
+#   python kb_sync.py sync --dir docs/ --source docs --dry-run          # show the plan, write nothing
+#   python kb_sync.py rebuild --jsonl bugs.jsonl --dir docs/            # fill a shadow collection, then swap
+#   python kb_sync.py changes --since 42                                # change feed after version 42
+# A sync diffs the manifest against what is indexed, by document id and content hash, and applies only
+# the inserts, updates and deletes: documents gone from the source (e.g. a closed WEB-457) stop being
+# retrieved without wiping the collection. Documents are tagged with their --source, so a sync only
+# deletes documents of its own source; without --source the manifest is the whole knowledge base.
+# Every sync or rebuild that changes something bumps the knowledge-base version once (kb_version.py)
+# and appends the changed ids to the change feed; response caches, snapshots and BM25 indexes key on it.
+# A rebuild ingests everything into a new collection while the live one keeps serving, then swaps to it
+# with the version bump itself (the version file names the collection served), in one atomic rename.
+# Syncs, rebuilds and bulk_ingest all hold the knowledge-base write lock (kb_version.write_lock), so no
+# write to the live collection can land during a rebuild and be lost by the swap.
+import argparse
+import json
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+import resources
+from data_ingestion import (EMBEDDING_PROCESSES, _clean_metadata, bulk_ingest, content_hash, iter_directory,
+                            iter_jsonl)
+from embedding_backends import backend_name, ensure_collection_backend
+from kb_version import bump_version, changes_since, current_version, write_lock
+
+SYNC_SOURCE_KEY = "sync_source"     # metadata key holding the source a document was synced from
+KEEP_COLLECTIONS = 2                # rebuilt collections kept: the active one and the previous one
+_DELETE_BATCH_SIZE = 1000
+_PAGE_SIZE = 5000
+
+
+@dataclass
+class SyncPlan:
+    """
+    What a sync will change. inserts/updates are documents ({"id", "content", "metadata"});
+    deletes are document ids, with the chunk ids to remove in delete_chunk_ids.
+    """
+    source: str = None
+    inserts: list = field(default_factory=list)
+    updates: list = field(default_factory=list)
+    deletes: list = field(default_factory=list)
+    delete_chunk_ids: list = field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self):
+        return {"source": self.source, "inserts": len(self.inserts), "updates": len(self.updates),
+                "deletes": len(self.deletes), "unchanged": self.unchanged}
+
+
+def indexed_documents(collection, source=None):
+    """
+    Return {document id: (content hash, [chunk ids])} for the documents stored in a collection,
+    restricted to one sync source if given. Reads metadata only, a page at a time.
+    """
+    documents = {}
+    offset = 0
+    while True:
+        page = collection.get(where={SYNC_SOURCE_KEY: source} if source else None, include=["metadatas"],
+                              limit=_PAGE_SIZE, offset=offset)
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            doc_id = str(metadata.get("parent_id", chunk_id)) # Documents ingested before chunking have no parent_id
+            _, chunk_ids = documents.setdefault(doc_id, (metadata.get("content_hash"), []))
+            chunk_ids.append(chunk_id)
+        if len(page["ids"]) < _PAGE_SIZE:
+            return documents
+        offset += _PAGE_SIZE
+
+
+def _tag(documents, source):
+    # Mark documents with their sync source, so later syncs of that source can find (and delete) them
+    for doc in documents:
+        metadata = dict(doc.get("metadata") or {})
+        if source:
+            metadata[SYNC_SOURCE_KEY] = source
+        yield {"id": str(doc["id"]), "content": doc["content"], "metadata": metadata}
+
+
+def plan_sync(documents, source=None, collection=None):
+    """
+    Diff a source manifest against the indexed documents by id and content hash.
+
+    Args:
+        documents (iterable): The complete source: dicts with 'id', 'content' and optional 'metadata'.
+                              A document missing from it is deleted from the knowledge base.
+        source (str, optional): Name of the source. Only documents synced from it are considered for deletion.
+        collection (optional): Collection to diff against. Defaults to the live one.
+
+    Returns:
+        SyncPlan: The documents to insert and update and the ids to delete.
+    """
+    collection = collection if collection is not None else resources.get_collection()
+    indexed = indexed_documents(collection, source)
+    plan = SyncPlan(source=source)
+    manifest = {}
+    for doc in _tag(documents, source):
+        manifest[doc["id"]] = doc # Last occurrence of a repeated id wins, as in bulk_ingest
+
+    for doc_id, doc in manifest.items():
+        stored = indexed.get(doc_id)
+        if stored is None:
+            plan.inserts.append(doc)
+        elif stored[0] != content_hash(doc["content"], _clean_metadata(doc["metadata"])):
+            plan.updates.append(doc)
+        else:
+            plan.unchanged += 1
+    for doc_id, (_, chunk_ids) in indexed.items():
+        if doc_id not in manifest:
+            plan.deletes.append(doc_id)
+            plan.delete_chunk_ids.extend(chunk_ids)
+    return plan
+
+
+def apply_sync(plan, collection=None, processes=EMBEDDING_PROCESSES, verbose=True):
+    """
+    Apply a SyncPlan and record it as one knowledge-base version with its changed ids in the change feed.
+
+    Returns:
+        int: The new knowledge-base version, or the current one if the plan changed nothing.
+    """
+    with write_lock():
+        collection = collection if collection is not None else resources.get_collection()
+        if plan.inserts or plan.updates:
+            bulk_ingest(plan.inserts + plan.updates, verbose=verbose, processes=processes, collection=collection,
+                        record_version=False)
+        for start in range(0, len(plan.delete_chunk_ids), _DELETE_BATCH_SIZE):
+            collection.delete(ids=plan.delete_chunk_ids[start:start + _DELETE_BATCH_SIZE])
+
+        if not (plan.inserts or plan.updates or plan.deletes):
+            return current_version()
+        summary = plan.summary()
+        return bump_version(
+            f"sync {plan.source or 'all'}: +{summary['inserts']} ~{summary['updates']} -{summary['deletes']}",
+            changes={"source": plan.source, "inserted": [doc["id"] for doc in plan.inserts],
+                     "updated": [doc["id"] for doc in plan.updates], "deleted": plan.deletes})
+
+
+def sync(documents, source=None, dry_run=False, processes=EMBEDDING_PROCESSES, verbose=True):
+    """
+    Bring the knowledge base in line with a source manifest, writing only what changed.
+
+    Returns:
+        dict: The plan summary, with the resulting knowledge-base version and the seconds taken.
+    """
+    started = time.perf_counter()
+    # Plan and apply under one hold of the (re-entrant) write lock, so no other write lands in between
+    with nullcontext() if dry_run else write_lock():
+        plan = plan_sync(documents, source)
+        summary = plan.summary()
+        if verbose:
+            print(f"Sync plan for {source or 'the whole knowledge base'}: {summary['inserts']} new, "
+                  f"{summary['updates']} changed, {summary['deletes']} deleted, {summary['unchanged']} unchanged.")
+        summary["version"] = current_version() if dry_run else apply_sync(plan, processes=processes, verbose=verbose)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _diff(before, after):
+    # Change feed entry between two indexed_documents() maps
+    return {
+        "inserted": sorted(doc_id for doc_id in after if doc_id not in before),
+        "updated": sorted(doc_id for doc_id in after if doc_id in before and before[doc_id][0] != after[doc_id][0]),
+        "deleted": sorted(doc_id for doc_id in before if doc_id not in after),
+    }
+
+
+def _collection_names(client):
+    # list_collections() returns names in recent ChromaDB releases and Collection objects in older ones
+    return [getattr(item, "name", item) for item in client.list_collections()]
+
+
+def _prune(client, active, keep=KEEP_COLLECTIONS):
+    # Drop older rebuilt collections; the original COLLECTION_NAME collection is left for the operator
+    prefix = f"{resources.COLLECTION_NAME}__"
+    rebuilt = sorted((name for name in _collection_names(client) if name.startswith(prefix)), reverse=True)
+    for name in [name for name in rebuilt if name != active][max(keep - 1, 0):]:
+        client.delete_collection(name)
+        print(f"Deleted old collection '{name}'.")
+
+
+def _rebuild(documents, source, processes, keep, verbose):
+    with write_lock():
+        started = time.perf_counter()
+        client = resources.get_chroma_client()
+        live = resources.get_collection()
+        # Timestamp first so names sort by age; the suffix keeps two rebuilds in the same second apart
+        name = f"{resources.COLLECTION_NAME}__{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        metadata = {"embedding_backend": backend_name()}
+        if (live.metadata or {}).get("hnsw:space"):
+            metadata["hnsw:space"] = live.metadata["hnsw:space"]
+        shadow = client.create_collection(name=name, metadata=metadata)
+        if verbose:
+            print(f"Rebuilding into '{name}' while '{live.name}' keeps serving...")
+        try:
+            # Only the collection created above is dropped on failure
+            ensure_collection_backend(shadow)
+            stats = bulk_ingest(_tag(documents, source), verbose=verbose, processes=processes, collection=shadow,
+                                record_version=False)
+        except BaseException:
+            client.delete_collection(name)
+            raise
+
+        changes = _diff(indexed_documents(live), indexed_documents(shadow))
+        # The new version and the new collection become visible together
+        version = bump_version(f"rebuild: {name}", changes={"rebuild": name, "previous": live.name, **changes},
+                               collection=name)
+        _prune(client, name, keep)
+        if verbose:
+            print(f"Swapped to '{name}' ({stats['documents']} documents) at version {version} "
+                  f"in {time.perf_counter() - started:.1f}s.")
+        return version
+
+
+def rebuild(documents, source=None, background=True, processes=EMBEDDING_PROCESSES, keep=KEEP_COLLECTIONS, verbose=True):
+    """
+    Re-ingest the whole knowledge base into a shadow collection, then swap it in atomically.
+    Queries keep using the current collection until the swap; syncs and ingestion wait for the rebuild to finish.
+
+    Args:
+        documents (iterable): Every document of the knowledge base.
+        source (str, optional): Sync source to tag the documents with, as sync() would.
+        background (bool): Run in a daemon thread and return immediately.
+        processes (int): Encoding processes, as in bulk_ingest.
+        keep (int): Rebuilt collections kept after the swap (the active one included), for rollback.
+
+    Returns:
+        threading.Thread or int: The rebuild thread when running in the background, otherwise the new version.
+    """
+    if not background:
+        return _rebuild(documents, source, processes, keep, verbose)
+
+    def _run():
+        try:
+            _rebuild(documents, source, processes, keep, verbose)
+        except Exception as e:
+            print(f"Rebuild failed, the current collection is still served: {e}")
+
+    thread = threading.Thread(target=_run, name="kb-rebuild", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally sync or rebuild the automation knowledge base.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command in ("sync", "rebuild"):
+        sub = commands.add_parser(command)
+        sub.add_argument("--jsonl", nargs="+", default=[], help="JSONL files with one {id, content, metadata} object per line.")
+        sub.add_argument("--dir", dest="directories", nargs="+", default=[], help="Directories of text files.")
+        sub.add_argument("--type", dest="doc_type", default="document", help="'type' metadata for files from --dir.")
+        sub.add_argument("--domain", default="general", help="'domain' metadata for files from --dir.")
+        sub.add_argument("--source", help="Source name; a sync only deletes documents of its own source.")
+        sub.add_argument("--processes", type=int, default=EMBEDDING_PROCESSES)
+    commands.choices["sync"].add_argument("--dry-run", action="store_true", help="Print the plan without applying it.")
+    commands.add_parser("changes").add_argument("--since", type=int, default=0, help="Knowledge-base version.")
+    commands.add_parser("status")
+    args = parser.parse_args(argv)
+
+    if args.command == "changes":
+        for entry in changes_since(args.since):
+            print(json.dumps(entry))
+        return
+    if args.command == "status":
+        collection = resources.get_collection()
+        print(f"Knowledge base version {current_version()}, serving '{collection.name}' "
+              f"({collection.count()} chunks).")
+        return
+
+    if not (args.jsonl or args.directories):
+        parser.error("give the source documents with --jsonl and/or --dir")
+
+    def documents():
+        for path in args.jsonl:
+            yield from iter_jsonl(path)
+        for path in args.directories:
+            yield from iter_directory(path, {"type": args.doc_type, "domain": args.domain})
+
+    if args.command == "sync":
+        print(json.dumps(sync(documents(), args.source, dry_run=args.dry_run, processes=args.processes)))
+    else:
+        rebuild(documents(), args.source, background=False, processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
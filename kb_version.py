@@ -0,0 +1,139 @@
+# Knowledge-base version counter.
+# Every write to the automation_knowledge_base collection bumps a monotonically increasing integer
+# stored next to the ChromaDB data. Caches built from the knowledge base (LLM response cache,
+# retrieval indexes, snapshots) record the version they were built at and drop their entries
+# as soon as the version moves, in this process or in any other process sharing the same store.
+# Each bump is also appended to a change feed (JSONL, one line per version) so consumers can ask
+# what changed since the version they hold (changes_since), e.g. the ids a sync inserted or deleted.
+# The version file also names the collection being served (set by kb_sync rebuilds), so a swap to a
+# rebuilt collection and its version bump are one atomic write. write_lock() serializes the writers
+# (bulk ingestion, syncs, rebuilds) across threads and processes.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from resources import CHROMA_PATH
+
+try:
+    import fcntl
+except ImportError: # Windows: fall back to in-process locking only
+    fcntl = None
+
+KB_VERSION_PATH = os.getenv("KB_VERSION_PATH", os.path.join(CHROMA_PATH, "kb_version.json"))
+KB_CHANGES_PATH = os.getenv("KB_CHANGES_PATH", os.path.join(CHROMA_PATH, "kb_changes.jsonl"))
+KB_WRITE_LOCK_PATH = os.getenv("KB_WRITE_LOCK_PATH", os.path.join(CHROMA_PATH, "kb_write.lock"))
+
+_lock = threading.Lock()
+_cached = {"mtime": None, "version": 0, "collection": None}
+_write_lock = threading.RLock()
+_write_depth = threading.local()
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+        return {"version": int(state.get("version", 0)), "collection": state.get("collection")}
+    except (FileNotFoundError, ValueError):
+        return {"version": 0, "collection": None}
+
+
+def _current(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {"version": 0, "collection": None}
+    with _lock:
+        if _cached["mtime"] != mtime:
+            _cached.update(_read(path))
+            _cached["mtime"] = mtime
+        return {"version": _cached["version"], "collection": _cached["collection"]}
+
+
+def current_version(path=KB_VERSION_PATH):
+    """
+    Return the current knowledge-base version (0 if nothing was ever written).
+    The file is only re-read when its modification time changes, so this is cheap to call per request.
+    """
+    return _current(path)["version"]
+
+
+def active_collection(path=KB_VERSION_PATH):
+    """
+    Return the name of the collection recorded by the last rebuild, or None if there was none.
+    """
+    return _current(path)["collection"]
+
+
+@contextmanager
+def write_lock(path=KB_WRITE_LOCK_PATH):
+    """
+    Hold the knowledge-base write lock. Re-entrant within a thread, so a sync can call bulk_ingest.
+    """
+    with _write_lock:
+        depth = getattr(_write_depth, "value", 0)
+        if depth:
+            _write_depth.value = depth + 1
+            try:
+                yield
+            finally:
+                _write_depth.value = depth
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+            _write_depth.value = 1
+            try:
+                yield
+            finally:
+                _write_depth.value = 0
+
+
+def bump_version(reason=None, path=KB_VERSION_PATH, changes=None, changes_path=KB_CHANGES_PATH, collection=None):
+    """
+    Increment the knowledge-base version after a write and return the new version.
+
+    Args:
+        reason (str, optional): Short description of the change, stored for debugging.
+        path (str): Location of the version file.
+        changes (dict, optional): Details recorded in the change feed entry (e.g. inserted/updated/deleted ids).
+        changes_path (str): Location of the change feed; None to skip the feed entry.
+        collection (str, optional): Serve this collection from the new version on (a rebuild's swap).
+                                    Otherwise the collection of the previous version is kept.
+
+    Returns:
+        int: The new version.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _lock, open(path + ".lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # Serialize bumps across processes
+        previous = _read(path)
+        version = previous["version"] + 1
+        state = {"version": version, "updated_at": time.time(), "reason": reason,
+                 "collection": collection or previous["collection"]}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path) # Atomic: readers see the old or the new version (and collection), never a mix
+        _cached["mtime"] = None
+        if changes_path:
+            # Appended under the same lock, so the feed is in version order
+            with open(changes_path, "a") as f:
+                f.write(json.dumps({"version": version, "time": time.time(), "reason": reason, **(changes or {})}) + "\n")
+    return version
+
+
+def changes_since(version, changes_path=KB_CHANGES_PATH):
+    """
+    Return the change feed entries after `version`, oldest first.
+    """
+    try:
+        with open(changes_path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    return [entry for entry in entries if entry["version"] > version]
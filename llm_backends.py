@@ -0,0 +1,312 @@
+# Pluggable LLM backends used by llm_client.py.
+#   - GeminiBackend: Google Gemini through the shared google-genai client (the default)
+#   - HTTPBackend:   any server speaking a tiny JSON protocol, e.g. benchmarks/fake_llm_server.py
+#   - FakeBackend:   in-process deterministic responses with configurable latency, for tests
+# Select one with the LLM_BACKEND environment variable ("gemini", "http" or "fake").
+# Every backend offers a blocking generate(), an async agenerate() and a streaming stream() that yields
+# text chunks as they are produced; all raise LLMError, with `retryable=True` for rate limits,
+# server errors and timeouts.
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import resources
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_BACKEND_URL = os.getenv("LLM_BACKEND_URL", "http://127.0.0.1:8765")
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))   # Maximum pooled HTTP connections per backend
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """
+    Raised when the LLM call fails. `retryable` tells the caller whether trying again may succeed.
+    """
+
+    def __init__(self, message, retryable=False, status_code=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+@dataclass
+class Completion:
+    """
+    Text produced by a backend, with token usage when the backend reports it.
+    """
+    text: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+class LLMBackend:
+    """
+    Base class for LLM backends.
+    """
+    name = "base"
+
+    def generate(self, prompt, temperature, model, timeout=None):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, temperature, model, timeout=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, temperature, model, timeout=None):
+        # Backends without native streaming yield the whole answer as a single chunk
+        yield self.generate(prompt, temperature, model, timeout).text
+
+    async def aclose(self):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through the shared genai client. The client keeps a pooled HTTP connection
+    for the blocking API and another one (client.aio) for the async API.
+    """
+    name = "gemini"
+
+    @staticmethod
+    def _config(temperature, timeout):
+        from google.genai import types
+        http_options = types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None
+        return types.GenerateContentConfig(temperature=temperature, http_options=http_options)
+
+    @staticmethod
+    def _completion(response):
+        usage = getattr(response, "usage_metadata", None)
+        return Completion(
+            text=(response.text or "").strip(),
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+        )
+
+    @staticmethod
+    def _wrap_error(error):
+        from google.genai import errors
+        if isinstance(error, errors.APIError):
+            return LLMError(str(error), retryable=error.code in RETRYABLE_STATUS_CODES, status_code=error.code)
+        return LLMError(str(error), retryable=_is_transport_error(error))
+
+    def generate(self, prompt, temperature, model, timeout=None):
+        try:
+            response = resources.get_genai_client().models.generate_content(
+                model=model, contents=prompt, config=self._config(temperature, timeout))
+        except Exception as e:
+            raise self._wrap_error(e) from e
+        return self._completion(response)
+
+    async def agenerate(self, prompt, temperature, model, timeout=None):
+        try:
+            response = await resources.get_genai_client().aio.models.generate_content(
+                model=model, contents=prompt, config=self._config(temperature, timeout))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise self._wrap_error(e) from e
+        return self._completion(response)
+
+    def stream(self, prompt, temperature, model, timeout=None):
+        try:
+            for chunk in resources.get_genai_client().models.generate_content_stream(
+                    model=model, contents=prompt, config=self._config(temperature, timeout)):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise self._wrap_error(e) from e
+
+
+class HTTPBackend(LLMBackend):
+    """
+    Backend for a server that accepts POST {base_url}/generate with JSON {"prompt", "temperature", "model"}
+    and answers {"text", "prompt_tokens", "output_tokens"}. Connections are pooled and kept alive;
+    the async pool is created per event loop because httpx clients cannot be shared across loops.
+    llm_client.generate_many runs on one long-lived loop, so its pool is reused across calls; callers
+    running their own short-lived loops should await aclose() before the loop ends.
+    """
+    name = "http"
+
+    def __init__(self, base_url=LLM_BACKEND_URL, pool_size=LLM_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self._sync_client = None
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+
+    def _get_sync_client(self):
+        import httpx
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(base_url=self.base_url, limits=self._limits())
+            return self._sync_client
+
+    def _get_async_client(self):
+        import httpx
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            # Clients of finished loops cannot be closed any more (aclose needs their loop); at least
+            # release them and say so, rather than keep them for the life of the process
+            for old_loop in [old for old in self._async_clients if old.is_closed()]:
+                print("HTTPBackend: an event loop ended without aclose(); its pooled connections were not closed.")
+                del self._async_clients[old_loop]
+            client = httpx.AsyncClient(base_url=self.base_url, limits=self._limits())
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _completion(response):
+        if response.status_code != 200:
+            raise LLMError(f"LLM server returned HTTP {response.status_code}: {response.text[:200]}",
+                           retryable=response.status_code in RETRYABLE_STATUS_CODES,
+                           status_code=response.status_code)
+        body = response.json()
+        return Completion(body.get("text", ""), body.get("prompt_tokens"), body.get("output_tokens"))
+
+    def generate(self, prompt, temperature, model, timeout=None):
+        payload = {"prompt": prompt, "temperature": temperature, "model": model}
+        try:
+            response = self._get_sync_client().post("/generate", json=payload, timeout=timeout)
+        except Exception as e:
+            raise LLMError(str(e), retryable=_is_transport_error(e)) from e
+        return self._completion(response)
+
+    async def agenerate(self, prompt, temperature, model, timeout=None):
+        payload = {"prompt": prompt, "temperature": temperature, "model": model}
+        try:
+            response = await self._get_async_client().post("/generate", json=payload, timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise LLMError(str(e), retryable=_is_transport_error(e)) from e
+        return self._completion(response)
+
+    def stream(self, prompt, temperature, model, timeout=None):
+        # With "stream": true the server answers with one JSON object per line: {"text": "<chunk>"}
+        payload = {"prompt": prompt, "temperature": temperature, "model": model, "stream": True}
+        try:
+            with self._get_sync_client().stream("POST", "/generate", json=payload, timeout=timeout) as response:
+                if response.status_code != 200:
+                    response.read()
+                    self._completion(response) # Raises the matching LLMError
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line).get("text", "")
+        except LLMError:
+            raise
+        except Exception as e:
+            raise LLMError(str(e), retryable=_is_transport_error(e)) from e
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def fake_completion_text(prompt):
+    """
+    Deterministic canned answer for a prompt, shared by FakeBackend and benchmarks/fake_llm_server.py.
+    Prompts asking for Java code get a small TestNG class; anything else gets a short text answer.
+    """
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    if "java" in prompt.lower() and "test" in prompt.lower():
+        return (
+            "```java\n"
+            "import org.testng.Assert;\n"
+            "import org.testng.annotations.Test;\n\n"
+            f"public class FakeGeneratedTest{digest} {{\n"
+            "    @Test\n"
+            "    public void generatedTest() {\n"
+            "        Assert.assertTrue(true);\n"
+            "    }\n"
+            "}\n"
+            "```"
+        )
+    return f"Fake answer {digest}: based on the provided context, {prompt.strip()[:120]}"
+
+
+def split_into_chunks(text, words_per_chunk=4):
+    """
+    Split a text into small chunks of a few words (keeping whitespace) to simulate token streaming.
+    """
+    words = text.split(" ")
+    for start in range(0, len(words), words_per_chunk):
+        chunk = " ".join(words[start:start + words_per_chunk])
+        yield chunk if start + words_per_chunk >= len(words) else chunk + " "
+
+
+class FakeBackend(LLMBackend):
+    """
+    In-process backend returning fake_completion_text() after a fixed latency.
+
+    Args:
+        latency (float): Seconds to wait per call.
+        failure_rate (float): Fraction of calls that fail with a retryable (HTTP 429) error.
+        seed (int, optional): Seed for the failure draw, for reproducible runs.
+    """
+    name = "fake"
+
+    def __init__(self, latency=float(os.getenv("FAKE_LLM_LATENCY", "0.05")),
+                 failure_rate=float(os.getenv("FAKE_LLM_FAILURE_RATE", "0")), seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _complete(self, prompt):
+        self.calls += 1
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise LLMError("Fake rate limit", retryable=True, status_code=429)
+        text = fake_completion_text(prompt)
+        return Completion(text, prompt_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
+
+    def generate(self, prompt, temperature, model, timeout=None):
+        time.sleep(self.latency)
+        return self._complete(prompt)
+
+    async def agenerate(self, prompt, temperature, model, timeout=None):
+        await asyncio.sleep(self.latency)
+        return self._complete(prompt)
+
+    def stream(self, prompt, temperature, model, timeout=None):
+        # The latency is spent before the first chunk, like a real time-to-first-token
+        time.sleep(self.latency)
+        yield from split_into_chunks(self._complete(prompt).text)
+
+
+def _is_transport_error(error):
+    # Timeouts and connection problems are worth retrying
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+BACKENDS = {"gemini": GeminiBackend, "http": HTTPBackend, "fake": FakeBackend}
+
+
+def create_backend(name=LLM_BACKEND):
+    """
+    Create a backend by name ("gemini", "http" or "fake").
+    """
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose one of: {', '.join(BACKENDS)}") from None
+
+
+resources.register("llm_backend", create_backend)
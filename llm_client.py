@@ -1,16 +1,53 @@
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-import os   
+import asyncio
+import os
+import random
+import threading
+import time
 
-# This script initializes a Google Generative AI client for interacting with a Large Language Model (LLM).
-load_dotenv() # Load environment variables from .env file
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") # Get your Gemini API key
+import resources
+import tracing
+from llm_backends import LLMError
+from resources import LLM_MODEL_NAME
+from response_cache import RESPONSE_CACHE_ENABLED, exact_cache
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found in .env file. Please set it.")
+ERROR_RESPONSE = "Error: Could not generate response."
 
-client = genai.Client(api_key=GOOGLE_API_KEY)
+# Retry and concurrency settings shared by the blocking and async APIs
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))                  # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))             # retries after the first attempt
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))       # seconds, doubled per retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))     # in-flight async calls per event loop
+
+# This script provides access to a Large Language Model (LLM), Google Gemini by default.
+# Calls go through a pluggable backend (see llm_backends.py) created lazily by the shared resource
+# registry (resources.py); a missing GOOGLE_API_KEY is reported on the first Gemini call.
+def __getattr__(name):
+    # Keep `llm_client.client` working for existing callers
+    if name == "client":
+        return resources.get_genai_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_backend():
+    """
+    Return the shared LLM backend selected by the LLM_BACKEND environment variable.
+    """
+    return resources.get("llm_backend")
+
+
+def set_backend(backend):
+    """
+    Replace the shared LLM backend, e.g. with a FakeBackend in tests and benchmarks.
+    """
+    resources.register("llm_backend", lambda: backend)
+
+
+def backoff_delay(attempt, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX):
+    """
+    Exponential backoff with full jitter: a random delay in [0, min(cap, base * 2**attempt)].
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
 
 
 # Function to get a response from the LLM
@@ -21,27 +58,268 @@ client = genai.Client(api_key=GOOGLE_API_KEY)
 # A lower temperature (e.g., 0.2) makes the output more deterministic,
 # while a higher temperature (e.g., 0.8) makes it more creative and varied.
 
-def get_llm_response(prompt: str, temperature=0.7):
+@tracing.traced("llm.generate", model=LLM_MODEL_NAME)
+def get_llm_response(prompt: str, temperature=0.7, domain=None, use_cache=True):
     """
     Get a response from the LLM for a given prompt.
-    
+    Identical prompts (after whitespace/case normalization) are answered from the response cache,
+    and rate limits / transient server errors are retried with backoff.
+
     Args:
         prompt (str): The input prompt for the LLM.
-        max_tokens (int): The maximum number of tokens in the response.
-        
+        temperature (float): Sampling temperature.
+        domain (str, optional): Environment domain the prompt was built for; part of the cache key.
+        use_cache (bool): Set to False to always call the LLM.
+
     Returns:
-        str: The response from the LLM.
+        str: The response from the LLM, or ERROR_RESPONSE if it could not be generated.
+    """
+    span = tracing.current_span()
+    use_cache = use_cache and RESPONSE_CACHE_ENABLED
+    if use_cache:
+        cached = exact_cache.get(prompt, temperature, LLM_MODEL_NAME, domain)
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    backend = get_backend()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            completion = backend.generate(prompt, temperature, LLM_MODEL_NAME, timeout=LLM_TIMEOUT)
+            text = completion.text.strip()
+            span.set(retries=attempt, prompt_tokens=completion.prompt_tokens, output_tokens=completion.output_tokens)
+            break
+        except LLMError as e:
+            if not e.retryable or attempt == LLM_MAX_RETRIES:
+                print(f"Error generating response: {e}")
+                span.set(retries=attempt, failed=str(e))
+                return ERROR_RESPONSE
+            time.sleep(backoff_delay(attempt))
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            span.set(retries=attempt, failed=str(e))
+            return ERROR_RESPONSE
+
+    if use_cache:
+        exact_cache.put(prompt, temperature, LLM_MODEL_NAME, text, domain)
+    return text
+
+
+def stream_llm_response(prompt: str, temperature=0.7, domain=None, use_cache=True):
     """
+    Stream a response from the LLM, yielding text chunks as soon as they are produced.
+    A cached response is yielded as a single chunk. Retryable errors are retried only while
+    nothing has been yielded yet; a failure after that ends the stream with an error note.
+
+    Args:
+        prompt (str): The input prompt for the LLM.
+        temperature (float): Sampling temperature.
+        domain (str, optional): Environment domain the prompt was built for; part of the cache key.
+        use_cache (bool): Set to False to always call the LLM.
+
+    Yields:
+        str: Chunks of the response text.
+    """
+    # Not the current span: the caller's code runs between the yields
+    span = tracing.start_span("llm.stream", model=LLM_MODEL_NAME)
     try:
-        response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt,
-        config=types.GenerateContentConfig(temperature=temperature)
-        )
-        return response.text.strip()
-    except Exception as e:
-        print(f"Error generating response: {e}")
-        return "Error: Could not generate response." 
-print(f"LLM client initialized successfully.")
-print(f"You can now use the llm_client to get responses from the LLM.")
-#print(get_llm_response("Explain the concept of Page Object Model in test automation."))
\ No newline at end of file
+        use_cache = use_cache and RESPONSE_CACHE_ENABLED
+        if use_cache:
+            cached = exact_cache.get(prompt, temperature, LLM_MODEL_NAME, domain)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                yield cached
+                return
+
+        backend = get_backend()
+        chunks = []
+        started = time.perf_counter()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                for chunk in backend.stream(prompt, temperature, LLM_MODEL_NAME, timeout=LLM_TIMEOUT):
+                    if not chunks:
+                        span.set(first_chunk_seconds=round(time.perf_counter() - started, 3))
+                    chunks.append(chunk)
+                    yield chunk
+                span.set(retries=attempt, chunks=len(chunks))
+                break
+            except LLMError as e:
+                if chunks or not e.retryable or attempt == LLM_MAX_RETRIES:
+                    print(f"Error generating response: {e}")
+                    span.set(retries=attempt, failed=str(e))
+                    yield ("\n\n" if chunks else "") + ERROR_RESPONSE
+                    return
+                time.sleep(backoff_delay(attempt))
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                span.set(retries=attempt, failed=str(e))
+                yield ("\n\n" if chunks else "") + ERROR_RESPONSE
+                return
+
+        if use_cache:
+            exact_cache.put(prompt, temperature, LLM_MODEL_NAME, "".join(chunks).strip(), domain)
+    finally:
+        span.end()
+
+
+class StreamTimer:
+    """
+    Wrap a stream of text chunks and measure time-to-first-chunk and total latency.
+
+    Usage:
+        timer = StreamTimer(stream_llm_response(prompt))
+        for chunk in timer: ...
+        timer.first_chunk_seconds, timer.total_seconds
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.started = None
+        self.first_chunk_seconds = None
+        self.total_seconds = None
+        self.chunk_count = 0
+        self.char_count = 0
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        for chunk in self._chunks:
+            if self.first_chunk_seconds is None:
+                self.first_chunk_seconds = time.perf_counter() - self.started
+            self.chunk_count += 1
+            self.char_count += len(chunk)
+            yield chunk
+        self.total_seconds = time.perf_counter() - self.started
+
+    def summary(self):
+        """
+        Return a short human readable latency summary.
+        """
+        if self.total_seconds is None:
+            return "stream not finished"
+        first = f"{self.first_chunk_seconds:.2f}s" if self.first_chunk_seconds is not None else "n/a"
+        return f"first token {first} · total {self.total_seconds:.2f}s · {self.char_count} chars"
+
+
+_semaphores = {}
+_loop_lock = threading.Lock()
+_background = {"loop": None}
+
+
+def _get_semaphore(limit):
+    # asyncio primitives belong to one event loop, so keep one semaphore per (loop, limit)
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _semaphores if key[0].is_closed()]:
+        del _semaphores[key]
+    semaphore = _semaphores.get((loop, limit))
+    if semaphore is None:
+        semaphore = _semaphores[(loop, limit)] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+async def aget_llm_response(prompt: str, temperature=0.7, domain=None, use_cache=True,
+                            timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, concurrency=LLM_MAX_CONCURRENCY):
+    """
+    Async version of get_llm_response.
+
+    At most `concurrency` calls are in flight per event loop; each attempt is bounded by `timeout`
+    and retryable errors (429, 5xx, timeouts, connection errors) are retried with exponential
+    backoff and jitter. Unlike get_llm_response, failures are raised instead of returned as text.
+
+    Args:
+        prompt (str): The input prompt for the LLM.
+        temperature (float): Sampling temperature.
+        domain (str, optional): Environment domain the prompt was built for; part of the cache key.
+        use_cache (bool): Set to False to always call the LLM.
+        timeout (float): Seconds allowed per attempt.
+        max_retries (int): Retries after the first attempt.
+        concurrency (int): Maximum concurrent calls sharing this limit.
+
+    Returns:
+        str: The response from the LLM.
+
+    Raises:
+        LLMError: If the call fails with a non-retryable error or retries are exhausted.
+    """
+    with tracing.span("llm.agenerate", model=LLM_MODEL_NAME) as span:
+        return await _aget_llm_response(span, prompt, temperature, domain, use_cache, timeout, max_retries,
+                                        concurrency)
+
+
+async def _aget_llm_response(span, prompt, temperature, domain, use_cache, timeout, max_retries, concurrency):
+    use_cache = use_cache and RESPONSE_CACHE_ENABLED
+    if use_cache:
+        cached = exact_cache.get(prompt, temperature, LLM_MODEL_NAME, domain)
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    backend = get_backend()
+    semaphore = _get_semaphore(concurrency)
+    for attempt in range(max_retries + 1):
+        try:
+            async with semaphore:
+                completion = await asyncio.wait_for(
+                    backend.agenerate(prompt, temperature, LLM_MODEL_NAME, timeout=timeout), timeout)
+            text = completion.text.strip()
+            span.set(retries=attempt, prompt_tokens=completion.prompt_tokens, output_tokens=completion.output_tokens)
+            break
+        except (LLMError, asyncio.TimeoutError) as e:
+            retryable = isinstance(e, asyncio.TimeoutError) or e.retryable
+            if not retryable or attempt == max_retries:
+                if isinstance(e, LLMError):
+                    raise
+                raise LLMError(f"LLM call timed out after {timeout}s", retryable=True) from e
+            # Back off outside the semaphore so waiting retries do not hold a slot
+            await asyncio.sleep(backoff_delay(attempt))
+
+    if use_cache:
+        exact_cache.put(prompt, temperature, LLM_MODEL_NAME, text, domain)
+    return text
+
+
+async def agenerate_many(prompts, temperature=0.7, domain=None, concurrency=LLM_MAX_CONCURRENCY,
+                         return_exceptions=False, **kwargs):
+    """
+    Generate responses for many prompts concurrently, at most `concurrency` at a time.
+    Results are returned in the order of `prompts`. With return_exceptions=True a failed prompt
+    yields its LLMError in place of the text instead of failing the whole batch.
+    """
+    tasks = [aget_llm_response(prompt, temperature=temperature, domain=domain, concurrency=concurrency, **kwargs)
+             for prompt in prompts]
+    return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+
+def _background_loop():
+    # One long-lived event loop for the blocking API, so the backend's async connection pool
+    # (bound to a loop) is reused by every generate_many call instead of being rebuilt per call
+    with _loop_lock:
+        if _background["loop"] is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-async", daemon=True).start()
+            _background["loop"] = loop
+        return _background["loop"]
+
+
+def generate_many(prompts, temperature=0.7, domain=None, concurrency=LLM_MAX_CONCURRENCY,
+                  return_exceptions=False, **kwargs):
+    """
+    Blocking wrapper around agenerate_many for callers without an event loop.
+    Runs on a shared background event loop; concurrent callers share its `concurrency` limit.
+
+    Args:
+        prompts (list): The prompts to send.
+        temperature (float): Sampling temperature.
+        domain (str, optional): Environment domain; part of the cache key.
+        concurrency (int): Maximum concurrent LLM calls.
+        return_exceptions (bool): Return LLMError objects for failed prompts instead of raising.
+
+    Returns:
+        list: One response (or exception) per prompt, in order.
+    """
+    # The coroutine runs in a copy of the caller's context, so its spans join the caller's trace
+    future = asyncio.run_coroutine_threadsafe(
+        agenerate_many(list(prompts), temperature=temperature, domain=domain, concurrency=concurrency,
+                       return_exceptions=return_exceptions, **kwargs), _background_loop())
+    return future.result()
+
+#print(get_llm_response("Explain the concept of Page Object Model in test automation."))
@@ -1,17 +1,42 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-from llm_client import get_llm_response # Import the LLM client function
+import os
 
-# Initialize ChromaDB client (must match path in data_ingestion.py)
-client = chromadb.PersistentClient(path="./chroma_db")
-# Get or create a collection
-collection = client.get_or_create_collection(name="automation_knowledge_base")
-# Load embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')   
+import resources
+import tracing
+from llm_client import ERROR_RESPONSE, get_llm_response, stream_llm_response # Import the LLM client functions
+from embedding_backends import embed_texts
+from context_packer import CONTEXT_TOKEN_BUDGET, estimate_tokens, pack_documents
+from hybrid_retriever import hybrid_search, hybrid_search_batch
+from vector_snapshot import query_vectors
+from response_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
 
-def retrieve_context(query_text, domain_filter=None, n_results=3):
+# "hybrid" fuses vector and BM25 rankings (see hybrid_retriever.py); "vector" is the original
+# Chroma-only top-n ranking, kept for comparison
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# The ChromaDB client/collection and the embedding model (must match data_ingestion.py) are
+# shared, lazily created resources: they are built on the first query, not at import time.
+def __getattr__(name):
+    # Keep `rag_system.client`, `.collection` and `.embedding_model` working for existing callers
+    if name == "client":
+        return resources.get_chroma_client()
+    if name == "collection":
+        return resources.get_collection()
+    if name == "embedding_model":
+        return resources.get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@tracing.traced("retrieval.embed")
+def embed_query(query_text):
     """
-    Retrieve relevant context from the knowledge base for a given query,
+    Embed a query with the shared embedding backend (served from the embedding cache when possible).
+    """
+    return embed_texts([query_text]).tolist()[0]
+
+
+@tracing.traced("retrieval")
+def retrieve_documents(query_text, domain_filter=None, n_results=3, mode=None):
+    """
+    Retrieve the most relevant documents from the knowledge base for a given query,
     optionally filtered by domain.
     
     Args:
@@ -19,49 +44,72 @@ def retrieve_context(query_text, domain_filter=None, n_results=3):
         domain_filter (str, optional): The domain to filter documents by.
                                        If None, general documents are preferred.
         n_results (int): The number of top results to return.
+        mode (str, optional): "hybrid" or "vector"; defaults to RETRIEVAL_MODE.
         
     Returns:
-        list: A list of relevant documents from the knowledge base.
+        list: Dicts with 'id', 'content', 'meta' and 'distance', best match first.
     """
-    query_embedding = embedding_model.encode([query_text]).tolist()[0]
-    
-    # Build the where clause for filtering
-    where_clause = {}
-    if domain_filter:
-        # Prioritize domain-specific documents, fallback to general if not enough found
-        # This is a strategy: query for exact domain, then augment with general.
-        # Or query with OR condition
-        where_clause = {
-            "$or": [
-                {"domain": domain_filter},
-                {"domain": "general"} # Always include general documents
-            ]
-        }
-        # For strict domain only: where_clause = {"domain": domain_filter}
-
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results,
-        where=where_clause, # Apply the filter here
-        include=["documents", "metadatas", "distances"] # Include distances for debugging
-    )
-    
-    context = []
+    mode = mode or RETRIEVAL_MODE
+    if mode == "hybrid":
+        documents = hybrid_search(query_text, embed_query(query_text), domain_filter, n_results)
+    else:
+        documents = _vector_search([embed_query(query_text)], domain_filter, n_results)[0]
+    tracing.current_span().set(mode=mode, domain=domain_filter, documents=len(documents))
+    return documents
+
+
+@tracing.traced("retrieval.batch")
+def retrieve_documents_batch(query_texts, domain_filters, n_results=3, mode=None):
+    """
+    Retrieve documents for many queries at once: all queries are embedded with a single encode
+    call and the collection is queried once per distinct domain.
+
+    Args:
+        query_texts (list): The query texts.
+        domain_filters (list): One domain filter (or None) per query.
+        n_results (int): The number of top results to return per query.
+        mode (str, optional): "hybrid" or "vector"; defaults to RETRIEVAL_MODE.
+
+    Returns:
+        list: One list of document dicts (as returned by retrieve_documents) per query, in order.
+    """
+    with tracing.span("retrieval.embed", queries=len(query_texts)):
+        embeddings = embed_texts(query_texts).tolist()
+    hybrid = (mode or RETRIEVAL_MODE) == "hybrid"
+    results = [None] * len(embeddings)
+    by_domain = {}
+    for index, domain_filter in enumerate(domain_filters):
+        by_domain.setdefault(domain_filter, []).append(index)
+    for domain_filter, indexes in by_domain.items():
+        group = [embeddings[i] for i in indexes]
+        if hybrid:
+            documents = hybrid_search_batch([query_texts[i] for i in indexes], group, domain_filter, n_results)
+        else:
+            documents = _vector_search(group, domain_filter, n_results)
+        for index, docs in zip(indexes, documents):
+            results[index] = docs
+    return results
+
+
+def _vector_search(query_embeddings, domain_filter, n_results):
+    # Query the collection with one or more embeddings sharing the same domain filter
+    # Domain-filtered queries search the domain plus 'general' documents (always included);
+    # served from the memory-mapped snapshot or ChromaDB, see vector_snapshot.query_vectors
+    results = query_vectors(query_embeddings, n_results, domain_filter)
+    return [_rank_results(results, i, domain_filter, n_results) for i in range(len(query_embeddings))]
+
+
+def _rank_results(results, query_index, domain_filter, n_results):
     # Filter and sort results to prioritize exact domain matches if needed
     # (ChromaDB's query 'where' might not guarantee exact domain first, so manual sort)
     relevant_docs = []
-    if results['ids'] and results['ids'][0]:
-        for i in range(len(results['ids'][0])):
-            doc_id = results['ids'][0][i]
-            doc_content = results['documents'][0][i]
-            doc_meta = results['metadatas'][0][i]
-            doc_distance = results['distances'][0][i]
+    if results['ids'] and results['ids'][query_index]:
+        for i in range(len(results['ids'][query_index])):
             relevant_docs.append({
-                "id": doc_id,
-                "content": doc_content,
-                "meta": doc_meta,
-                "distance": doc_distance
+                "id": results['ids'][query_index][i],
+                "content": results['documents'][query_index][i],
+                "meta": results['metadatas'][query_index][i] or {},
+                "distance": results['distances'][query_index][i]
             })
     
     # Sort to prioritize exact domain match, then by distance
@@ -80,14 +128,89 @@ def retrieve_context(query_text, domain_filter=None, n_results=3):
         relevant_docs.sort(key=lambda x: x['distance'])
 
 
-    for doc_item in relevant_docs[:n_results]: # Take top N after sorting
+    return relevant_docs[:n_results] # Take top N after sorting
+
+
+def format_context(documents):
+    """
+    Format retrieved documents as the context block used in LLM prompts.
+    """
+    context = []
+    for doc_item in documents:
         context.append(
             f"Document ID: {doc_item['id']}, Type: {doc_item['meta'].get('type')}, Domain: {doc_item['meta'].get('domain', 'N/A')}\nContent: {doc_item['content']}"
         )
     return "\n\n".join(context)
 
 
-def query_llm_with_rag(user_query, env_domain=None):
+def build_context(documents, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Deduplicate and trim retrieved documents to the token budget (see context_packer.py) and
+    format them as the context block used in LLM prompts.
+    """
+    packed = pack_documents(documents, token_budget)
+    context = format_context(packed)
+    tracing.current_span().set(context_documents=len(packed), context_tokens=estimate_tokens(context))
+    return context
+
+
+def retrieve_context(query_text, domain_filter=None, n_results=3):
+    """
+    Retrieve relevant context from the knowledge base for a given query,
+    optionally filtered by domain.
+    
+    Args:
+        query_text (str): The input query text to search for relevant documents.
+        domain_filter (str, optional): The domain to filter documents by.
+                                       If None, general documents are preferred.
+        n_results (int): The number of top results to return.
+        
+    Returns:
+        str: The relevant documents formatted as a context block, within the context token budget.
+    """
+    return build_context(retrieve_documents(query_text, domain_filter, n_results))
+
+
+DEFAULT_DOMAIN = "my.charitableimpact.com" # Production
+
+# Map environment to domain for RAG system and tool calls
+ENV_DOMAIN_MAP = {
+    "QA": "my.qa.charitableimpact.com",
+    "STAGE": "my.stg.charitableimpact.com",
+    "PROD": "my.charitableimpact.com"
+}
+
+
+def domain_for_environment(environment):
+    """
+    Return the domain of an environment name (QA, STAGE, PROD), defaulting to production.
+    """
+    return ENV_DOMAIN_MAP.get((environment or "PROD").upper(), DEFAULT_DOMAIN)
+
+
+def resolve_domain(env_domain=None):
+    """
+    Return the domain filter for an environment domain, defaulting to production.
+    """
+    return env_domain or DEFAULT_DOMAIN
+
+
+def build_rag_prompt(user_query, context):
+    """
+    Build the LLM prompt answering a user query from retrieved context.
+    """
+    return f"""You are an expert Test Automation Engineer. Use the following context to answer the user's query.
+        If the context does not contain enough information, state that.
+
+        Context:
+        {context}
+
+        User Query: {user_query}
+        """
+
+
+@tracing.traced("rag.query")
+def query_llm_with_rag(user_query, env_domain=None, stream=False):
     """
     Query the LLM with a user query and relevant context from the knowledge base,
     filtered by environment domain.
@@ -98,31 +221,48 @@ def query_llm_with_rag(user_query, env_domain=None):
                                      e.g., 'my.stg.charitableimpact.com'
                                      If None, it defaults to 'my.charitableimpact.com' (production)
                                      and includes general documents.
+        stream (bool): If True, return a generator yielding the answer in chunks as the LLM produces them.
         
     Returns:
-        str: The response from the LLM.
+        str: The response from the LLM (a generator of str chunks when stream=True).
     """
     # Determine the domain filter based on the environment
-    actual_domain_filter = None
-    if env_domain:
-        actual_domain_filter = env_domain
-    else:
-        # Default to production domain if no domain is explicitly provided
-        actual_domain_filter = "my.charitableimpact.com"
+    actual_domain_filter = resolve_domain(env_domain)
         
     print(f"Retrieving context for domain: {actual_domain_filter}")
-    context = retrieve_context(user_query, domain_filter=actual_domain_filter)
-    
-    prompt = f"""You are an expert Test Automation Engineer. Use the following context to answer the user's query.
-        If the context does not contain enough information, state that.
+    documents = retrieve_documents(user_query, domain_filter=actual_domain_filter)
+    context = build_context(documents)
 
-        Context:
-        {context}
+    # Reuse the answer to a near-identical earlier query over the same documents, if enabled
+    if SEMANTIC_CACHE_ENABLED:
+        query_embedding = embed_query(user_query)
+        doc_ids = [doc_item["id"] for doc_item in documents]
+        cached = semantic_cache.get(query_embedding, actual_domain_filter, doc_ids)
+        tracing.current_span().set(semantic_cache_hit=cached is not None)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+    
+    prompt = build_rag_prompt(user_query, context)
 
-        User Query: {user_query}
-        """
+    if stream:
+        return _stream_answer(prompt, actual_domain_filter,
+                              (query_embedding, doc_ids) if SEMANTIC_CACHE_ENABLED else None)
     
-    return get_llm_response(prompt)
+    response = get_llm_response(prompt, domain=actual_domain_filter)
+    if SEMANTIC_CACHE_ENABLED and response != ERROR_RESPONSE:
+        semantic_cache.put(query_embedding, actual_domain_filter, doc_ids, response)
+    return response
+
+
+def _stream_answer(prompt, domain, semantic_key=None):
+    # Pass the LLM chunks through, then store the complete answer in the semantic cache
+    chunks = []
+    for chunk in stream_llm_response(prompt, domain=domain):
+        chunks.append(chunk)
+        yield chunk
+    response = "".join(chunks).strip()
+    if semantic_key is not None and ERROR_RESPONSE not in response:
+        semantic_cache.put(semantic_key[0], domain, semantic_key[1], response)
 
 # Example usage with environment domains
 #if __name__ == "__main__":
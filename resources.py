@@ -0,0 +1,203 @@
+# Process-wide registry of the expensive shared resources: the embedding model, the ChromaDB
+# client/collection, the LLM clients and the agent executor.
+# Nothing is created at import time. Each resource is built on first use (once per process, thread-safe)
+# and then shared by every module, Streamlit session and test in the process.
+# warm_up() can build them in a background thread so the first user request does not pay the cost.
+# The collection served is the one recorded in the knowledge-base version file by the last rebuild
+# (kb_sync.rebuild fills a shadow collection, then swaps); every process switches on its next get_collection().
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables from .env file
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "automation_knowledge_base")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-2.0-flash")
+
+# Resources built by warm_up() when no names are given
+DEFAULT_WARM_UP = ("embedding_model", "collection", "genai_client", "agent_executor")
+
+_factories = {}
+_instances = {}
+_locks = {}
+_timings = {}
+_registry_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def register(name, factory):
+    """
+    Register a zero-argument factory for a named resource.
+    Registering again replaces the factory and drops any instance built by the old one.
+    """
+    with _registry_lock:
+        _factories[name] = factory
+        _locks.setdefault(name, threading.Lock())
+        _instances.pop(name, None)
+
+
+def get(name):
+    """
+    Return the named resource, building it on first use.
+    Concurrent callers wait for a single build instead of building it twice.
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        if name not in _factories:
+            raise KeyError(f"Unknown resource '{name}'. Registered: {sorted(_factories)}")
+        lock = _locks[name]
+    with lock:
+        instance = _instances.get(name)
+        if instance is None:
+            started = time.perf_counter()
+            instance = _factories[name]()
+            _timings[name] = time.perf_counter() - started
+            _instances[name] = instance
+    return instance
+
+
+def is_loaded(name):
+    """
+    Return True if the named resource has already been built in this process.
+    """
+    return name in _instances
+
+
+def reset(name=None):
+    """
+    Drop one (or every) built resource so it is rebuilt on next use. Mainly useful in tests.
+    """
+    with _registry_lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def load_timings():
+    """
+    Return how long each built resource took to create, in seconds.
+    """
+    return dict(_timings)
+
+
+def warm_up(names=None, background=True):
+    """
+    Build resources ahead of the first request.
+
+    Args:
+        names (iterable, optional): Resource names to build. Defaults to DEFAULT_WARM_UP.
+        background (bool): Build in a daemon thread and return immediately.
+
+    Returns:
+        threading.Thread or None: The warm-up thread when running in the background.
+    """
+    global _warm_up_thread
+    names = tuple(names or DEFAULT_WARM_UP)
+
+    def _run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"Warm-up of '{name}' failed: {e}")
+
+    if not background:
+        _run()
+        return None
+    with _registry_lock:
+        if _warm_up_thread is None or not _warm_up_thread.is_alive():
+            _warm_up_thread = threading.Thread(target=_run, name="resource-warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
+# --- Built-in resources ---
+
+def _build_embedding_model():
+    # An EmbeddingBackend (PyTorch, ONNX or int8 ONNX, see embedding_backends.py); it has encode() like SentenceTransformer
+    from embedding_backends import create_embedding_backend
+    return create_embedding_backend()
+
+
+def _build_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+
+def active_collection_name():
+    """
+    Return the name of the collection currently served: the last rebuilt one, or COLLECTION_NAME.
+    """
+    from kb_version import active_collection # kb_version imports this module
+    return active_collection() or COLLECTION_NAME
+
+
+def _build_collection():
+    from embedding_backends import ensure_collection_backend
+    collection = get_chroma_client().get_or_create_collection(name=active_collection_name())
+    # Refuse to mix vectors from two embedding backends in one collection
+    ensure_collection_backend(collection)
+    return collection
+
+
+def _build_genai_client():
+    from google import genai
+    google_api_key = os.getenv("GOOGLE_API_KEY") # Get your Gemini API key
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in .env file. Please set it.")
+    return genai.Client(api_key=google_api_key)
+
+
+def _build_chat_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=LLM_MODEL_NAME, temperature=0.5, google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+def _build_agent_executor():
+    # The agent executor is defined in agent_orchestrator; importing it here keeps this module light
+    from agent_orchestrator import build_agent_executor
+    return build_agent_executor()
+
+
+register("embedding_model", _build_embedding_model)
+register("chroma_client", _build_chroma_client)
+register("collection", _build_collection)
+register("genai_client", _build_genai_client)
+register("chat_llm", _build_chat_llm)
+register("agent_executor", _build_agent_executor)
+
+
+def get_embedding_model():
+    return get("embedding_model")
+
+
+def get_chroma_client():
+    return get("chroma_client")
+
+
+def get_collection():
+    collection = get("collection")
+    if collection.name != active_collection_name():
+        # A rebuild swapped to a new collection since this one was opened
+        reset("collection")
+        collection = get("collection")
+    return collection
+
+
+def get_genai_client():
+    return get("genai_client")
+
+
+def get_chat_llm():
+    return get("chat_llm")
+
+
+def get_agent_executor():
+    return get("agent_executor")
@@ -0,0 +1,206 @@
+# Response caches for LLM answers.
+# Two levels:
+#   - ExactResponseCache: keyed on the normalized prompt, temperature, model and domain.
+#     Used by llm_client.get_llm_response, so any caller sending the same prompt gets the stored answer.
+#   - SemanticResponseCache (optional): used by rag_system.query_llm_with_rag. Reuses an answer when a new
+#     query's embedding is close enough to a cached query for the same env_domain AND the same retrieved
+#     document ids, e.g. "known login bugs on STAGE" vs "Known STAGE login bugs?".
+# Both caches have a TTL and a size bound, and are cleared automatically when the knowledge-base version
+# changes (see kb_version.py), so answers never outlive the documents they were built from.
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from kb_version import current_version
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))            # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.08")) # cosine distance
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """
+    Normalize a prompt for exact matching: runs of whitespace collapsed. Case is kept, since prompts
+    differing only in case (Java code, element ids, ticket keys) can need different answers;
+    looser matching is left to the semantic cache and its similarity threshold.
+    """
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+class _VersionedCache:
+    # Shared TTL / size-bound / knowledge-base-version bookkeeping
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._kb_version = current_version()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_version(self):
+        # Caller holds the lock
+        version = current_version()
+        if version != self._kb_version:
+            self._clear_entries()
+            self._kb_version = version
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = self._size()
+            stats["kb_version"] = self._kb_version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._clear_entries()
+
+
+class ExactResponseCache(_VersionedCache):
+    """
+    LRU cache of LLM responses keyed on (normalized prompt, temperature, model, domain).
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL):
+        super().__init__(max_entries, ttl)
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(prompt, temperature, model, domain=None):
+        raw = "\0".join([normalize_prompt(prompt), repr(float(temperature)), model or "", domain or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, prompt, temperature, model, domain=None):
+        """
+        Return the cached response or None.
+        """
+        key = self.make_key(prompt, temperature, model, domain)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[0]
+
+    def put(self, prompt, temperature, model, response, domain=None):
+        key = self.make_key(prompt, temperature, model, domain)
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _size(self):
+        return len(self._entries)
+
+    def _clear_entries(self):
+        self._entries.clear()
+
+
+class SemanticResponseCache(_VersionedCache):
+    """
+    Cache of RAG answers matched by query-embedding similarity.
+
+    A cached answer is reused only when the env_domain and the set of retrieved document ids are identical
+    and the cosine distance between the query embeddings is at most `max_distance`.
+    """
+
+    def __init__(self, max_entries=SEMANTIC_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL,
+                 max_distance=SEMANTIC_CACHE_MAX_DISTANCE):
+        super().__init__(max_entries, ttl)
+        self.max_distance = max_distance
+        # (env_domain, doc_ids) -> list of [unit embedding, response, expires_at, last_used]
+        self._groups = {}
+        self._count = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query_embedding, env_domain, doc_ids):
+        """
+        Return the closest cached response within `max_distance`, or None.
+        """
+        group_key = (env_domain or "", tuple(sorted(doc_ids)))
+        query = self._unit(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            entries = self._groups.get(group_key)
+            if entries:
+                live = [entry for entry in entries if entry[2] >= now]
+                self._count -= len(entries) - len(live)
+                self._groups[group_key] = live
+                if live:
+                    distances = 1.0 - np.stack([entry[0] for entry in live]) @ query
+                    best = int(np.argmin(distances))
+                    if distances[best] <= self.max_distance:
+                        live[best][3] = now
+                        self.counters["hits"] += 1
+                        return live[best][1]
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, query_embedding, env_domain, doc_ids, response):
+        group_key = (env_domain or "", tuple(sorted(doc_ids)))
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            self._groups.setdefault(group_key, []).append([self._unit(query_embedding), response, now + self.ttl, now])
+            self._count += 1
+            if self._count > self.max_entries:
+                self._evict_least_recently_used()
+
+    def _evict_least_recently_used(self):
+        # Caller holds the lock
+        oldest_key, oldest_index, oldest_used = None, None, None
+        for group_key, entries in self._groups.items():
+            for index, entry in enumerate(entries):
+                if oldest_used is None or entry[3] < oldest_used:
+                    oldest_key, oldest_index, oldest_used = group_key, index, entry[3]
+        if oldest_key is not None:
+            del self._groups[oldest_key][oldest_index]
+            if not self._groups[oldest_key]:
+                del self._groups[oldest_key]
+            self._count -= 1
+            self.counters["evictions"] += 1
+
+    def _size(self):
+        return self._count
+
+    def _clear_entries(self):
+        self._groups.clear()
+        self._count = 0
+
+
+exact_cache = ExactResponseCache()
+semantic_cache = SemanticResponseCache()
+
+
+def cache_stats():
+    """
+    Return the statistics of both response caches.
+    """
+    return {"exact": exact_cache.stats(), "semantic": semantic_cache.stats()}
@@ -1,36 +1,430 @@
-import subprocess
+# Execution engine for generated Java tests.
+# Every run gets its own isolated workspace (a copy of the project's pom.xml, with the rest of the
+# project linked in) and a unique class name, so concurrent users never overwrite each other's tests.
+# Only the generated class is executed (-Dtest=...), through the Maven Daemon (mvnd) when it is
+# installed so the JVM and Maven stay warm between runs, and results are read from the
+# Surefire/TestNG XML reports instead of searching stdout for "BUILD SUCCESS".
+#
+# Two shortcuts avoid the Maven build altogether (see java_preflight.py and execution_cache.py):
+#   - a compile-only gate rejects code that does not compile, with the javac diagnostics
+#   - results are cached by a hash of the normalized code plus the dependency fingerprint
+#
+# For offline use point JAVA_PROJECT_DIR at java_stub_project/ and, without a JDK, set
+#   MAVEN_COMMAND="python java_stub_project/fake_mvn.py"
+import glob
 import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
 
+import java_preflight
+import tracing
 from code_generator import generate_test_code  # Import the missing function
-# Assuming your Java project is structured correctly
-JAVA_TEST_DIR = "/home/sanumenonmadhusoodanan/AgentAI/Eclipse/mvnProjectws/AIImplementation/src/test/java/AIImplementation/AIImplementation" # Adjust path
-MAVEN_COMMAND = ["mvn", "test"] # Or ["gradle", "test"]
+from execution_cache import result_cache, result_key
 
-def run_java_test(java_code, test_class_name="SampleTestNgTest"):
-    # Ensure the directory exists
-    os.makedirs(JAVA_TEST_DIR, exist_ok=True)
-    # Create the Java file
-    file_path = os.path.join(JAVA_TEST_DIR, f"{test_class_name}.java")
-    with open(file_path, "w") as f:
-        # Add package and class declaration if missing in LLM output
-        # Or refine LLM prompt to always include it
-        full_code = f"package com.example.generated_tests;\n\n{java_code}"
-        f.write(full_code)
-        print(f"Generated test file: {file_path}")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Maven project the generated tests are compiled and run against (adjust path)
+JAVA_PROJECT_DIR = os.getenv("JAVA_PROJECT_DIR", os.path.join(REPO_DIR, "java_stub_project"))
+# Parent directory of the per-run workspaces
+WORKSPACE_ROOT = os.getenv("TEST_WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "aitestauto_runs"))
+GENERATED_PACKAGE = "generated"
+TEST_TIMEOUT = float(os.getenv("TEST_TIMEOUT", "600"))       # seconds per Maven invocation
+KEEP_WORKSPACES = os.getenv("KEEP_TEST_WORKSPACES", "0") == "1"
 
-        try:
-            # Run Maven/Gradle test command
-            result = subprocess.run(MAVEN_COMMAND, capture_output=True, text=True, check=True)
-            print("Test Execution Output:\n", result.stdout)
-            if result.stderr:
-                print("Test Execution Errors:\n", result.stderr)
-            return "PASS" if "BUILD SUCCESS" in result.stdout else "FAIL" # Simple check
-        except subprocess.CalledProcessError as e:
-            print(f"Test Execution Failed: {e.returncode}\n{e.stdout}\n{e.stderr}")
+
+def _default_maven_command():
+    # mvnd keeps a warm JVM with Maven and the compiler loaded between runs; plain mvn is the fallback.
+    # -o skips remote repository checks (dependencies are resolved once into ~/.m2), -B is batch mode.
+    if os.getenv("MAVEN_COMMAND"):
+        # Maven runs inside the workspace, so make relative script paths absolute (relative to this repo)
+        return [os.path.join(REPO_DIR, part) if os.path.exists(os.path.join(REPO_DIR, part)) else part
+                for part in shlex.split(os.getenv("MAVEN_COMMAND"))]
+    if shutil.which("mvnd"):
+        return ["mvnd", "-B", "-o"]
+    return ["mvn", "-B", "-o"]
+
+
+MAVEN_COMMAND = _default_maven_command()
+
+
+@dataclass
+class TestCaseResult:
+    """
+    Outcome of a single test method.
+    """
+    name: str
+    class_name: str
+    status: str                      # "passed", "failed", "error" or "skipped"
+    duration: float                  # seconds
+    message: Optional[str] = None
+    details: Optional[str] = None
+
+
+@dataclass
+class TestRunResult:
+    """
+    Outcome of one execution of a generated test class.
+    """
+    run_id: str
+    class_name: str
+    status: str                      # "PASS", "FAIL", "COMPILE_ERROR" or "ERROR"
+    duration: float                  # wall-clock seconds for the whole run
+    tests: List[TestCaseResult] = field(default_factory=list)
+    returncode: Optional[int] = None
+    output: str = ""
+    workspace: Optional[str] = None
+    diagnostics: List[dict] = field(default_factory=list)   # compiler errors when status is COMPILE_ERROR
+    cached: bool = False                                     # True when served from the result cache
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["tests"] = [TestCaseResult(**test) for test in data.get("tests", [])]
+        return cls(**data)
+
+    @property
+    def passed(self):
+        return self.status == "PASS"
+
+    def to_dict(self):
+        return asdict(self)
+
+    def summary(self):
+        """
+        Return a short text summary with the status of each test method, suitable for the agent.
+        """
+        lines = [f"{self.status}: {self.class_name} ({len(self.tests)} tests, {self.duration:.1f}s"
+                 + (", cached)" if self.cached else ")")]
+        for test in self.tests:
+            line = f"  - {test.name}: {test.status} ({test.duration:.2f}s)"
+            if test.message:
+                line += f" - {test.message}"
+            lines.append(line)
+        for diagnostic in self.diagnostics:
+            lines.append(f"  line {diagnostic['line']}: {diagnostic['message']}")
+        if self.status in ("COMPILE_ERROR", "ERROR") and self.output and not self.diagnostics:
+            lines.append(self.output[-2000:])
+        return "\n".join(lines)
+
+
+_CLASS_DECLARATION = re.compile(r"\bpublic\s+(?:final\s+|abstract\s+)*class\s+([A-Za-z_]\w*)")
+_PACKAGE_DECLARATION = re.compile(r"^\s*package\s+[\w.]+\s*;\s*$", re.MULTILINE)
+
+
+def _rename_class(source, original_name, class_name):
+    # Rename the class declaration and the references to the class itself: constructors, `new Foo(`,
+    # `Foo.class`, static `Foo.member` and `Foo x = ...` declarations. Imports and annotations are left alone, so a class named like
+    # an imported type (e.g. `Test`) keeps `import org.testng.annotations.Test;` and `@Test` intact.
+    name = re.escape(original_name)
+    patterns = (re.compile(rf"\b(class\s+){name}\b"),
+                re.compile(rf"\b(new\s+){name}\b"),
+                re.compile(rf"(?<![@.\w$])(){name}(?=\s*[(.]|\s+[A-Za-z_$][\w$]*\s*[=;,)])"))
+    lines = []
+    for line in source.splitlines(keepends=True):
+        if not re.match(r"\s*import\s", line):
+            for pattern in patterns:
+                line = pattern.sub(lambda m: m.group(1) + class_name, line)
+        lines.append(line)
+    return "".join(lines)
+
+
+def prepare_source(java_code, run_id, fallback_name="SampleTestNgTest"):
+    """
+    Put generated code in the generated package under a unique class name.
+
+    Args:
+        java_code (str): The generated Java code (with or without a package declaration).
+        run_id (str): Unique suffix for this run.
+        fallback_name (str): Class name used if the code has no public class declaration.
+
+    Returns:
+        tuple: (unique class name, Java source).
+    """
+    source = _PACKAGE_DECLARATION.sub("", java_code).strip()
+    match = _CLASS_DECLARATION.search(source)
+    original_name = match.group(1) if match else fallback_name
+    class_name = f"{original_name}_{run_id}"
+    if match:
+        source = _rename_class(source, original_name, class_name)
+    else:
+        source = f"public class {class_name} {{\n{source}\n}}"
+    return class_name, f"package {GENERATED_PACKAGE};\n\n{source}\n"
+
+
+def create_workspace(run_id, project_dir=JAVA_PROJECT_DIR, workspace_root=WORKSPACE_ROOT):
+    """
+    Create an isolated workspace for one run: a copy of pom.xml, symlinks to the rest of the
+    project (main sources, resources, ...) and an empty test source directory for the generated class.
+    """
+    workspace = os.path.join(workspace_root, f"run-{run_id}")
+    os.makedirs(workspace)
+    shutil.copy2(os.path.join(project_dir, "pom.xml"), workspace)
+    for name in os.listdir(project_dir):
+        if name in ("pom.xml", "src", "target") or name.startswith("."):
+            continue
+        os.symlink(os.path.join(project_dir, name), os.path.join(workspace, name))
+
+    project_src = os.path.join(project_dir, "src")
+    for part in ("main", os.path.join("test", "resources")):
+        if os.path.isdir(os.path.join(project_src, part)):
+            os.makedirs(os.path.dirname(os.path.join(workspace, "src", part)), exist_ok=True)
+            os.symlink(os.path.join(project_src, part), os.path.join(workspace, "src", part))
+    os.makedirs(os.path.join(workspace, "src", "test", "java", GENERATED_PACKAGE), exist_ok=True)
+    return workspace
+
+
+def parse_test_reports(reports_dir):
+    """
+    Parse Surefire (TEST-*.xml) reports, falling back to TestNG's testng-results.xml.
+
+    Returns:
+        list: TestCaseResult objects, one per test method.
+    """
+    results = []
+    for report in sorted(glob.glob(os.path.join(reports_dir, "TEST-*.xml"))):
+        root = ET.parse(report).getroot()
+        suites = [root] if root.tag == "testsuite" else root.iter("testsuite")
+        for suite in suites:
+            for case in suite.iter("testcase"):
+                status, message, details = "passed", None, None
+                for tag in ("failure", "error", "skipped"):
+                    element = case.find(tag)
+                    if element is not None:
+                        status = {"failure": "failed", "error": "error", "skipped": "skipped"}[tag]
+                        message = element.get("message") or element.get("type")
+                        details = (element.text or "").strip() or None
+                        break
+                results.append(TestCaseResult(
+                    name=case.get("name", ""),
+                    class_name=case.get("classname", suite.get("name", "")),
+                    status=status,
+                    duration=float(case.get("time") or 0),
+                    message=message,
+                    details=details,
+                ))
+    if results:
+        return results
+
+    testng_report = os.path.join(reports_dir, "testng-results.xml")
+    if os.path.exists(testng_report):
+        root = ET.parse(testng_report).getroot()
+        for test_class in root.iter("class"):
+            for method in test_class.iter("test-method"):
+                if method.get("is-config") == "true":
+                    continue
+                exception = method.find("exception")
+                message = None
+                if exception is not None:
+                    message_element = exception.find("message")
+                    message = (message_element.text or "").strip() if message_element is not None else exception.get("class")
+                results.append(TestCaseResult(
+                    name=method.get("name", ""),
+                    class_name=test_class.get("name", ""),
+                    status={"PASS": "passed", "FAIL": "failed", "SKIP": "skipped"}.get(method.get("status"), "error"),
+                    duration=int(method.get("duration-ms") or 0) / 1000.0,
+                    message=message,
+                ))
+    return results
+
+
+def overall_status(tests, returncode, output):
+    """
+    Decide the run status from the parsed tests, the Maven exit code and its output.
+    """
+    if tests:
+        if any(test.status in ("failed", "error") for test in tests):
             return "FAIL"
+        return "PASS" if any(test.status == "passed" for test in tests) else "FAIL"
+    if "COMPILATION ERROR" in output or "cannot find symbol" in output:
+        return "COMPILE_ERROR"
+    return "ERROR"
+
+
+def execute_java_test(java_code, test_class_name="SampleTestNgTest", project_dir=JAVA_PROJECT_DIR,
+                      timeout=TEST_TIMEOUT, keep_workspace=KEEP_WORKSPACES, use_cache=True, preflight=True):
+    """
+    Run a generated test class in an isolated workspace and return structured results.
+
+    Identical code (after normalization) against the same dependencies is answered from the
+    result cache, and code that fails the compile-only gate is rejected without running Maven.
+
+    Args:
+        java_code (str): The generated Java test code.
+        test_class_name (str): Class name used if the code has no public class declaration.
+        project_dir (str): Maven project providing the pom.xml and main sources.
+        timeout (float): Seconds allowed for the Maven invocation.
+        keep_workspace (bool): Keep the workspace directory for debugging.
+        use_cache (bool): Look up and store the result in the execution result cache.
+        preflight (bool): Compile the class on its own before running Maven.
+
+    Returns:
+        TestRunResult: Per-method status, durations and failure messages.
+    """
+    return execute_java_tests([java_code], test_class_name, project_dir, timeout, keep_workspace,
+                              use_cache=use_cache, preflight=preflight)[0]
+
+
+@tracing.traced("test.execute")
+def execute_java_tests(java_codes, test_class_name="SampleTestNgTest", project_dir=JAVA_PROJECT_DIR,
+                       timeout=TEST_TIMEOUT, keep_workspace=KEEP_WORKSPACES, use_cache=True, preflight=True,
+                       thread_count=4):
+    """
+    Run several generated test classes with a single Maven invocation.
+
+    Cached results and compile-gate rejections are resolved first; the remaining classes are written
+    into one workspace and executed together, `thread_count` classes in parallel. If that shared build
+    fails without producing any report (one class broke compilation), the classes are re-run one by one
+    so a single bad class does not fail the others.
+
+    Args:
+        java_codes (list): Generated Java test code, one class per entry.
+        test_class_name (str): Class name used for code without a public class declaration.
+        project_dir (str): Maven project providing the pom.xml and main sources.
+        timeout (float): Seconds allowed for the Maven invocation.
+        keep_workspace (bool): Keep the workspace directory for debugging.
+        use_cache (bool): Look up and store results in the execution result cache.
+        preflight (bool): Compile each class on its own before running Maven.
+        thread_count (int): Test classes executed in parallel inside the Maven run.
+
+    Returns:
+        list: One TestRunResult per entry of `java_codes`, in order.
+    """
+    started = time.perf_counter()
+    results = [None] * len(java_codes)
+    fingerprint = java_preflight.dependency_fingerprint(project_dir) if use_cache else None
+    pending = []   # (index, run_id, class_name, source, cache_key)
+
+    for index, java_code in enumerate(java_codes):
+        cache_key = result_key(java_code, fingerprint) if use_cache else None
+        if cache_key:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                results[index] = TestRunResult.from_dict(cached)
+                results[index].cached = True
+                continue
+        run_id = uuid.uuid4().hex[:12]
+        class_name, source = prepare_source(java_code, run_id, test_class_name)
+        pending.append((index, run_id, class_name, source, cache_key))
+
+    if preflight and pending:
+        # javac runs are independent processes, so check the classes concurrently
+        with tracing.span("test.preflight", classes=len(pending)), \
+                ThreadPoolExecutor(max_workers=max(1, min(len(pending), os.cpu_count() or 1))) as pool:
+            checks = list(pool.map(lambda item: java_preflight.compile_check(item[3], item[2], project_dir, MAVEN_COMMAND),
+                                   pending))
+        still_pending = []
+        for item, compiled in zip(pending, checks):
+            index, run_id, class_name, _source, cache_key = item
+            if compiled.ok:
+                still_pending.append(item)
+                continue
+            results[index] = TestRunResult(run_id, f"{GENERATED_PACKAGE}.{class_name}", "COMPILE_ERROR",
+                                           compiled.duration, output=compiled.output, diagnostics=compiled.diagnostics)
+            if cache_key:
+                result_cache.put(cache_key, results[index].to_dict())
+        pending = still_pending
+
+    if pending:
+        run_results = _run_maven([(class_name, source) for _, _, class_name, source, _ in pending],
+                                 pending[0][1], project_dir, timeout, keep_workspace, thread_count)
+        # One class that does not compile breaks the shared compile for all of them: re-run each class on its
+        # own. Timeouts and infrastructure errors (ERROR) are returned as they are; re-running would repeat them.
+        if len(pending) > 1 and all(result.status == "COMPILE_ERROR" and not result.tests for result in run_results):
+            run_results = [_run_maven([(class_name, source)], run_id, project_dir, timeout, keep_workspace)[0]
+                           for _, run_id, class_name, source, _ in pending]
+        for (index, run_id, _class_name, _source, cache_key), result in zip(pending, run_results):
+            result.run_id = run_id
+            results[index] = result
+            # Infrastructure errors (Maven missing, timeouts) are not cached; they say nothing about the code
+            if cache_key and result.status != "ERROR":
+                result_cache.put(cache_key, result.to_dict())
+
+    for result in results:
+        print(result.summary())
+    tracing.current_span().set(classes=len(java_codes), cache_hit=sum(result.cached for result in results),
+                               maven_classes=len(pending))
+    print(f"Executed {len(java_codes)} test classes in {time.perf_counter() - started:.1f}s "
+          f"({sum(result.cached for result in results)} cached, {len(pending)} run with Maven).")
+    return results
+
+
+def _run_maven(classes, run_id, project_dir, timeout, keep_workspace, thread_count=1):
+    # Write every (class_name, source) into one workspace and run them with one Maven invocation.
+    # Returns one TestRunResult per class; the shared wall time is reported as each class's duration.
+    started = time.perf_counter()
+    qualified_names = [f"{GENERATED_PACKAGE}.{class_name}" for class_name, _ in classes]
+    workspace = create_workspace(run_id, project_dir)
+    try:
+        for class_name, source in classes:
+            file_path = os.path.join(workspace, "src", "test", "java", GENERATED_PACKAGE, f"{class_name}.java")
+            with open(file_path, "w") as f:
+                f.write(source)
+            print(f"Generated test file: {file_path}")
+
+        command = MAVEN_COMMAND + [
+            "test",
+            f"-Dtest={','.join(qualified_names)}",
+            "-Dsurefire.failIfNoSpecifiedTests=false",
+        ]
+        if len(classes) > 1 and thread_count > 1:
+            command += ["-Dparallel=classes", f"-DthreadCount={thread_count}"]
+        try:
+            with tracing.span("test.maven", classes=len(classes)) as current:
+                process = subprocess.run(command, cwd=workspace, capture_output=True, text=True, timeout=timeout)
+                current.set(returncode=process.returncode)
         except FileNotFoundError:
             print(f"Maven/Gradle command not found. Make sure it's in your PATH. Command: {MAVEN_COMMAND}")
-            return "ERROR"
+            return [TestRunResult(run_id, name, "ERROR", time.perf_counter() - started,
+                                  output=f"Command not found: {MAVEN_COMMAND[0]}") for name in qualified_names]
+        except subprocess.TimeoutExpired as e:
+            # The partial output is bytes even with text=True
+            partial = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+            return [TestRunResult(run_id, name, "ERROR", time.perf_counter() - started,
+                                  output=f"Timed out after {timeout}s\n{partial}") for name in qualified_names]
+
+        output = process.stdout + (f"\n{process.stderr}" if process.stderr else "")
+        tests = parse_test_reports(os.path.join(workspace, "target", "surefire-reports"))
+        duration = time.perf_counter() - started
+        results = []
+        for name in qualified_names:
+            class_tests = [test for test in tests if test.class_name == name]
+            results.append(TestRunResult(
+                run_id=run_id,
+                class_name=name,
+                status=overall_status(class_tests, process.returncode, output),
+                duration=duration,
+                tests=class_tests,
+                returncode=process.returncode,
+                output=output,
+                workspace=workspace if keep_workspace else None,
+            ))
+        return results
+    finally:
+        if not keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def execution_stats():
+    """
+    Return result-cache hit rates and time saved, plus compile-gate counters.
+    """
+    return {"result_cache": result_cache.stats(), "preflight": dict(java_preflight.stats)}
+
+
+def run_java_test(java_code, test_class_name="SampleTestNgTest"):
+    """
+    Execute a block of Java test code and return 'PASS', 'FAIL', 'COMPILE_ERROR' or 'ERROR'.
+    Used as the agent's RunJavaTest tool; see execute_java_test() for the structured results.
+    """
+    return execute_java_test(java_code, test_class_name).status
 
 # Example usage:
 #generated_code = generate_test_code("Write a login test for Firefox using username 'test@example.com' and password 'password123' on a page with id='username', id='password', and id='submitBtn'") # Code from code_generator.py
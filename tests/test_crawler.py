@@ -0,0 +1,119 @@
+# Crawler tests against a local http.server fixture (no network access needed):
+#   python -m pytest tests/test_crawler.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import crawler
+from crawler import Crawler, crawl_and_ingest, metadata_for_url, parse_html
+
+PAGES = {
+    "/docs/index.html": ('<html><head><title>QA Wiki</title></head><body>'
+                         '<p>Welcome to the wiki.</p><a href="login.html#top">Login</a>'
+                         '<a href="/other/page.html">Outside</a></body></html>'),
+    "/docs/login.html": '<html><body><h1>Login tests</h1><p>Use By.id locators.</p></body></html>',
+    "/other/page.html": "<html><body><p>Out of scope.</p></body></html>",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        etag = f'"{self.path}"'
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = PAGES[self.path].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_html_keeps_block_text_and_absolute_links():
+    html = (b'<html><head><title> Release\n notes </title><script>var x = "<p>no</p>";</script></head>'
+            b'<body><nav><p>Menu</p></nav><div><p>Fixed WEB-457.</p><ul><li>One</li><li>Two</li></ul></div>'
+            b'<pre>line 1\nline 2</pre><a href="../bugs/1#c2">bug</a></body></html>')
+    # Split inside tags and text, as a streamed download would
+    chunks = [html[i:i + 7] for i in range(0, len(html), 7)]
+    title, text, links = parse_html(chunks, "https://wiki.example.com/qa/notes.html")
+    assert title == "Release notes"
+    # Text directly in <body> (the link) is a paragraph of its own; script and nav text is dropped
+    assert text.split("\n") == ["Fixed WEB-457.", "One", "Two", "line 1", "line 2", "bug"]
+    assert links == ["https://wiki.example.com/bugs/1"]
+
+
+def test_in_scope_is_limited_to_the_seed_host_and_path():
+    scoped = Crawler(["https://wiki.example.com/qa/index.html"], state_path=None)
+    assert scoped._in_scope("https://wiki.example.com/qa/login.html")
+    assert scoped._in_scope("https://wiki.example.com/qa/sub/page")
+    assert not scoped._in_scope("https://wiki.example.com/dev/page")
+    assert not scoped._in_scope("https://other.example.com/qa/login.html")
+    assert not scoped._in_scope("mailto:qa@example.com")
+
+
+def test_metadata_for_url_first_matching_rule_wins_per_key():
+    assert metadata_for_url("https://my.stg.charitableimpact.com/bugs/12") == {
+        "environment": "STAGE", "domain": "my.stg.charitableimpact.com", "type": "bug_report"}
+    assert metadata_for_url("https://wiki.example.com/qa/release-notes") == {
+        "environment": "QA", "domain": "my.qa.charitableimpact.com", "type": "release_note"}
+    assert metadata_for_url("https://example.com/page") == {"type": "document", "domain": "general"}
+
+
+def test_recrawl_uses_conditional_gets_and_follows_saved_links(server, tmp_path):
+    state_path = str(tmp_path / "state.json")
+    first = Crawler([f"{server}/docs/index.html"], rate=0, state_path=state_path)
+    documents = list(first.crawl())
+    first.save_state()
+    assert sorted(doc["id"] for doc in documents) == [f"{server}/docs/index.html", f"{server}/docs/login.html"]
+    assert "/other/page.html" not in [path for path, _ in _Handler.requests]
+
+    _Handler.requests = []
+    second = Crawler([f"{server}/docs/index.html"], rate=0, state_path=state_path)
+    assert list(second.crawl()) == []
+    assert second.stats["not_modified"] == 2
+    # login.html is only reachable through the links stored for the unchanged index page
+    assert sorted(_Handler.requests) == [("/docs/index.html", '"/docs/index.html"'),
+                                         ("/docs/login.html", '"/docs/login.html"')]
+
+
+def test_state_is_saved_only_after_ingestion(server, tmp_path, monkeypatch):
+    state_path = tmp_path / "state.json"
+
+    def failing_ingest(documents, **kwargs):
+        list(documents)
+        raise RuntimeError("upsert failed")
+
+    monkeypatch.setattr(crawler, "bulk_ingest", failing_ingest)
+    with pytest.raises(RuntimeError):
+        crawl_and_ingest([f"{server}/docs/index.html"], verbose=False, rate=0, state_path=str(state_path))
+    assert not state_path.exists()
+
+    monkeypatch.setattr(crawler, "bulk_ingest", lambda documents, **kwargs: {"documents": len(list(documents))})
+    stats = crawl_and_ingest([f"{server}/docs/index.html"], verbose=False, rate=0, state_path=str(state_path))
+    assert stats["documents"] == 2
+    assert set(json.loads(state_path.read_text())) == {f"{server}/docs/index.html", f"{server}/docs/login.html"}
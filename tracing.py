@@ -0,0 +1,336 @@
+# Lightweight request tracing and metrics.
+# Stages that can be slow (embedding, the vector query, each LLM call, each ReAct step, the Maven run)
+# are wrapped in spans that record their duration and a few attributes (token counts, documents
+# retrieved, cache hits). Spans opened while another span is active become its children; the
+# outermost span of a request is its trace. Finished traces are:
+#   - kept in memory (recent_traces()) for the per-request breakdown in the app sidebar
+#   - appended as JSON lines to TRACE_EXPORT_PATH, if set
+#   - aggregated into Prometheus metrics, served on METRICS_PORT by start_metrics_server()
+# With TRACING_ENABLED=0 every span is a shared no-op object, so instrumented code pays one flag check.
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")          # JSONL file of finished traces ("" = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))              # Prometheus /metrics port (0 = off)
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+RECENT_TRACES = int(os.getenv("TRACE_RECENT_ITEMS", "50"))
+# Histogram buckets (seconds) of the span duration metric
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Numeric span attributes that are also summed into counters
+COUNTED_ATTRIBUTES = ("prompt_tokens", "output_tokens", "documents", "cache_hit", "retries", "llm_calls_saved")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_TRACES)
+_metrics = {}
+_metrics_server = None
+
+
+class Span:
+    """
+    One timed stage of a request.
+    """
+    __slots__ = ("name", "trace", "span_id", "parent_id", "started_at", "_started", "duration", "attributes",
+                 "error", "_token")
+
+    def __init__(self, name, trace, parent_id=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self._token = None
+        trace.spans.append(self)
+
+    def set(self, **attributes):
+        """
+        Add or overwrite attributes of the span.
+        """
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error=None):
+        """
+        Finish the span (only the first call counts) and, for the root span, the whole trace.
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _record_metrics(self)
+        if self.trace.root is self:
+            self.trace.finish()
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError: # Exited in another context (e.g. a callback thread); nothing to restore there
+                pass
+            self._token = None
+        self.end(exc)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.started_at, 6),
+            "offset": round(self.started_at - self.trace.root.started_at, 6),
+            "duration": None if self.duration is None else round(self.duration, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """
+    All spans of one request, rooted at its outermost span.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.root = None
+
+    def finish(self):
+        with _lock:
+            _recent.append(self)
+        if TRACE_EXPORT_PATH:
+            line = json.dumps(self.to_dict(), default=str)
+            with _lock, open(TRACE_EXPORT_PATH, "a") as f:
+                f.write(line + "\n")
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": round(self.root.started_at, 6),
+            "duration": None if self.root.duration is None else round(self.root.duration, 6),
+            "spans": [span.to_dict() for span in list(self.spans)],
+        }
+
+    def breakdown(self):
+        """
+        Return one row per span, in start order: name (indented by depth), seconds and attributes.
+        """
+        depths = {}
+        rows = []
+        for span in sorted(list(self.spans), key=lambda item: item.started_at):
+            depth = depths[span.span_id] = depths.get(span.parent_id, -1) + 1 if span.parent_id else 0
+            details = [f"{key}={value}" for key, value in span.attributes.items() if value is not None]
+            if span.error:
+                details.append(f"error={span.error}")
+            rows.append({
+                "stage": "  " * depth + span.name,
+                "seconds": None if span.duration is None else round(span.duration, 3),
+                "details": ", ".join(details),
+            })
+        return rows
+
+
+class _NoopSpan:
+    # Returned by span()/start_span() when tracing is disabled
+    name = None
+    attributes = {}
+
+    def set(self, **attributes):
+        return self
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def start_span(name, new_trace=False, **attributes):
+    """
+    Start a span without making it the current span; call .end() to finish it.
+    Use it for stages that do not nest like a `with` block (generators, callbacks).
+
+    Args:
+        name (str): Stage name, e.g. 'llm.generate'.
+        new_trace (bool): Start a new trace even if a span is active.
+        **attributes: Initial attributes.
+    """
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    parent = None if new_trace else _current_span.get()
+    if parent is None or parent.duration is not None:
+        trace = Trace()
+        span = Span(name, trace, None, attributes)
+        trace.root = span
+        return span
+    return Span(name, parent.trace, parent.span_id, attributes)
+
+
+def span(name, **attributes):
+    """
+    Context manager timing a stage as a child of the current span (or as a new trace):
+
+        with tracing.span("retrieval.vector_query", backend="chroma") as current:
+            ...
+            current.set(documents=len(results))
+    """
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    return start_span(name, **attributes)
+
+
+def traced(name, **attributes):
+    """
+    Decorator running the function inside span(name); the function can add attributes
+    with tracing.current_span().set(...).
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return function(*args, **kwargs)
+            with start_span(name, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace(name, **attributes):
+    """
+    Context manager starting a new trace (one user request); the span it yields has `.trace`.
+    """
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    return start_span(name, new_trace=True, **attributes)
+
+
+def current_span():
+    """
+    Return the active span, or the no-op span if there is none.
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+def recent_traces(limit=None):
+    """
+    Return the most recently finished traces, newest last.
+    """
+    with _lock:
+        traces = list(_recent)
+    return traces[-limit:] if limit else traces
+
+
+def _record_metrics(span):
+    with _lock:
+        metric = _metrics.get(span.name)
+        if metric is None:
+            metric = _metrics[span.name] = {"count": 0, "errors": 0, "sum": 0.0,
+                                            "buckets": [0] * len(DURATION_BUCKETS), "attributes": {}}
+        metric["count"] += 1
+        metric["sum"] += span.duration
+        if span.error:
+            metric["errors"] += 1
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if span.duration <= bound:
+                metric["buckets"][index] += 1
+        for key in COUNTED_ATTRIBUTES:
+            value = span.attributes.get(key)
+            if isinstance(value, (bool, int, float)):
+                metric["attributes"][key] = metric["attributes"].get(key, 0) + value
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_metrics():
+    """
+    Render the aggregated span metrics in the Prometheus text exposition format.
+    """
+    with _lock:
+        snapshot = {name: {**metric, "buckets": list(metric["buckets"]), "attributes": dict(metric["attributes"])}
+                    for name, metric in _metrics.items()}
+    lines = [
+        "# HELP aitestauto_stage_duration_seconds Duration of traced stages.",
+        "# TYPE aitestauto_stage_duration_seconds histogram",
+    ]
+    for name, metric in sorted(snapshot.items()):
+        label = f'stage="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, metric["buckets"]):
+            lines.append(f'aitestauto_stage_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'aitestauto_stage_duration_seconds_bucket{{{label},le="+Inf"}} {metric["count"]}')
+        lines.append(f"aitestauto_stage_duration_seconds_sum{{{label}}} {metric['sum']:.6f}")
+        lines.append(f"aitestauto_stage_duration_seconds_count{{{label}}} {metric['count']}")
+    lines += ["# HELP aitestauto_stage_errors_total Traced stages that raised an error.",
+              "# TYPE aitestauto_stage_errors_total counter"]
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f'aitestauto_stage_errors_total{{stage="{_label(name)}"}} {metric["errors"]}')
+    lines += ["# HELP aitestauto_stage_attribute_total Sum of counted span attributes (tokens, documents, cache hits).",
+              "# TYPE aitestauto_stage_attribute_total counter"]
+    for name, metric in sorted(snapshot.items()):
+        for key, value in sorted(metric["attributes"].items()):
+            lines.append(f'aitestauto_stage_attribute_total{{stage="{_label(name)}",attribute="{key}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve prometheus_metrics() on http://host:port/metrics from a daemon thread.
+    Does nothing if the port is 0 or the server is already running in this process.
+
+    Returns:
+        ThreadingHTTPServer or None: The running server.
+    """
+    global _metrics_server
+    if not port:
+        return None
+    with _lock:
+        if _metrics_server is not None:
+            return _metrics_server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheus_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e: # e.g. another worker process already serves this port
+            print(f"Metrics endpoint not started on port {port}: {e}")
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+        return _metrics_server
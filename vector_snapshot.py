@@ -0,0 +1,373 @@
+# Memory-mapped snapshot of the knowledge base for read-heavy serving.
+# The knowledge base changes rarely, yet every query goes through the ChromaDB client and its
+# sqlite-backed query path. `export_snapshot()` writes the collection into a compact directory:
+#   embeddings.npy     contiguous (n, dim) matrix, float32, float16 or int8 (+ per-row scales.npy)
+#   sq_norms.npy       squared row norms, so l2/cosine distances come from a single dot product
+#   ids.bin/.npy       UTF-8 ids concatenated, with an offsets array
+#   documents.bin/.npy UTF-8 documents concatenated, with an offsets array
+#   metadata_keys.json metadata keys; key i is stored as meta_<i>_codes.npy (int32 code per row, -1 when the
+#                      row has no value) and meta_<i>_values.bin/.npy (the column's distinct values, JSON-encoded)
+#   domain_bitmap.npy  one packed bitmap per domain, used to pre-filter rows before scoring
+#   manifest.json      count, dim, dtype, distance space, embedding backend, domains and the KB version it was taken at
+# Arrays are opened with np.load(mmap_mode="r"), so every Streamlit worker process shares the same
+# pages from the OS page cache. A CURRENT file names the active snapshot; exporting a new snapshot
+# rewrites it atomically and running processes hot-swap to it on their next query.
+#
+#   python vector_snapshot.py export --dtype float16
+#   VECTOR_BACKEND=snapshot streamlit run app.py
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import resources
+import tracing
+from embedding_backends import backend_name
+from kb_version import current_version
+from resources import CHROMA_PATH
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")   # "snapshot" serves vector queries from the snapshot
+SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", os.path.join(CHROMA_PATH, "snapshots"))
+SNAPSHOT_DTYPE = os.getenv("VECTOR_SNAPSHOT_DTYPE", "float32")
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("VECTOR_SNAPSHOT_CHECK_INTERVAL", "5"))  # seconds between CURRENT checks
+SNAPSHOT_KEEP = int(os.getenv("VECTOR_SNAPSHOT_KEEP", "2"))
+SCORE_BLOCK_ROWS = 65536 # rows scored per block, bounds the temporary memory of int8/float16 matrices
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def _write_strings(directory, name, values):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+
+def export_snapshot(snapshot_dir=SNAPSHOT_DIR, dtype=SNAPSHOT_DTYPE, page_size=1000, keep=SNAPSHOT_KEEP):
+    """
+    Snapshot the knowledge-base collection into a new memory-mappable directory and make it current.
+
+    Args:
+        snapshot_dir (str): Directory holding the snapshots and the CURRENT pointer.
+        dtype (str): Storage type of the embedding matrix: float32, float16 or int8.
+        page_size (int): Documents read from the collection per request.
+        keep (int): Number of snapshots kept on disk (older ones are deleted).
+
+    Returns:
+        dict: The manifest of the new snapshot.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown snapshot dtype '{dtype}'. Choose one of {DTYPES}.")
+    started = time.perf_counter()
+    version = current_version() # Taken first: a write during the export makes the snapshot stale, never newer
+    collection = resources.get_collection()
+    ids, documents, metadatas, embeddings = [], [], [], []
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(document or "" for document in page["documents"])
+        metadatas.extend(meta or {} for meta in page["metadatas"])
+        embeddings.extend(np.asarray(page["embeddings"], dtype=np.float32))
+    matrix = np.vstack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    name = f"snapshot-v{version}-{int(time.time() * 1000)}"
+    tmp_dir = os.path.join(snapshot_dir, f".{name}.tmp")
+    os.makedirs(tmp_dir)
+
+    if dtype == "int8":
+        scales = np.maximum(np.abs(matrix).max(axis=1, initial=0.0), 1e-12) / 127.0
+        stored = np.round(matrix / scales[:, None]).astype(np.int8)
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales.astype(np.float32))
+        restored = stored.astype(np.float32) * scales[:, None]
+    else:
+        stored = matrix.astype(dtype)
+        restored = stored.astype(np.float32)
+    np.save(os.path.join(tmp_dir, "embeddings.npy"), np.ascontiguousarray(stored))
+    np.save(os.path.join(tmp_dir, "sq_norms.npy"), np.einsum("ij,ij->i", restored, restored).astype(np.float32))
+
+    _write_strings(tmp_dir, "ids", ids)
+    _write_strings(tmp_dir, "documents", documents)
+    keys = sorted({key for meta in metadatas for key in meta})
+    for index, key in enumerate(keys):
+        codes = np.full(len(metadatas), -1, dtype=np.int32)
+        values = {}
+        for row, meta in enumerate(metadatas):
+            if meta.get(key) is not None:
+                codes[row] = values.setdefault(json.dumps(meta[key]), len(values))
+        np.save(os.path.join(tmp_dir, f"meta_{index}_codes.npy"), codes)
+        _write_strings(tmp_dir, f"meta_{index}_values", list(values))
+    with open(os.path.join(tmp_dir, "metadata_keys.json"), "w") as f:
+        json.dump(keys, f)
+
+    row_domains = np.array([str(meta.get("domain")) for meta in metadatas], dtype=object)
+    domains = sorted({str(meta["domain"]) for meta in metadatas if meta.get("domain") is not None})
+    bitmap = np.array([np.packbits(row_domains == domain) for domain in domains], dtype=np.uint8)
+    np.save(os.path.join(tmp_dir, "domain_bitmap.npy"), bitmap.reshape(len(domains), (len(ids) + 7) // 8))
+
+    manifest = {
+        "name": name,
+        "kb_version": version,
+        "count": len(ids),
+        "dim": int(matrix.shape[1]) if matrix.size else 0,
+        "dtype": dtype,
+        "space": (collection.metadata or {}).get("hnsw:space", "l2"),
+        "embedding_backend": (collection.metadata or {}).get("embedding_backend"),
+        "domains": domains,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(tmp_dir, os.path.join(snapshot_dir, name))
+    tmp_pointer = os.path.join(snapshot_dir, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp_pointer, "w") as f:
+        f.write(name)
+    os.replace(tmp_pointer, os.path.join(snapshot_dir, "CURRENT")) # Atomic: readers see the old or the new name
+
+    _prune(snapshot_dir, keep)
+    print(f"Exported {len(ids)} documents ({dtype}) to {name} in {time.perf_counter() - started:.2f}s")
+    return manifest
+
+
+def _prune(snapshot_dir, keep):
+    # Processes still mapping a deleted snapshot keep reading it; the pages are freed when they swap
+    snapshots = sorted((entry for entry in os.listdir(snapshot_dir) if entry.startswith("snapshot-")),
+                       key=lambda entry: os.stat(os.path.join(snapshot_dir, entry)).st_mtime_ns)
+    for entry in snapshots[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+
+
+class VectorSnapshot:
+    """
+    Read-only, memory-mapped view of one exported snapshot, answering top-k queries with NumPy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.kb_version = self.manifest["kb_version"]
+        self.count = self.manifest["count"]
+        self.space = self.manifest["space"]
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.sq_norms = np.load(os.path.join(path, "sq_norms.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        self.domain_bitmap = np.load(os.path.join(path, "domain_bitmap.npy"), mmap_mode="r")
+        self.domains = {domain: index for index, domain in enumerate(self.manifest["domains"])}
+        self._ids = self._open_strings("ids")
+        self._documents = self._open_strings("documents")
+        with open(os.path.join(path, "metadata_keys.json")) as f:
+            keys = json.load(f)
+        # key -> (codes, distinct values); nothing is decoded until a row is read
+        self.columns = {key: (np.load(os.path.join(path, f"meta_{index}_codes.npy"), mmap_mode="r"),
+                              self._open_strings(f"meta_{index}_values"))
+                        for index, key in enumerate(keys)}
+
+    def _open_strings(self, name):
+        data = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(self.path, f"{name}.bin")) else np.zeros(0, dtype=np.uint8)
+        return data, np.load(os.path.join(self.path, f"{name}_offsets.npy"), mmap_mode="r")
+
+    @staticmethod
+    def _string(strings, row):
+        data, offsets = strings
+        return bytes(data[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def row_id(self, row):
+        return self._string(self._ids, row)
+
+    def row_document(self, row):
+        return self._string(self._documents, row)
+
+    def row_metadata(self, row):
+        metadata = {}
+        for key, (codes, values) in self.columns.items():
+            code = int(codes[row])
+            if code >= 0:
+                metadata[key] = json.loads(self._string(values, code))
+        return metadata
+
+    def domain_mask(self, domain_filter):
+        """
+        Boolean mask of the rows in `domain_filter` or 'general' (None means every row).
+        """
+        if not domain_filter:
+            return None
+        mask = np.zeros(self.count, dtype=bool)
+        for domain in (domain_filter, "general"):
+            if domain in self.domains:
+                mask |= np.unpackbits(self.domain_bitmap[self.domains[domain]], count=self.count).astype(bool)
+        return mask
+
+    def _blocks(self, rows):
+        # (out_start, row_start, local_rows) per SCORE_BLOCK_ROWS slice of the memmap; local_rows is None for
+        # every row of the slice, else the positions of `rows` (sorted) inside it. Slicing keeps the memmap
+        # shared and each block's private copy bounded, also for domain-filtered queries.
+        for start in range(0, self.count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.count)
+            if rows is None:
+                yield start, start, None
+                continue
+            first, last = np.searchsorted(rows, (start, end))
+            if first < last:
+                yield first, start, rows[first:last] - start
+
+    def _distances(self, rows, queries):
+        # (len(rows) or n, q) distances, computed block by block in float32
+        out = np.empty((self.count if rows is None else len(rows), queries.shape[0]), dtype=np.float32)
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[None, :]
+        query_norms = np.sqrt(query_sq_norms)
+        for out_start, start, local in self._blocks(rows):
+            end = min(start + SCORE_BLOCK_ROWS, self.count)
+            block = self.embeddings[start:end]
+            sq_norms = self.sq_norms[start:end]
+            scales = None if self.scales is None else self.scales[start:end]
+            if local is not None:
+                block, sq_norms = block[local], sq_norms[local]
+                scales = None if scales is None else scales[local]
+            dots = np.asarray(block, dtype=np.float32) @ queries.T
+            if scales is not None:
+                dots *= np.asarray(scales, dtype=np.float32)[:, None]
+            sq_norms = np.asarray(sq_norms, dtype=np.float32)[:, None]
+            if self.space == "ip":
+                distances = 1.0 - dots
+            elif self.space == "cosine":
+                distances = 1.0 - dots / np.maximum(np.sqrt(sq_norms) * query_norms, 1e-12)
+            else:
+                distances = np.maximum(sq_norms + query_sq_norms - 2.0 * dots, 0.0)
+            out[out_start:out_start + len(distances)] = distances
+        return out
+
+    def query(self, query_embeddings, n_results=3, domain_filter=None):
+        """
+        Top-k search with the same result layout as chromadb's Collection.query
+        ('ids', 'documents', 'metadatas', 'distances', one list per query).
+
+        Args:
+            query_embeddings (list): One embedding per query.
+            n_results (int): Results per query.
+            domain_filter (str, optional): Only rows of this domain or 'general' are searched.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        mask = self.domain_mask(domain_filter)
+        rows = None if mask is None else np.flatnonzero(mask)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if self.count == 0 or (rows is not None and len(rows) == 0):
+            for key in results:
+                results[key] = [[] for _ in range(len(queries))]
+            return results
+
+        distances = self._distances(rows, queries)
+        k = min(n_results, distances.shape[0])
+        for column in range(len(queries)):
+            candidates = np.argpartition(distances[:, column], k - 1)[:k]
+            candidates = candidates[np.argsort(distances[candidates, column])]
+            hits = candidates if rows is None else rows[candidates]
+            results["ids"].append([self.row_id(row) for row in hits])
+            results["documents"].append([self.row_document(row) for row in hits])
+            results["metadatas"].append([self.row_metadata(row) for row in hits])
+            results["distances"].append([float(distances[index, column]) for index in candidates])
+        return results
+
+
+_state_lock = threading.Lock()
+_state = {"snapshot": None, "pointer": None, "checked_at": 0.0, "stale_warned": None}
+
+
+def get_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """
+    Return the current VectorSnapshot, hot-swapping to a newer one when CURRENT changes.
+    CURRENT is re-checked at most every SNAPSHOT_CHECK_INTERVAL seconds. Returns None if no snapshot exists.
+    """
+    now = time.monotonic()
+    if _state["snapshot"] is not None and now - _state["checked_at"] < SNAPSHOT_CHECK_INTERVAL:
+        return _state["snapshot"]
+    with _state_lock:
+        _state["checked_at"] = now
+        try:
+            with open(os.path.join(snapshot_dir, "CURRENT")) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return _state["snapshot"]
+        if name != _state["pointer"]:
+            try:
+                snapshot = VectorSnapshot(os.path.join(snapshot_dir, name))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load vector snapshot '{name}': {e}")
+                return _state["snapshot"]
+            # In-flight queries keep their reference to the old snapshot; its maps close when they finish
+            _state["snapshot"], _state["pointer"] = snapshot, name
+            print(f"Loaded vector snapshot {name} ({snapshot.count} documents, {snapshot.manifest['dtype']})")
+        return _state["snapshot"]
+
+
+def current_snapshot():
+    """
+    Return the snapshot retrieval is served from: the current one when VECTOR_BACKEND is 'snapshot' and it is
+    up to date with the knowledge base and the embedding backend, None otherwise.
+    """
+    if VECTOR_BACKEND != "snapshot":
+        return None
+    snapshot = get_snapshot()
+    if (snapshot is not None and snapshot.kb_version == current_version()
+            and snapshot.manifest.get("embedding_backend") in (None, backend_name())):
+        return snapshot
+    return None
+
+
+@tracing.traced("retrieval.vector_query")
+def query_vectors(query_embeddings, n_results=3, domain_filter=None):
+    """
+    Vector top-k search used by retrieval: served from the snapshot when VECTOR_BACKEND is 'snapshot'
+    and the snapshot is up to date with the knowledge base, from the Chroma collection otherwise.
+    Domain-filtered queries search the domain plus 'general' documents.
+    """
+    if VECTOR_BACKEND == "snapshot":
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            tracing.current_span().set(backend="snapshot")
+            return snapshot.query(query_embeddings, n_results, domain_filter)
+        version = current_version()
+        if _state["stale_warned"] != version:
+            _state["stale_warned"] = version
+            print("Vector snapshot missing or older than the knowledge base; querying ChromaDB. "
+                  "Run `python vector_snapshot.py export` to refresh it.")
+    tracing.current_span().set(backend="chroma")
+    where = {"$or": [{"domain": domain_filter}, {"domain": "general"}]} if domain_filter else None
+    return resources.get_collection().query(query_embeddings=query_embeddings, n_results=n_results, where=where,
+                                            include=["documents", "metadatas", "distances"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or inspect the memory-mapped knowledge-base snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Snapshot the collection and make it current.")
+    export_parser.add_argument("--dtype", choices=DTYPES, default=SNAPSHOT_DTYPE)
+    export_parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    export_parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP, help="Snapshots kept on disk.")
+    info_parser = subparsers.add_parser("info", help="Show the current snapshot.")
+    info_parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_snapshot(args.dir, args.dtype, keep=args.keep)
+    else:
+        snapshot = get_snapshot(args.dir)
+        if snapshot is None:
+            print(f"No snapshot in {args.dir}")
+            return
+        print(json.dumps(snapshot.manifest, indent=2))
+        print(f"Knowledge base is at version {current_version()}"
+              + (" (snapshot is stale)" if snapshot.kb_version != current_version() else ""))
+
+
+if __name__ == "__main__":
+    main()